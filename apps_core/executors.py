@@ -0,0 +1,140 @@
+"""
+阻塞调用专用线程池
+Git克隆/拉取/推送、Hive连接、SQLFlow请求等耗时的阻塞调用在各自有界的线程池中执行，
+限制每类外部依赖的并发数，排队已满时直接返回503，而不是让请求无限堆积。
+
+同步的DRF视图通过run_blocking提交任务后仍在原线程中等待结果：在ASGI下该线程就是
+sync_to_async的线程，等待期间依然被占用，因此视图只获得并发上限和503背压，不获得线程隔离。
+只有异步调用方（LSP的WebSocket消费者，通过run_in_executor）在等待期间不占用线程，
+同步仓库时不会延迟补全、悬停
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONFIG = {
+    'lsp': {'max_workers': 4, 'max_queue': 64},
+    'git': {'max_workers': 2, 'max_queue': 8},
+    'hive': {'max_workers': 2, 'max_queue': 8},
+    'sqlflow': {'max_workers': 4, 'max_queue': 16},
+}
+
+
+class ExecutorBusy(APIException):
+    """线程池排队已满，请求被拒绝"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = '服务繁忙，请稍后重试'
+    default_code = 'executor_busy'
+
+
+class BoundedExecutor:
+    """有界线程池：最多max_workers个任务同时执行，排队超过max_queue时直接拒绝"""
+
+    def __init__(self, name, max_workers=2, max_queue=8):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-pool')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, func, *args, **kwargs):
+        """
+        提交任务
+
+        Raises:
+            ExecutorBusy: 执行中和排队的任务数已达上限
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorBusy(f"{self.name} 任务排队过多，请稍后重试")
+            self._pending += 1
+
+        try:
+            return self.pool.submit(self._run, func, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def run(self, func, *args, **kwargs):
+        """在线程池中执行func并等待结果，异常原样抛出"""
+        return self.submit(func, *args, **kwargs).result()
+
+    def _run(self, func, args, kwargs):
+        with self._lock:
+            self._active += 1
+        started = time.monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # 工作线程长期存在，与请求结束时一样清理该线程上失效或过期的数据库连接
+            close_old_connections()
+            with self._lock:
+                self._active -= 1
+                self._pending -= 1
+                self._completed += 1
+            logger.debug(f"{self.name} task {getattr(func, '__name__', func)} took {time.monotonic() - started:.2f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'queued': self._pending - self._active,
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name) -> BoundedExecutor:
+    """获取进程级共享的线程池，大小由 BLOCKING_EXECUTOR_CONFIG 配置"""
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                config = dict(DEFAULT_POOL_CONFIG.get(name, {}))
+                config.update(getattr(settings, 'BLOCKING_EXECUTOR_CONFIG', {}).get(name, {}))
+                executor = BoundedExecutor(name, **config)
+                _executors[name] = executor
+    return executor
+
+
+def run_blocking(name, func, *args, **kwargs):
+    """
+    在指定线程池中执行阻塞调用并等待结果
+
+    调用线程会一直等待到调用结束；用于同步视图时作用是限制并发，排队已满时抛出ExecutorBusy（503）
+    """
+    return get_executor(name).run(func, *args, **kwargs)
+
+
+async def run_in_executor(name, func, *args, **kwargs):
+    """在异步上下文（如WebSocket消费者）中把阻塞调用交给指定线程池执行"""
+    return await asyncio.wrap_future(get_executor(name).submit(func, *args, **kwargs))
+
+
+def executor_status() -> Dict[str, Any]:
+    """各线程池的大小与当前负载"""
+    names = set(DEFAULT_POOL_CONFIG) | set(getattr(settings, 'BLOCKING_EXECUTOR_CONFIG', {}))
+    return {name: get_executor(name).snapshot() for name in sorted(names)}
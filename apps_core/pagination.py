@@ -0,0 +1,16 @@
+"""
+列表接口分页
+"""
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination
+
+
+class StandardPagination(PageNumberPagination):
+    """page为页码，page_size为每页条数（不超过max_page_size），大小由 LIST_PAGINATION_CONFIG 配置"""
+
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        config = getattr(settings, 'LIST_PAGINATION_CONFIG', {})
+        self.page_size = config.get('page_size', 100)
+        self.max_page_size = config.get('max_page_size', 1000)
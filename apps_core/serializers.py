@@ -0,0 +1,55 @@
+"""
+列表接口的稀疏字段集
+通过查询参数选择输出字段，避免列表中每一行都序列化完整的嵌套对象和大字段
+"""
+from rest_framework import serializers
+
+
+def parse_field_list(value):
+    """逗号分隔的字段名列表"""
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    按查询参数裁剪输出字段，只作用于接口直接返回的对象，嵌套的序列化器输出各自的全部字段
+
+    fields=a,b：只输出指定字段
+    expand=x,y：把 Meta.expandable_fields 中声明的字段替换为完整表示，{字段名: (序列化器类, 参数)}
+    未指定fields时，列表接口输出 Meta.default_fields，详情接口输出全部字段
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        listing = isinstance(self.parent, serializers.ListSerializer)
+        top_level = self.parent is None or (listing and self.parent.parent is None)
+        if request is None or not top_level:
+            return fields
+
+        names, expand = self.requested_fields(request.query_params, listing)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expand:
+            serializer_class, kwargs = expandable[name]
+            fields[name] = serializer_class(read_only=True, **kwargs)
+        return {name: field for name, field in fields.items() if name in names}
+
+    @classmethod
+    def requested_fields(cls, query_params, listing=True):
+        """
+        视图可据此决定需要关联查询或延迟加载的字段
+
+        Returns:
+            (输出的字段名集合, 需要展开的字段名列表)，不存在的字段名被忽略
+        """
+        all_fields = list(cls.Meta.fields)
+        expandable = getattr(cls.Meta, 'expandable_fields', {})
+        expand = [name for name in parse_field_list(query_params.get('expand')) if name in expandable]
+        requested = parse_field_list(query_params.get('fields'))
+        if requested:
+            names = {name for name in requested if name in all_fields}
+        elif listing:
+            names = set(getattr(cls.Meta, 'default_fields', all_fields))
+        else:
+            names = set(all_fields)
+        return names | set(expand), expand
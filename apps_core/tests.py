@@ -1,3 +1,60 @@
-from django.test import TestCase
+import asyncio
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from .executors import BoundedExecutor, ExecutorBusy, run_in_executor
+
+
+class BoundedExecutorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.executor = BoundedExecutor('test', max_workers=1, max_queue=1)
+        self.addCleanup(self.executor.pool.shutdown)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def block(self):
+        self.release.wait(5)
+        return 'done'
+
+    def test_rejects_when_workers_and_queue_are_full(self):
+        running = self.executor.submit(self.block)
+        queued = self.executor.submit(self.block)
+        with self.assertRaises(ExecutorBusy):
+            self.executor.submit(self.block)
+        self.assertEqual(self.executor.snapshot()['rejected'], 1)
+
+        self.release.set()
+        self.assertEqual((running.result(5), queued.result(5)), ('done', 'done'))
+        # 任务完成后重新接受提交
+        self.assertEqual(self.executor.run(lambda: 'ok'), 'ok')
+        self.assertEqual(self.executor.snapshot()['completed'], 3)
+
+    def test_exceptions_propagate_to_caller(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.executor.run(lambda: 1 / 0)
+        self.assertEqual(self.executor.snapshot()['active'], 0)
+
+    def test_run_in_executor_awaits_pool_result(self):
+        with mock.patch('apps_core.executors.get_executor', return_value=self.executor):
+            result = asyncio.run(run_in_executor('test', lambda value: value * 2, 21))
+        self.assertEqual(result, 42)
+
+    def test_busy_executor_returns_503(self):
+        self.executor.submit(self.block)
+        self.executor.submit(self.block)
+
+        @api_view(['GET'])
+        @authentication_classes([])
+        @permission_classes([AllowAny])
+        def view(request):
+            return Response(self.executor.run(lambda: 'ok'))
+
+        response = view(APIRequestFactory().get('/'))
+        self.assertEqual(response.status_code, 503)
@@ -5,4 +5,5 @@ urlpatterns = [
     path('auth/login/', views.login, name='api_login'),
     path('auth/logout/', views.logout, name='api_logout'),
     path('auth/user/', views.user_info, name='api_user_info'),
+    path('system/executors/', views.executors, name='api_executors'),
 ]
\ No newline at end of file
@@ -5,6 +5,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from .executors import executor_status
 
 
 @api_view(['POST'])
@@ -79,3 +80,9 @@ def user_info(request):
         return Response({
             'message': '未登录'
         }, status=status.HTTP_401_UNAUTHORIZED)
+
+
+@api_view(['GET'])
+def executors(request):
+    """阻塞调用线程池的大小与当前负载"""
+    return Response(executor_status())
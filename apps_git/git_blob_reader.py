@@ -0,0 +1,109 @@
+"""
+Git对象库读取
+通过常驻的 git cat-file --batch 进程按 <提交>:<路径> 读取文件内容，
+不依赖工作区检出，可以读取任意提交或分支上的文件
+"""
+import logging
+import subprocess
+import threading
+from typing import Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class GitBlobReader:
+    """git cat-file --batch 进程封装，一个实例对应一个常驻进程，使用完毕后需close"""
+
+    def __init__(self, repo_path: str):
+        self.repo_path = repo_path
+        self._process = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            ['git', 'cat-file', '--batch'],
+            cwd=self.repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=5)
+        except Exception:
+            self._process.kill()
+        self._process = None
+
+    def read(self, object_spec: str) -> Optional[bytes]:
+        """
+        读取一个对象的内容
+
+        Args:
+            object_spec: 对象名，如 blob SHA 或 "<提交>:<路径>"
+
+        Returns:
+            对象内容，对象不存在时返回None
+        """
+        if '\n' in object_spec:
+            return None
+
+        with self._lock:
+            for attempt in range(2):
+                if self._process is None or self._process.poll() is not None:
+                    self._start()
+                try:
+                    return self._request(object_spec)
+                except (BrokenPipeError, ValueError, OSError) as e:
+                    # 进程意外退出时重启一次
+                    logger.warning(f"git cat-file process failed ({str(e)}), restarting")
+                    self.close()
+                    if attempt:
+                        raise
+
+    def _request(self, object_spec: str) -> Optional[bytes]:
+        stdin, stdout = self._process.stdin, self._process.stdout
+        stdin.write(object_spec.encode('utf-8') + b'\n')
+        stdin.flush()
+
+        header = stdout.readline()
+        if not header:
+            raise ValueError('unexpected end of output')
+        parts = header.rstrip(b'\n').split(b' ')
+        # 不存在的对象返回 "<对象名> missing"（或ambiguous），没有内容部分
+        if len(parts) != 3:
+            return None
+
+        size = int(parts[2])
+        content = stdout.read(size)
+        stdout.read(1)  # 内容后的换行
+        if parts[1] != b'blob':
+            return None
+        return content
+
+    def read_files(self, commit: str, file_paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        流式读取指定提交上的一批文件
+
+        Yields:
+            (路径, 内容)，文件不存在或不是UTF-8文本时内容为None
+        """
+        for path in file_paths:
+            data = self.read(f'{commit}:{path}')
+            if data is None:
+                yield path, None
+                continue
+            try:
+                yield path, data.decode('utf-8')
+            except UnicodeDecodeError:
+                logger.warning(f"Skipping non UTF-8 file {path} at {commit[:8]}")
+                yield path, None
@@ -1,12 +1,17 @@
 import git
 import os
+import re
 import logging
 import ssl
+import subprocess
+import threading
 import urllib3
-from pathlib import Path
 from urllib.parse import urlparse, urlunparse
 from .models import GitRepo
-from .gitlab_api_service import GitLabAPIService
+from .gitlab_api_service import get_gitlab_api_service
+from .git_blob_reader import GitBlobReader
+from .repo_info_cache import RepoInfoCache, make_etag
+from django.conf import settings
 from django.utils import timezone
 
 # 禁用urllib3的SSL警告
@@ -15,11 +20,26 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
 
+# Clone模式SQL文件列表缓存：{本地路径: (HEAD SHA, 索引修改时间, 文件列表)}
+_sql_files_cache = {}
+_sql_files_cache_lock = threading.Lock()
+
 
 class GitService:
     def __init__(self, git_repo: GitRepo):
         self.git_repo = git_repo
         self.repo = None
+        # API模式下最近一次获取的文件路径到blob SHA的映射，用于命中内容缓存
+        self._blob_ids = {}
+        # 指定提交上的文件路径到blob SHA的映射 {提交SHA: {路径: blob SHA}}，与分支的映射分开保存
+        self._commit_blob_ids = {}
+
+    def _get_api_service(self):
+        return get_gitlab_api_service(
+            repo_url=self.git_repo.repo_url,
+            token=self.git_repo.get_password(),
+            ssl_verify=self.git_repo.ssl_verify
+        )
 
     def _get_auth_url(self, auth_format=None):
         parsed = urlparse(self.git_repo.repo_url)
@@ -129,6 +149,64 @@ class GitService:
             logger.debug(f"Permission setup failed for {path}: {str(e)}")
             # 权限设置失败不应该中断主流程
 
+    def _clone_options(self):
+        """
+        根据克隆策略生成clone_from参数
+        
+        - shallow: 只克隆分支最近clone_depth个提交
+        - partial: 完整历史，但文件内容（blob）按需下载
+        - sparse: 部分克隆，并且工作区只检出SQL文件
+        """
+        strategy = self.git_repo.clone_strategy
+        if strategy == 'shallow':
+            return {'depth': max(1, self.git_repo.clone_depth), 'single_branch': True}
+        if strategy == 'partial':
+            return {'filter': 'blob:none'}
+        if strategy == 'sparse':
+            return {'filter': 'blob:none', 'sparse': True}
+        return {}
+
+    def _fetch_args(self):
+        """浅克隆的仓库拉取时保持相同深度，部分克隆的过滤条件已记录在仓库配置中"""
+        if self.git_repo.clone_strategy == 'shallow':
+            return [f'--depth={max(1, self.git_repo.clone_depth)}', self.git_repo.branch]
+        return []
+
+    def _has_commit(self, sha):
+        try:
+            self.repo.git.cat_file('-e', f'{sha}^{{commit}}')
+            return True
+        except git.exc.GitCommandError:
+            return False
+
+    def _ensure_commit(self, sha, max_deepen=10, deepen_step=50):
+        """
+        确保本地存在指定提交（浅克隆时增量解析的基线提交可能不在本地）
+        
+        比较两个提交只需要两端的提交和目录树，不需要中间历史，因此先尝试单独拉取该提交；
+        服务端不允许按SHA拉取时，再逐步加深历史直到找到该提交
+        """
+        if self._has_commit(sha):
+            return
+        if self.git_repo.clone_strategy != 'shallow':
+            raise Exception(f"提交 {sha[:8]} 不存在")
+        
+        logger.info(f"Commit {sha[:8]} not in shallow clone of {self.git_repo.name}, fetching it")
+        try:
+            self.repo.git.fetch('--depth=1', 'origin', sha)
+            if self._has_commit(sha):
+                return
+        except git.exc.GitCommandError as e:
+            logger.debug(f"Fetching commit {sha[:8]} directly failed: {str(e)}")
+        
+        for _ in range(max_deepen):
+            self.repo.git.fetch(f'--deepen={deepen_step}', 'origin', self.git_repo.branch)
+            if self._has_commit(sha):
+                return
+            if self.repo.git.rev_parse('--is-shallow-repository') == 'false':
+                break
+        raise Exception(f"提交 {sha[:8]} 不存在")
+
     def clone_or_pull(self):
         local_path = self.git_repo.repo_local_path
         
@@ -198,7 +276,7 @@ class GitService:
                 with self.repo.git.custom_environment(**env_vars):
                     self.repo.git.config('credential.helper', '')
                     self.repo.git.remote('set-url', 'origin', auth_url)
-                    self.repo.git.fetch('origin')
+                    self.repo.git.fetch('origin', *self._fetch_args())
                     self.repo.git.checkout('-B', self.git_repo.branch, f'origin/{self.git_repo.branch}')
             else:
                 # 克隆新仓库
@@ -210,9 +288,14 @@ class GitService:
                     auth_url, 
                     local_path,
                     branch=self.git_repo.branch,
-                    env=clone_env
+                    env=clone_env,
+                    **self._clone_options()
                 )
                 
+                if self.git_repo.clone_strategy == 'sparse':
+                    # 非cone模式的模式匹配，只检出任意目录下的SQL文件
+                    self.repo.git.sparse_checkout('set', '--no-cone', '*.sql')
+                
                 self.repo.git.config('credential.helper', '')
                 if not self.git_repo.ssl_verify:
                     self.repo.git.config('http.sslVerify', 'false')
@@ -235,7 +318,11 @@ class GitService:
             raise Exception(f"仓库同步失败: {str(e)}")
 
     def get_sql_files(self):
-        """获取SQL文件列表，支持clone和API两种模式"""
+        """
+        获取SQL文件列表，支持clone和API两种模式
+        
+        获取失败时抛出异常：空列表表示仓库中确实没有SQL文件，解析任务会据此删除已移除文件的血缘
+        """
         
         if self.git_repo.access_mode == 'api':
             # API模式：直接通过GitLab API获取文件列表
@@ -247,22 +334,20 @@ class GitService:
     def _get_sql_files_via_api(self):
         """通过API方式获取SQL文件列表"""
         try:
-            api_service = GitLabAPIService(
-                repo_url=self.git_repo.repo_url,
-                token=self.git_repo.get_password(),
-                ssl_verify=self.git_repo.ssl_verify
-            )
+            api_service = self._get_api_service()
             
             files = api_service.get_file_tree(branch=self.git_repo.branch)
             
             # 转换为统一格式
             sql_files = []
             for file in files:
+                self._blob_ids[file['path']] = file['id']
                 sql_files.append({
                     'path': file['path'],
                     'full_path': file['path'],  # API模式下full_path就是相对路径
                     'size': file['size'],
                     'modified': None,  # API模式下暂不提供修改时间
+                    'blob_id': file['id'],
                     'api_mode': True
                 })
             
@@ -272,34 +357,82 @@ class GitService:
             
         except Exception as e:
             logger.error(f"Failed to get SQL files via API from {self.git_repo.name}: {str(e)}")
-            return []
+            raise Exception(f"获取SQL文件列表失败: {str(e)}")
     
     def _get_sql_files_via_clone(self):
-        """通过本地克隆方式获取SQL文件列表"""
+        """
+        通过本地克隆方式获取SQL文件列表
+        
+        从Git索引读取（git ls-files -s），一次调用即可得到路径和blob SHA，
+        不遍历工作区和.git目录；结果按HEAD提交缓存，HEAD和索引不变时直接复用
+        """
         if not self.repo or not os.path.exists(self.git_repo.repo_local_path):
             if not self.clone_or_pull():
-                return []
+                raise Exception("仓库同步失败，无法获取SQL文件列表")
         
-        sql_files = []
+        local_path = self.git_repo.repo_local_path
         try:
-            repo_path = Path(self.git_repo.repo_local_path)
-            for sql_file in repo_path.rglob("*.sql"):
-                if sql_file.is_file():
-                    relative_path = sql_file.relative_to(repo_path)
-                    sql_files.append({
-                        'path': str(relative_path),
-                        'full_path': str(sql_file),
-                        'size': sql_file.stat().st_size,
-                        'modified': sql_file.stat().st_mtime,
-                        'api_mode': False
-                    })
-            
+            head_sha = self.repo.head.commit.hexsha
+            index_mtime = os.stat(os.path.join(self.repo.git_dir, 'index')).st_mtime
+            
+            cached = _sql_files_cache.get(local_path)
+            if cached and cached[0] == head_sha and cached[1] == index_mtime:
+                return [dict(f) for f in cached[2]]
+            
+            # -z 输出以NUL分隔，避免中文等特殊路径被转义
+            output = self.repo.git.ls_files('-s', '-z', '--', '*.sql')
+            blobs = {}
+            for entry in output.split('\0'):
+                if not entry:
+                    continue
+                info, path = entry.split('\t', 1)
+                mode, blob_id, stage = info.split(' ')
+                # 跳过子模块（160000）；合并冲突时同一路径有多个stage，只取一个
+                if mode == '160000' or path in blobs:
+                    continue
+                blobs[path] = blob_id
+            
+            sizes = self._get_blob_sizes(set(blobs.values()))
+            sql_files = [
+                {
+                    'path': path,
+                    'full_path': os.path.join(local_path, path),
+                    'size': sizes.get(blob_id, 0),
+                    'modified': None,
+                    'blob_id': blob_id,
+                    'api_mode': False
+                }
+                for path, blob_id in blobs.items()
+            ]
             sql_files.sort(key=lambda x: x['path'])
-            return sql_files
+            
+            with _sql_files_cache_lock:
+                _sql_files_cache[local_path] = (head_sha, index_mtime, sql_files)
+            return [dict(f) for f in sql_files]
             
         except Exception as e:
             logger.error(f"Failed to get SQL files from {self.git_repo.name}: {str(e)}")
-            return []
+            raise Exception(f"获取SQL文件列表失败: {str(e)}")
+
+    def _get_blob_sizes(self, blob_ids):
+        """通过一次git cat-file --batch-check批量获取blob大小"""
+        if not blob_ids:
+            return {}
+        result = subprocess.run(
+            ['git', 'cat-file', '--batch-check'],
+            cwd=self.git_repo.repo_local_path,
+            input=''.join(f'{blob_id}\n' for blob_id in blob_ids),
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        sizes = {}
+        for line in result.stdout.splitlines():
+            parts = line.split(' ')
+            # 格式: <sha> <type> <size>，缺失对象为 "<sha> missing"
+            if len(parts) == 3:
+                sizes[parts[0]] = int(parts[2])
+        return sizes
 
     def read_file(self, file_path):
         """读取文件内容，支持clone和API两种模式"""
@@ -311,25 +444,119 @@ class GitService:
             # Clone模式：从本地克隆的文件读取
             return self._read_file_via_clone(file_path)
     
-    def _read_file_via_api(self, file_path):
-        """通过API方式读取文件内容"""
+    def _api_blob_ids(self, ref=None):
+        """API模式下路径到blob SHA的映射：未指定提交时为当前分支，否则为该提交"""
+        if ref is None:
+            return self._blob_ids
+        return self._commit_blob_ids.setdefault(ref, {})
+    
+    def _read_file_via_api(self, file_path, ref=None):
+        """通过API方式读取文件内容，ref为提交SHA时读取该提交上的文件"""
         try:
-            api_service = GitLabAPIService(
-                repo_url=self.git_repo.repo_url,
-                token=self.git_repo.get_password(),
-                ssl_verify=self.git_repo.ssl_verify
-            )
-            
-            content = api_service.get_file_content(file_path, branch=self.git_repo.branch)
-            if content is not None:
-                logger.debug(f"Read file {file_path} via API ({len(content)} chars)")
+            api_service = self._get_api_service()
+            blob_ids = self._api_blob_ids(ref)
+            
+            fetched = api_service.fetch_files(
+                [{'path': file_path, 'id': blob_ids.get(file_path)}],
+                branch=ref or self.git_repo.branch
+            ).get(file_path)
+            if fetched is None:
+                return None
             
-            return content
+            blob_ids[file_path] = fetched['id']
+            logger.debug(f"Read file {file_path} via API ({len(fetched['content'])} chars)")
+            return fetched['content']
             
         except Exception as e:
             logger.error(f"Failed to read file {file_path} via API from {self.git_repo.name}: {str(e)}")
             return None
     
+    def prepare_bulk_read(self, file_paths, ref=None):
+        """
+        批量读取前的准备：API模式下缓存未命中的文件数超过阈值时，
+        下载一次仓库归档代替逐个文件请求，其余情况仍由prefetch_files并发获取
+        
+        Args:
+            ref: 读取的提交SHA，默认当前分支；归档和blob映射都按该提交获取
+        """
+        if self.git_repo.access_mode != 'api' or not file_paths:
+            return
+        
+        try:
+            api_service = self._get_api_service()
+            threshold = getattr(settings, 'GITLAB_API_CONFIG', {}).get('archive_threshold', 200)
+            if len(file_paths) <= threshold:
+                return
+            if ref is not None and ref not in self._commit_blob_ids:
+                # 先列出该提交的文件树，内容缓存中已有的blob不需要下载
+                self.list_sql_files_at(ref)
+            
+            blob_ids = self._api_blob_ids(ref)
+            missing = [
+                path for path in file_paths
+                if api_service.content_cache.get(blob_ids.get(path)) is None
+            ]
+            if len(missing) <= threshold:
+                return
+            
+            logger.info(f"{len(missing)} files to fetch for {self.git_repo.name}, downloading repository archive")
+            blob_ids.update(api_service.download_archive(ref or self.git_repo.branch))
+        except Exception as e:
+            # 归档下载失败时回退到逐个文件获取
+            logger.warning(f"Failed to download archive of {self.git_repo.name}: {str(e)}")
+    
+    def prefetch_files(self, file_paths, ref=None):
+        """
+        批量预取文件内容到本地缓存，之后的read_file直接命中缓存
+        API模式下按限流并发下载；Clone模式下文件已在本地，无需预取
+        """
+        if self.git_repo.access_mode != 'api' or not file_paths:
+            return
+        
+        try:
+            api_service = self._get_api_service()
+            blob_ids = self._api_blob_ids(ref)
+            fetched = api_service.fetch_files(
+                [{'path': path, 'id': blob_ids.get(path)} for path in file_paths],
+                branch=ref or self.git_repo.branch
+            )
+            for path, result in fetched.items():
+                blob_ids[path] = result['id']
+        except Exception as e:
+            # 预取失败不影响逐个读取
+            logger.warning(f"Failed to prefetch files via API from {self.git_repo.name}: {str(e)}")
+    
+    def iter_file_contents(self, file_paths, commit=None, batch_size=100):
+        """
+        流式读取一批文件内容，供解析任务使用
+        
+        Clone模式通过常驻的git cat-file --batch进程直接从对象库读取指定提交上的文件，
+        不检出工作区，也不会在读取过程中触发拉取；API模式分批并发预取后从缓存读取
+        
+        Args:
+            file_paths: 文件路径列表
+            commit: 读取的提交，默认Clone模式为HEAD、API模式为当前分支
+            batch_size: API模式下每批预取的文件数
+            
+        Yields:
+            (路径, 内容)，读取失败时内容为None
+        """
+        if self.git_repo.access_mode == 'api':
+            self.prepare_bulk_read(file_paths, ref=commit)
+            for start in range(0, len(file_paths), batch_size):
+                batch = file_paths[start:start + batch_size]
+                self.prefetch_files(batch, ref=commit)
+                for path in batch:
+                    yield path, self._read_file_via_api(path, ref=commit)
+            return
+        
+        if not self.repo or not os.path.exists(self.git_repo.repo_local_path):
+            if not self.clone_or_pull():
+                raise Exception("仓库同步失败，无法读取文件")
+        
+        with GitBlobReader(self.git_repo.repo_local_path) as reader:
+            yield from reader.read_files(commit or 'HEAD', file_paths)
+    
     def _read_file_via_clone(self, file_path):
         """通过本地克隆方式读取文件内容"""
         if not self.repo or not os.path.exists(self.git_repo.repo_local_path):
@@ -414,11 +641,7 @@ class GitService:
     def _get_branches_via_api(self):
         """通过API方式获取分支列表"""
         try:
-            api_service = GitLabAPIService(
-                repo_url=self.git_repo.repo_url,
-                token=self.git_repo.get_password(),
-                ssl_verify=self.git_repo.ssl_verify
-            )
+            api_service = self._get_api_service()
             
             branches = api_service.get_branches()
             logger.info(f"Found {len(branches)} branches via API for {self.git_repo.name}")
@@ -430,91 +653,107 @@ class GitService:
     
     def _get_branches_via_clone(self):
         """通过本地克隆方式获取分支列表"""
-        local_path = self.git_repo.repo_local_path
-        auth_url = self._get_auth_url()
+        try:
+            return list(self._get_remote_heads_via_clone())
+        except Exception as e:
+            logger.error(f"Failed to get remote branches for {self.git_repo.name}: {str(e)}")
+            return ['main', 'master']  # 返回常见默认分支
+
+    def _get_remote_heads_via_clone(self, branch=None):
+        """
+        通过 git ls-remote --heads 获取远程分支及其HEAD SHA
+        只访问远程引用，不需要本地仓库，也不下载任何对象
         
-        # 配置SSL验证选项
-        env_vars = {}
+        Args:
+            branch: 只查询该分支，默认全部分支
+        
+        Raises:
+            git.exc.GitCommandError: 访问远程仓库失败
+        """
+        auth_url, _ = self._get_auth_url()
+        
+        env_vars = {'GIT_TERMINAL_PROMPT': '0'}
         if not self.git_repo.ssl_verify:
-            env_vars.update({
-                'GIT_SSL_NO_VERIFY': '1',
-                'GIT_CURL_VERBOSE': '0'
-            })
+            env_vars['GIT_SSL_NO_VERIFY'] = '1'
         
-        try:
-            # 如果本地仓库不存在，临时clone来获取分支信息
+        git_cmd = git.cmd.Git()
+        with git_cmd.custom_environment(**env_vars):
+            output = git_cmd.ls_remote('--heads', auth_url, *([f'refs/heads/{branch}'] if branch else []))
+        
+        heads = {}
+        for line in output.split('\n'):
+            if line.strip() and '\trefs/heads/' in line:
+                sha, ref = line.split('\t', 1)
+                heads[ref[len('refs/heads/'):].strip()] = sha
+        return heads
+
+    def get_remote_heads(self):
+        """
+        获取远程分支及其HEAD SHA，支持clone和API两种模式
+        
+        Raises:
+            Exception: 访问远程仓库失败
+        """
+        if self.git_repo.access_mode == 'api':
+            return self._get_api_service().get_branch_heads()
+        return self._get_remote_heads_via_clone()
+
+    def get_remote_branch_head(self):
+        """
+        远程当前分支的HEAD SHA，只查询引用，不拉取
+
+        Raises:
+            Exception: 访问远程仓库失败
+        """
+        if self.git_repo.access_mode == 'api':
+            return self._get_api_service().get_branch_head(self.git_repo.branch)
+        return self._get_remote_heads_via_clone(self.git_repo.branch).get(self.git_repo.branch)
+
+    def get_cached_branches(self):
+        """
+        获取分支列表（带缓存），版本标识由各分支HEAD SHA计算
+        
+        Returns:
+            (分支列表, etag)
+        """
+        def load():
+            heads = self.get_remote_heads()
+            return sorted(heads), make_etag(*sorted(heads.items()))
+        
+        return RepoInfoCache().get(self.git_repo, 'branches', load)
+
+    def get_cached_commit_history(self, limit=10):
+        """
+        获取提交历史（带缓存）
+        
+        版本标识由远程分支HEAD（ls-remote或API查询）和本地HEAD共同计算，两者都不变时不重新遍历提交；
+        已有本地仓库时直接读取其中的提交历史，不触发拉取，本地历史随同步操作更新（同步后缓存失效）
+        
+        Returns:
+            (提交列表, etag)
+        """
+        local_path = self.git_repo.repo_local_path
+        
+        def local_head():
             if not os.path.exists(local_path):
-                temp_path = f"{local_path}_temp"
-                try:
-                    # 只获取远程引用，不下载完整仓库
-                    clone_env = dict(os.environ)
-                    clone_env.update(env_vars)
-                    
-                    temp_repo = git.Repo.clone_from(
-                        auth_url,
-                        temp_path,
-                        no_checkout=True,  # 不检出文件
-                        env=clone_env
-                    )
-                    
-                    # 获取远程分支列表
-                    remote_refs = temp_repo.git.ls_remote('--heads', 'origin').split('\n')
-                    branches = []
-                    for ref in remote_refs:
-                        if ref.strip():
-                            branch_name = ref.split('\t')[1].replace('refs/heads/', '')
-                            branches.append(branch_name)
-                    
-                    # 清理临时目录
-                    import shutil
-                    shutil.rmtree(temp_path)
-                    
-                    return branches
-                    
-                except Exception as e:
-                    logger.error(f"Failed to get remote branches: {str(e)}")
-                    # 如果临时目录存在，清理它
-                    if os.path.exists(temp_path):
-                        import shutil
-                        shutil.rmtree(temp_path)
-                    return ['main', 'master']  # 返回常见默认分支
-            else:
-                # 使用现有仓库获取分支信息
+                return None
+            return git.Repo(local_path).head.commit.hexsha
+        
+        def load():
+            remote_head = self.get_remote_branch_head()
+            if not self.repo and os.path.exists(local_path):
                 self.repo = git.Repo(local_path)
-                with self.repo.git.custom_environment(**env_vars):
-                    # 先fetch获取最新的远程分支信息
-                    self.repo.git.config('remote.origin.fetch', '+refs/heads/*:refs/heads/*')
-                    
-                    try:
-                        self.repo.git.fetch('origin')
-                        
-                        # 尝试使用ls-remote获取远程分支，这样更可靠
-                        try:
-                            remote_refs_output = self.repo.git.ls_remote('--heads', 'origin')
-                            branches = []
-                            for line in remote_refs_output.split('\n'):
-                                if line.strip() and 'refs/heads/' in line:
-                                    branch_name = line.split('refs/heads/')[-1].strip()
-                                    branches.append(branch_name)
-                            return branches
-                        except git.exc.GitCommandError:
-                            # 备选方案：使用branch -r
-                            try:
-                                remote_branches = self.repo.git.branch('-r').split('\n')
-                                branches = [b.strip().replace('origin/', '') 
-                                           for b in remote_branches 
-                                           if 'origin/' in b and '->' not in b and b.strip()]
-                                return branches
-                            except git.exc.GitCommandError:
-                                # 最后的备选方案
-                                return ['main', 'master']
-                    except git.exc.GitCommandError:
-                        # 如果fetch失败，返回默认分支
-                        return ['main', 'master']
-                    
-        except Exception as e:
-            logger.error(f"Failed to get remote branches for {self.git_repo.name}: {str(e)}")
-            return ['main', 'master']  # 返回常见默认分支
+            commits = self.get_commit_history(limit)
+            return commits, make_etag(remote_head, local_head(), limit)
+        
+        def validate():
+            return make_etag(self.get_remote_branch_head(), local_head(), limit)
+        
+        return RepoInfoCache().get(
+            self.git_repo, 'commits', load,
+            validator=validate,
+            variant=f"{self.git_repo.branch}:{limit}"
+        )
 
     def get_commit_history(self, limit=10):
         if not self.repo:
@@ -537,40 +776,119 @@ class GitService:
             logger.error(f"Failed to get commit history for {self.git_repo.name}: {str(e)}")
             return []
 
-    def get_changed_files_since(self, since_datetime):
-        """获取自指定时间以来变更的文件列表"""
+    def get_head_sha(self):
+        """获取当前分支HEAD的提交SHA，支持clone和API两种模式"""
+        if self.git_repo.access_mode == 'api':
+            api_service = self._get_api_service()
+            return api_service.get_branch_head(self.git_repo.branch)
+        
         if not self.repo:
             if not self.clone_or_pull():
-                return []
+                return None
         
         try:
-            # 转换datetime为git可以理解的格式
-            since_str = since_datetime.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 获取从指定时间以来的所有commit
-            commits = list(self.repo.iter_commits(since=since_str))
-            
-            changed_files = set()
-            
-            for commit in commits:
-                # 获取每个commit中变更的文件
-                if commit.parents:
-                    # 比较与父commit的差异
-                    diffs = commit.diff(commit.parents[0])
-                    for diff in diffs:
-                        if diff.a_path:
-                            changed_files.add(diff.a_path)
-                        if diff.b_path:
-                            changed_files.add(diff.b_path)
-                else:
-                    # 首次commit，获取所有文件
-                    for item in commit.tree.traverse():
-                        if item.type == 'blob':  # 文件类型
-                            changed_files.add(item.path)
-            
-            logger.info(f"Found {len(changed_files)} changed files since {since_str}")
-            return list(changed_files)
-            
+            return self.repo.head.commit.hexsha
         except Exception as e:
-            logger.error(f"Failed to get changed files for {self.git_repo.name}: {str(e)}")
-            raise e
\ No newline at end of file
+            logger.error(f"Failed to get HEAD of {self.git_repo.name}: {str(e)}")
+            return None
+
+    def get_changes_between(self, old_sha, new_sha):
+        """
+        获取两个提交之间的文件变更（git diff --name-status -M old..new）
+        
+        Returns:
+            变更列表，每项包含 status(A/M/D/R/C/T)、path（变更后路径）、old_path（重命名/复制前路径）
+            
+        Raises:
+            Exception: 提交不存在（如强制推送后）等无法比较的情况
+        """
+        if self.git_repo.access_mode == 'api':
+            api_service = self._get_api_service()
+            return api_service.compare(old_sha, new_sha)
+        
+        if not self.repo:
+            if not self.clone_or_pull():
+                raise Exception("仓库同步失败，无法比较提交")
+        
+        self._ensure_commit(old_sha)
+        
+        # -z 输出以NUL分隔，避免中文等特殊路径被转义
+        output = self.repo.git.diff('--name-status', '-M', '-z', '--no-color', f'{old_sha}..{new_sha}')
+        fields = output.split('\0')
+        
+        changes = []
+        i = 0
+        while i < len(fields) and fields[i]:
+            status = fields[i][0]
+            if status in ('R', 'C'):
+                changes.append({'status': status, 'path': fields[i + 2], 'old_path': fields[i + 1]})
+                i += 3
+            else:
+                changes.append({'status': status, 'path': fields[i + 1], 'old_path': None})
+                i += 2
+        
+        logger.info(f"Found {len(changes)} changed files between {old_sha[:8]} and {new_sha[:8]}")
+        return changes
+
+    def resolve_ref(self, ref):
+        """
+        将分支、标签或提交解析为提交SHA，不切换工作区
+        
+        Raises:
+            Exception: 引用不存在
+        """
+        if self.git_repo.access_mode == 'api':
+            if re.fullmatch(r'[0-9a-f]{40}', ref):
+                return ref
+            sha = self._get_api_service().get_branch_head(ref)
+            if not sha:
+                raise Exception(f"分支 {ref} 不存在")
+            return sha
+        
+        if not self.repo:
+            if not self.clone_or_pull():
+                raise Exception("仓库同步失败，无法解析引用")
+        
+        for candidate in (f'origin/{ref}', ref):
+            try:
+                return self.repo.git.rev_parse('--verify', '--quiet', f'{candidate}^{{commit}}')
+            except git.exc.GitCommandError:
+                continue
+        
+        # 单分支或浅克隆的仓库中没有其他分支，按需单独拉取
+        try:
+            fetch_args = ['--depth=1'] if self.git_repo.clone_strategy == 'shallow' else []
+            self.repo.git.fetch('origin', *fetch_args, ref)
+            return self.repo.git.rev_parse('--verify', 'FETCH_HEAD^{commit}')
+        except git.exc.GitCommandError as e:
+            raise Exception(f"引用 {ref} 不存在: {str(e)}")
+
+    def list_sql_files_at(self, commit):
+        """
+        列出指定提交中的SQL文件及其blob SHA（git ls-tree），不需要检出
+        
+        Returns:
+            [{'path': 路径, 'blob_id': blob SHA}]
+        """
+        if self.git_repo.access_mode == 'api':
+            files = self._get_api_service().get_file_tree(branch=commit)
+            result = [{'path': f['path'], 'blob_id': f['id']} for f in files]
+        else:
+            if not self.repo:
+                if not self.clone_or_pull():
+                    raise Exception("仓库同步失败，无法列出文件")
+            output = self.repo.git.ls_tree('-r', '-z', '--full-tree', commit)
+            result = []
+            for entry in output.split('\0'):
+                if not entry:
+                    continue
+                info, path = entry.split('\t', 1)
+                mode, object_type, blob_id = info.split(' ')
+                if object_type == 'blob' and path.lower().endswith('.sql'):
+                    result.append({'path': path, 'blob_id': blob_id})
+        
+        if self.git_repo.access_mode == 'api':
+            self._commit_blob_ids[commit] = {f['path']: f['blob_id'] for f in result}
+        result.sort(key=lambda x: x['path'])
+        return result
+
@@ -4,13 +4,115 @@ GitLab API 服务 - 纯API方式操作Git仓库
 """
 import requests
 import logging
+import os
+import platform
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, quote
 from typing import List, Dict, Optional, Any
 import base64
+import hashlib
+import tarfile
+
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
 
+def _default_cache_dir():
+    # 与仓库本地克隆目录保持一致的跨平台位置
+    if platform.system() == 'Windows':
+        return os.path.join(tempfile.gettempdir(), 'hiic_git_cache')
+    return '/tmp/hiic_git_cache'
+
+
+class RateLimiter:
+    """令牌桶限流：平均每秒最多rate个请求，允许rate个的突发"""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BlobContentCache:
+    """
+    文件内容磁盘缓存，以Git blob SHA为键
+    blob SHA由内容决定，内容不变的文件不会被重复下载，缓存也无需失效
+    按字节读写，不做换行符转换，保证读出的内容与blob SHA一致（CRLF文件不会被转换为LF）
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+    
+    def _path(self, blob_id: str) -> str:
+        return os.path.join(self.cache_dir, blob_id[:2], blob_id[2:])
+    
+    def get(self, blob_id: str) -> Optional[str]:
+        if not blob_id:
+            return None
+        try:
+            with open(self._path(blob_id), 'rb') as f:
+                return f.read().decode('utf-8')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"Failed to read cached blob {blob_id}: {str(e)}")
+            return None
+    
+    def put(self, blob_id: str, content: str):
+        if not blob_id:
+            return
+        path = self._path(blob_id)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子替换，并发写入同一blob时不会读到半个文件
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content.encode('utf-8'))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.debug(f"Failed to cache blob {blob_id}: {str(e)}")
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_gitlab_api_service(repo_url: str, token: str, ssl_verify: bool = True) -> 'GitLabAPIService':
+    """
+    获取进程内共享的GitLabAPIService实例
+    同一仓库复用会话连接和已解析的项目ID，不再每次调用都重新请求项目信息
+    """
+    key = (repo_url, token, ssl_verify)
+    service = _services.get(key)
+    if service is None:
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                service = GitLabAPIService(repo_url, token, ssl_verify)
+                _services[key] = service
+    return service
+
+
 class GitLabAPIService:
     """GitLab API服务类"""
     
@@ -37,6 +139,19 @@ class GitLabAPIService:
         })
         self.session.verify = ssl_verify
         
+        config = getattr(settings, 'GITLAB_API_CONFIG', {})
+        self.timeout = config.get('timeout', 30)
+        self.archive_timeout = config.get('archive_timeout', 300)
+        self.compare_max_files = config.get('compare_max_files', 1000)
+        self.max_concurrency = config.get('max_concurrency', 8)
+        self.rate_limiter = RateLimiter(config.get('requests_per_second', 20))
+        self.content_cache = BlobContentCache(config.get('content_cache_dir') or _default_cache_dir())
+        
+        # 连接池大小与并发数一致，并发下载时复用连接
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
         # 获取项目ID
         self._get_project_id()
     
@@ -73,13 +188,7 @@ class GitLabAPIService:
     def get_branches(self) -> List[str]:
         """获取所有分支列表"""
         try:
-            url = f"{self.base_url}/projects/{self.project_id}/repository/branches"
-            
-            response = self.session.get(url)
-            response.raise_for_status()
-            
-            branches_data = response.json()
-            branches = [branch['name'] for branch in branches_data]
+            branches = list(self.get_branch_heads())
             
             logger.info(f"Found {len(branches)} branches for project {self.project_id}")
             return branches
@@ -88,6 +197,84 @@ class GitLabAPIService:
             logger.error(f"Failed to get branches: {str(e)}")
             return ['main', 'master']  # 返回默认分支
     
+    def get_branch_heads(self) -> Dict[str, str]:
+        """
+        获取所有分支及其最新提交SHA
+        
+        Raises:
+            requests.RequestException: 请求失败
+        """
+        url = f"{self.base_url}/projects/{self.project_id}/repository/branches"
+        heads = {}
+        page = 1
+        while True:
+            response = self.session.get(url, params={'per_page': 100, 'page': page}, timeout=self.timeout)
+            response.raise_for_status()
+            branches_data = response.json()
+            for branch in branches_data:
+                heads[branch['name']] = branch['commit']['id']
+            if len(branches_data) < 100:
+                break
+            page += 1
+        return heads
+    
+    def get_branch_head(self, branch: str = 'main') -> Optional[str]:
+        """获取分支最新提交的SHA"""
+        try:
+            encoded_branch = quote(branch, safe='')
+            url = f"{self.base_url}/projects/{self.project_id}/repository/branches/{encoded_branch}"
+            
+            response = self.session.get(url)
+            response.raise_for_status()
+            
+            return response.json()['commit']['id']
+            
+        except Exception as e:
+            logger.error(f"Failed to get head of branch {branch}: {str(e)}")
+            return None
+    
+    def compare(self, from_sha: str, to_sha: str) -> List[Dict]:
+        """
+        比较两个提交之间变更的文件（等价于 git diff --name-status from..to）
+        
+        Args:
+            from_sha: 起始提交
+            to_sha: 目标提交
+            
+        Returns:
+            变更列表，每项包含 status(A/M/D/R)、path、old_path
+            
+        Raises:
+            Exception: 比较结果被GitLab截断（超时、溢出或文件数达到上限），变更列表不完整
+        """
+        url = f"{self.base_url}/projects/{self.project_id}/repository/compare"
+        params = {'from': from_sha, 'to': to_sha, 'straight': True}
+        
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        diffs = data.get('diffs', [])
+        
+        # 超过GitLab的diff文件数上限时多出的文件不会出现在diffs中；collapsed/too_large只省略差异内容，路径仍然完整
+        if data.get('overflow') or data.get('compare_timeout') or len(diffs) >= self.compare_max_files:
+            raise Exception(
+                f"比较结果不完整（{len(diffs)} 个文件），{from_sha[:8]}..{to_sha[:8]} 的变更需要按全部文件重新确定"
+            )
+        
+        changes = []
+        for diff in diffs:
+            if diff.get('deleted_file'):
+                changes.append({'status': 'D', 'path': diff['old_path'], 'old_path': diff['old_path']})
+            elif diff.get('renamed_file'):
+                changes.append({'status': 'R', 'path': diff['new_path'], 'old_path': diff['old_path']})
+            elif diff.get('new_file'):
+                changes.append({'status': 'A', 'path': diff['new_path'], 'old_path': None})
+            else:
+                changes.append({'status': 'M', 'path': diff['new_path'], 'old_path': None})
+        
+        logger.info(f"Found {len(changes)} changed files between {from_sha[:8]} and {to_sha[:8]}")
+        return changes
+    
     def get_file_tree(self, branch: str = 'main', path: str = '', recursive: bool = True) -> List[Dict]:
         """
         获取指定分支和路径下的文件树
@@ -98,7 +285,7 @@ class GitLabAPIService:
             recursive: 是否递归获取子目录
             
         Returns:
-            文件和目录信息列表
+            文件和目录信息列表；请求失败时抛出异常，不返回不完整的列表
         """
         try:
             url = f"{self.base_url}/projects/{self.project_id}/repository/tree"
@@ -146,7 +333,7 @@ class GitLabAPIService:
             
         except Exception as e:
             logger.error(f"Failed to get file tree: {str(e)}")
-            return []
+            raise Exception(f"获取文件树失败: {str(e)}")
     
     def get_file_content(self, file_path: str, branch: str = 'main') -> Optional[str]:
         """
@@ -183,6 +370,120 @@ class GitLabAPIService:
             logger.error(f"Failed to get file content for {file_path}: {str(e)}")
             return None
     
+    def _fetch_blob(self, blob_id: str) -> str:
+        """按blob SHA下载原始内容"""
+        url = f"{self.base_url}/projects/{self.project_id}/repository/blobs/{blob_id}/raw"
+        self.rate_limiter.acquire()
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content.decode('utf-8')
+    
+    def _fetch_file(self, file_path: str, branch: str) -> tuple:
+        """按路径下载文件内容，返回(内容, blob SHA)"""
+        encoded_path = quote(file_path, safe='/')
+        url = f"{self.base_url}/projects/{self.project_id}/repository/files/{encoded_path}"
+        self.rate_limiter.acquire()
+        response = self.session.get(url, params={'ref': branch}, timeout=self.timeout)
+        response.raise_for_status()
+        
+        file_data = response.json()
+        if file_data.get('encoding') == 'base64':
+            content = base64.b64decode(file_data['content']).decode('utf-8')
+        else:
+            content = file_data['content']
+        return content, file_data.get('blob_id', '')
+    
+    def fetch_files(self, files: List[Dict], branch: str = 'main') -> Dict[str, Dict]:
+        """
+        并发批量获取文件内容，优先读取blob缓存
+        
+        Args:
+            files: 文件列表，每项包含path，以及get_file_tree返回的blob SHA（id，可选）
+            branch: 未提供blob SHA时按分支读取
+            
+        Returns:
+            {path: {'content': 内容, 'id': blob SHA}}，获取失败的文件不包含在结果中
+        """
+        results = {}
+        to_fetch = []
+        for file in files:
+            content = self.content_cache.get(file.get('id'))
+            if content is not None:
+                results[file['path']] = {'content': content, 'id': file['id']}
+            else:
+                to_fetch.append(file)
+        
+        def fetch(file):
+            try:
+                if file.get('id'):
+                    content, blob_id = self._fetch_blob(file['id']), file['id']
+                else:
+                    content, blob_id = self._fetch_file(file['path'], branch)
+                self.content_cache.put(blob_id, content)
+                return file['path'], {'content': content, 'id': blob_id}
+            except Exception as e:
+                logger.error(f"Failed to fetch file content for {file['path']}: {str(e)}")
+                return file['path'], None
+        
+        if to_fetch:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(to_fetch))) as executor:
+                for path, result in executor.map(fetch, to_fetch):
+                    if result is not None:
+                        results[path] = result
+        
+        cached = len(files) - len(to_fetch)
+        logger.info(f"Fetched {len(results)}/{len(files)} files: {cached} from cache, "
+                    f"{len(results) - cached} downloaded")
+        return results
+    
+    def download_archive(self, branch: str = 'main') -> Dict[str, str]:
+        """
+        以流式方式下载仓库归档（tar.gz），只提取SQL文件写入blob缓存
+        文件数量较多时一次请求代替成千上万次files接口调用
+        
+        Args:
+            branch: 分支名或提交SHA
+            
+        Returns:
+            {path: blob SHA}，归档中的全部SQL文件
+        """
+        url = f"{self.base_url}/projects/{self.project_id}/repository/archive.tar.gz"
+        self.rate_limiter.acquire()
+        response = self.session.get(
+            url,
+            params={'sha': branch},
+            stream=True,
+            timeout=(self.timeout, self.archive_timeout)
+        )
+        response.raise_for_status()
+        response.raw.decode_content = True
+        
+        blob_ids = {}
+        try:
+            with tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+                for member in archive:
+                    if not member.isfile() or not member.name.lower().endswith('.sql'):
+                        continue
+                    # 归档内路径以 "<项目>-<ref>-<sha>/" 为前缀
+                    parts = member.name.split('/', 1)
+                    if len(parts) < 2:
+                        continue
+                    data = archive.extractfile(member).read()
+                    try:
+                        content = data.decode('utf-8')
+                    except UnicodeDecodeError:
+                        logger.warning(f"Skipping non UTF-8 file in archive: {parts[1]}")
+                        continue
+                    # 与Git一致的blob SHA，和文件树接口返回的id可以互相命中缓存
+                    blob_id = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+                    self.content_cache.put(blob_id, content)
+                    blob_ids[parts[1]] = blob_id
+        finally:
+            response.close()
+        
+        logger.info(f"Extracted {len(blob_ids)} SQL files from archive of {branch}")
+        return blob_ids
+    
     def get_file_info(self, file_path: str, branch: str = 'main') -> Optional[Dict]:
         """
         获取文件信息（不包含内容）
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_git', '0005_gitrepo_successful_auth_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gitrepo',
+            name='clone_depth',
+            field=models.PositiveIntegerField(default=1, help_text='浅克隆的提交深度'),
+        ),
+        migrations.AddField(
+            model_name='gitrepo',
+            name='clone_strategy',
+            field=models.CharField(choices=[('full', '完整克隆'), ('shallow', '浅克隆'), ('partial', '部分克隆'), ('sparse', '稀疏检出')], default='full', help_text='克隆策略：完整克隆、浅克隆（--depth）、部分克隆（--filter=blob:none）或只检出SQL文件的稀疏检出；修改后需删除本地目录重新克隆', max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_git', '0006_gitrepo_clone_depth_gitrepo_clone_strategy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gitrepo',
+            name='last_checked_at',
+            field=models.DateTimeField(blank=True, help_text='定时任务最近一次检查远程HEAD的时间', null=True),
+        ),
+        migrations.AddField(
+            model_name='gitrepo',
+            name='webhook_token',
+            field=models.CharField(blank=True, help_text='GitLab推送Webhook的Secret Token，为空时不接受该仓库的Webhook', max_length=255),
+        ),
+    ]
@@ -17,6 +17,13 @@ class GitRepo(models.Model):
         ('api', 'API访问'),
     ]
     
+    CLONE_STRATEGY_CHOICES = [
+        ('full', '完整克隆'),
+        ('shallow', '浅克隆'),
+        ('partial', '部分克隆'),
+        ('sparse', '稀疏检出'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     repo_url = models.URLField()
@@ -26,12 +33,21 @@ class GitRepo(models.Model):
     auth_type = models.CharField(max_length=10, choices=AUTH_TYPE_CHOICES, default='password', help_text='认证方式：密码或Token')
     access_mode = models.CharField(max_length=10, choices=ACCESS_MODE_CHOICES, default='clone', help_text='访问模式：本地克隆或API访问')
     branch = models.CharField(max_length=100, default='main')
+    clone_strategy = models.CharField(
+        max_length=10,
+        choices=CLONE_STRATEGY_CHOICES,
+        default='full',
+        help_text='克隆策略：完整克隆、浅克隆（--depth）、部分克隆（--filter=blob:none）或只检出SQL文件的稀疏检出；修改后需删除本地目录重新克隆'
+    )
+    clone_depth = models.PositiveIntegerField(default=1, help_text='浅克隆的提交深度')
     ssl_verify = models.BooleanField(default=True, help_text='是否验证SSL证书，内网私有GitLab建议设为False')
     successful_auth_format = models.CharField(max_length=50, blank=True, help_text='记录最后一次成功的认证格式，用于优化后续认证')
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_sync = models.DateTimeField(null=True, blank=True)
+    last_checked_at = models.DateTimeField(null=True, blank=True, help_text='定时任务最近一次检查远程HEAD的时间')
+    webhook_token = models.CharField(max_length=255, blank=True, help_text='GitLab推送Webhook的Secret Token，为空时不接受该仓库的Webhook')
 
     class Meta:
         unique_together = ['user', 'repo_url']
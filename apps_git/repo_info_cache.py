@@ -0,0 +1,108 @@
+"""
+仓库分支列表和提交历史缓存
+每个仓库的结果带有版本标识（ETag，由分支HEAD SHA计算），在TTL内直接返回；
+过期后先返回旧结果，同时在git线程池中重新校验：版本未变化只续期，变化时才重新加载
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps_core.executors import get_executor, ExecutorBusy
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'git_repo_info'
+
+
+def make_etag(*parts):
+    return hashlib.sha1('\n'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:20]
+
+
+class RepoInfoCache:
+    """基于Django缓存的仓库信息缓存，后台刷新在有界的git线程池中执行"""
+
+    def __init__(self):
+        config = getattr(settings, 'GIT_INFO_CACHE_CONFIG', {})
+        self.ttls = {
+            'branches': config.get('branches_ttl', 300),
+            'commits': config.get('commits_ttl', 60),
+        }
+        # 超过该时间的旧结果不再直接返回，同步重新加载
+        self.max_stale = config.get('max_stale', 3600)
+
+    def _generation_key(self, git_repo):
+        return f"{CACHE_PREFIX}:{git_repo.id}:generation"
+
+    def _key(self, git_repo, kind, variant=''):
+        # 键中包含代际号，invalidate时递增代际号即可使该仓库的全部缓存项失效
+        generation = cache.get(self._generation_key(git_repo), 0)
+        return f"{CACHE_PREFIX}:{git_repo.id}:{generation}:{kind}:{variant}"
+
+    def get(self, git_repo, kind, loader, validator=None, variant=''):
+        """
+        读取缓存的仓库信息
+
+        Args:
+            kind: 'branches' 或 'commits'
+            loader: 无参调用，返回 (value, etag)
+            validator: 可选的无参调用，廉价地返回当前etag，用于判断缓存是否仍然有效
+            variant: 同一类信息的不同参数（如分支名、条数）
+
+        Returns:
+            (value, etag)
+        """
+        key = self._key(git_repo, kind, variant)
+        entry = cache.get(key)
+        now = time.time()
+
+        if entry is not None:
+            age = now - entry['fetched_at']
+            if age < self.ttls[kind]:
+                return entry['value'], entry['etag']
+            if age < self.max_stale:
+                self._refresh_in_background(key, kind, loader, validator)
+                return entry['value'], entry['etag']
+
+        return self._load(key, kind, loader)
+
+    def _load(self, key, kind, loader):
+        value, etag = loader()
+        cache.set(key, {'value': value, 'etag': etag, 'fetched_at': time.time()}, self.max_stale)
+        return value, etag
+
+    def _refresh_in_background(self, key, kind, loader, validator):
+        # 同一缓存项同时只允许一个后台刷新
+        if not cache.add(f"{key}:refreshing", True, 60):
+            return
+
+        def refresh():
+            try:
+                entry = cache.get(key)
+                if validator and entry is not None:
+                    etag = validator()
+                    if etag and etag == entry['etag']:
+                        entry['fetched_at'] = time.time()
+                        cache.set(key, entry, self.max_stale)
+                        return
+                self._load(key, kind, loader)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {str(e)}")
+            finally:
+                cache.delete(f"{key}:refreshing")
+
+        try:
+            get_executor('git').submit(refresh)
+        except ExecutorBusy:
+            # 线程池繁忙时本次不刷新，继续返回旧结果
+            cache.delete(f"{key}:refreshing")
+
+    def invalidate(self, git_repo):
+        """仓库同步、提交或切换分支后清除该仓库的缓存"""
+        generation_key = self._generation_key(git_repo)
+        try:
+            cache.incr(generation_key)
+        except ValueError:
+            cache.set(generation_key, 1, None)
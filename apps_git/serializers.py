@@ -17,9 +17,11 @@ class GitRepoSerializer(serializers.ModelSerializer):
         model = GitRepo
         fields = [
             'id', 'name', 'repo_url', 'username', 'password', 'auth_type', 'branch', 
-            'ssl_verify', 'is_active', 'created_at', 'updated_at', 'last_sync', 'user'
+            'clone_strategy', 'clone_depth', 'ssl_verify', 'webhook_token', 'is_active',
+            'created_at', 'updated_at', 'last_sync', 'last_checked_at', 'user'
         ]
-        read_only_fields = ['created_at', 'updated_at', 'last_sync']
+        read_only_fields = ['created_at', 'updated_at', 'last_sync', 'last_checked_at']
+        extra_kwargs = {'webhook_token': {'write_only': True, 'required': False}}
 
     def create(self, validated_data):
         password = validated_data.pop('password')
@@ -60,7 +62,8 @@ class GitFileSerializer(serializers.Serializer):
     path = serializers.CharField()
     full_path = serializers.CharField()
     size = serializers.IntegerField()
-    modified = serializers.FloatField()
+    modified = serializers.FloatField(allow_null=True)
+    blob_id = serializers.CharField(required=False)
 
 
 class GitCommitSerializer(serializers.Serializer):
@@ -1,3 +1,501 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import git
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps_lineage.lineage_differ import git_blob_sha
+from apps_lineage.models import LineageParseJob
+from .git_blob_reader import GitBlobReader
+from .git_service import GitService
+from .gitlab_api_service import BlobContentCache, GitLabAPIService
+from .models import GitRepo
+from .repo_info_cache import RepoInfoCache
+
+
+class FakeResponse:
+
+    def __init__(self, data=None, content=b'', status_code=200):
+        self.data = data
+        self.content = content
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} error')
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """按URL路径后缀返回预设响应的requests会话替身，记录每次请求"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def get(self, url, params=None, **kwargs):
+        self.calls.append((url, params))
+        for suffix, response in self.routes.items():
+            if url.endswith(suffix):
+                return response(url, params) if callable(response) else response
+        return FakeResponse(status_code=404)
+
+
+def api_service(routes):
+    with mock.patch.object(GitLabAPIService, '_get_project_id'):
+        service = GitLabAPIService('https://git.example.com/dw/repo.git', 'token')
+    service.project_id = 1
+    service.session = FakeSession(routes)
+    return service
+
+
+class LocalRepoTestCase(SimpleTestCase):
+    """在临时目录中创建本地Git仓库，GitService以Clone模式直接使用，不访问远程"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.git('init', '-q', '-b', 'main')
+        self.git_repo = GitRepo(name='repo', repo_url='https://git.example.com/dw/repo.git', local_path=self.path)
+        self.service = GitService(self.git_repo)
+        self.service.repo = git.Repo(self.path)
+
+    def git(self, *args):
+        return subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+            cwd=self.path, check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    def write(self, path, content):
+        full_path = os.path.join(self.path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+
+    def commit(self, message='update'):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', message)
+        return self.git('rev-parse', 'HEAD')
+
+
+class CommitChangesTests(LocalRepoTestCase):
+
+    def test_changes_between_commits_include_renames_and_deletes(self):
+        self.write('dw/a.sql', 'INSERT INTO dw.t SELECT id FROM dw.s;\n' * 20)
+        self.write('dw/b.sql', 'SELECT 1;\n')
+        self.write('dw/c.sql', 'SELECT 2;\n')
+        old = self.commit()
+
+        self.git('mv', 'dw/a.sql', 'dw/renamed.sql')
+        self.git('rm', '-q', 'dw/b.sql')
+        self.write('dw/c.sql', 'SELECT 3;\n')
+        self.write('dw/数据.sql', 'SELECT 4;\n')
+        new = self.commit()
+
+        changes = sorted(self.service.get_changes_between(old, new), key=lambda change: change['path'])
+        self.assertEqual(changes, [
+            {'status': 'D', 'path': 'dw/b.sql', 'old_path': None},
+            {'status': 'M', 'path': 'dw/c.sql', 'old_path': None},
+            {'status': 'R', 'path': 'dw/renamed.sql', 'old_path': 'dw/a.sql'},
+            {'status': 'A', 'path': 'dw/数据.sql', 'old_path': None},
+        ])
+        self.assertEqual(self.service.get_changes_between(new, new), [])
+
+    def test_gitlab_compare_maps_diff_flags(self):
+        service = api_service({'/repository/compare': FakeResponse({'diffs': [
+            {'old_path': 'a.sql', 'new_path': 'a.sql', 'deleted_file': True},
+            {'old_path': 'b.sql', 'new_path': 'c.sql', 'renamed_file': True},
+            {'old_path': 'd.sql', 'new_path': 'd.sql', 'new_file': True},
+            {'old_path': 'e.sql', 'new_path': 'e.sql'},
+        ]})})
+        self.assertEqual(service.compare('a' * 40, 'b' * 40), [
+            {'status': 'D', 'path': 'a.sql', 'old_path': 'a.sql'},
+            {'status': 'R', 'path': 'c.sql', 'old_path': 'b.sql'},
+            {'status': 'A', 'path': 'd.sql', 'old_path': None},
+            {'status': 'M', 'path': 'e.sql', 'old_path': None},
+        ])
+
+    def test_gitlab_compare_rejects_truncated_results(self):
+        for data in (
+            {'diffs': [], 'overflow': True},
+            {'diffs': [], 'compare_timeout': True},
+            {'diffs': [{'old_path': f'{i}.sql', 'new_path': f'{i}.sql'} for i in range(3)]},
+        ):
+            with self.subTest(data=data):
+                service = api_service({'/repository/compare': FakeResponse(data)})
+                service.compare_max_files = 3
+                with self.assertRaises(Exception):
+                    service.compare('a' * 40, 'b' * 40)
+
+
+class BlobFetchTests(SimpleTestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.cache = BlobContentCache(cache_dir)
+
+    def test_fetch_files_reads_cache_and_downloads_missing_blobs(self):
+        self.cache.put('a' * 40, 'SELECT 1;\n')
+        service = api_service({
+            f'/blobs/{"b" * 40}/raw': FakeResponse(content='SELECT 2;\n'.encode('utf-8')),
+            '/repository/files/dw/new.sql': FakeResponse({'content': 'SELECT 3;\n', 'blob_id': 'd' * 40}),
+        })
+        service.content_cache = self.cache
+
+        results = service.fetch_files([
+            {'path': 'dw/a.sql', 'id': 'a' * 40},
+            {'path': 'dw/b.sql', 'id': 'b' * 40},
+            {'path': 'dw/missing.sql', 'id': 'c' * 40},
+            {'path': 'dw/new.sql', 'id': None},
+        ])
+        self.assertEqual(results, {
+            'dw/a.sql': {'content': 'SELECT 1;\n', 'id': 'a' * 40},
+            'dw/b.sql': {'content': 'SELECT 2;\n', 'id': 'b' * 40},
+            'dw/new.sql': {'content': 'SELECT 3;\n', 'id': 'd' * 40},
+        })
+        self.assertEqual(len(service.session.calls), 3)
+        self.assertEqual(self.cache.get('b' * 40), 'SELECT 2;\n')
+        self.assertEqual(self.cache.get('d' * 40), 'SELECT 3;\n')
+
+        # 再次读取全部命中缓存
+        service.fetch_files([{'path': 'dw/b.sql', 'id': 'b' * 40}])
+        self.assertEqual(len(service.session.calls), 3)
+
+    def test_cache_keeps_crlf_line_endings(self):
+        content = 'SELECT 1;\r\nSELECT 2;\r\n'
+        blob_id = git_blob_sha(content)
+        self.cache.put(blob_id, content)
+        cached = self.cache.get(blob_id)
+        self.assertEqual(cached, content)
+        self.assertEqual(git_blob_sha(cached), blob_id)
+
+
+def archive_response(files):
+    """GitLab仓库归档的替身：路径以 "<项目>-<ref>-<sha>/" 为前缀的tar.gz"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for path, content in files.items():
+            data = content.encode('utf-8')
+            member = tarfile.TarInfo(f'repo-main-0123abcd/{path}')
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+    response = FakeResponse()
+    response.raw = io.BytesIO(buffer.getvalue())
+    return response
+
+
+@override_settings(GITLAB_API_CONFIG={'archive_threshold': 2})
+class BulkReadTests(SimpleTestCase):
+
+    FILES = {'dw/a.sql': 'SELECT 1;\n', 'dw/b.sql': 'SELECT 2;\n', 'dw/c.sql': 'SELECT 3;\n'}
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.cache = BlobContentCache(cache_dir)
+
+    def git_service(self, routes):
+        api = api_service(routes)
+        api.content_cache = self.cache
+        patcher = mock.patch.object(GitService, '_get_api_service', return_value=api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        service = GitService(GitRepo(name='repo', repo_url=api.repo_url, access_mode='api'))
+        service._blob_ids = {path: git_blob_sha(content) for path, content in self.FILES.items()}
+        return service, api
+
+    def test_archive_downloaded_when_many_files_are_uncached(self):
+        service, api = self.git_service({'/repository/archive.tar.gz': archive_response(self.FILES)})
+        service.prepare_bulk_read(list(self.FILES))
+        self.assertEqual(len(api.session.calls), 1)
+
+        # 之后的读取全部命中归档写入的缓存
+        self.assertEqual(service.read_file('dw/b.sql'), 'SELECT 2;\n')
+        self.assertEqual(len(api.session.calls), 1)
+
+    def test_files_fetched_individually_when_mostly_cached(self):
+        self.cache.put(git_blob_sha('SELECT 1;\n'), 'SELECT 1;\n')
+        self.cache.put(git_blob_sha('SELECT 2;\n'), 'SELECT 2;\n')
+        service, api = self.git_service({})
+        service.prepare_bulk_read(list(self.FILES))
+        self.assertEqual(api.session.calls, [])
+
+    def test_archive_failure_falls_back_to_file_requests(self):
+        blob_id = git_blob_sha('SELECT 3;\n')
+        service, api = self.git_service({f'/blobs/{blob_id}/raw': FakeResponse(content=b'SELECT 3;\n')})
+        service.prepare_bulk_read(list(self.FILES))
+        self.assertEqual(service.read_file('dw/c.sql'), 'SELECT 3;\n')
+
+
+class CloneStrategyTests(LocalRepoTestCase):
+
+    def test_clone_options_and_fetch_args(self):
+        expected = {
+            'full': ({}, []),
+            'shallow': ({'depth': 3, 'single_branch': True}, ['--depth=3', 'main']),
+            'partial': ({'filter': 'blob:none'}, []),
+            'sparse': ({'filter': 'blob:none', 'sparse': True}, []),
+        }
+        self.git_repo.clone_depth = 3
+        for strategy, (options, fetch_args) in expected.items():
+            with self.subTest(strategy=strategy):
+                self.git_repo.clone_strategy = strategy
+                self.assertEqual(self.service._clone_options(), options)
+                self.assertEqual(self.service._fetch_args(), fetch_args)
+
+    def test_shallow_clone_fetches_missing_base_commit(self):
+        self.write('a.sql', 'SELECT 1;\n')
+        base = self.commit()
+        for i in range(3):
+            self.write('a.sql', f'SELECT {i + 2};\n')
+            head = self.commit()
+
+        clone_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, clone_path, ignore_errors=True)
+        git.Repo.clone_from(f'file://{self.path}', clone_path, depth=1, single_branch=True)
+        shallow = GitService(GitRepo(
+            name='shallow', repo_url=self.git_repo.repo_url, local_path=clone_path, clone_strategy='shallow'
+        ))
+        shallow.repo = git.Repo(clone_path)
+        self.assertFalse(shallow._has_commit(base))
+
+        self.assertEqual(shallow.get_changes_between(base, head), [{'status': 'M', 'path': 'a.sql', 'old_path': None}])
+        self.assertTrue(shallow._has_commit(base))
+
+
+class IndexFileListTests(LocalRepoTestCase):
+
+    def test_sql_files_listed_from_index_with_blob_ids(self):
+        self.write('dw/load.sql', 'SELECT 1;\n')
+        self.write('dw/报表 2024.sql', 'SELECT 2;\n')
+        self.write('README.md', '# repo\n')
+        self.commit()
+
+        files = self.service.get_sql_files()
+        self.assertEqual([f['path'] for f in files], ['dw/load.sql', 'dw/报表 2024.sql'])
+        load = files[0]
+        self.assertEqual(load['blob_id'], self.git('hash-object', 'dw/load.sql'))
+        self.assertEqual(load['size'], len('SELECT 1;\n'))
+        self.assertEqual(load['full_path'], os.path.join(self.path, 'dw/load.sql'))
+        self.assertFalse(load['api_mode'])
+
+    def test_file_list_cached_until_head_moves(self):
+        self.write('a.sql', 'SELECT 1;\n')
+        self.commit()
+        first = self.service.get_sql_files()
+        first[0]['path'] = 'changed by caller'
+        self.assertEqual(self.service.get_sql_files()[0]['path'], 'a.sql')
+
+        self.write('b.sql', 'SELECT 2;\n')
+        self.commit()
+        self.assertEqual([f['path'] for f in self.service.get_sql_files()], ['a.sql', 'b.sql'])
+
+
+class GitBlobReaderTests(LocalRepoTestCase):
+
+    def test_read_files_at_commit(self):
+        self.write('a.sql', 'SELECT 1;\n')
+        first = self.commit()
+        self.write('a.sql', 'SELECT 2;\n')
+        with open(os.path.join(self.path, 'latin1.sql'), 'wb') as f:
+            f.write('SELECT \'é\';\n'.encode('latin-1'))
+        self.commit()
+
+        with GitBlobReader(self.path) as reader:
+            self.assertEqual(list(reader.read_files(first, ['a.sql', 'missing.sql'])), [
+                ('a.sql', 'SELECT 1;\n'), ('missing.sql', None)
+            ])
+            self.assertEqual(list(reader.read_files('HEAD', ['a.sql', 'latin1.sql'])), [
+                ('a.sql', 'SELECT 2;\n'), ('latin1.sql', None)
+            ])
+            # 目录等非blob对象不返回内容
+            self.assertIsNone(reader.read('HEAD^{tree}'))
+            self.assertIsNone(reader.read('HEAD:a.sql\nHEAD:a.sql'))
+
+    def test_reader_restarts_exited_process(self):
+        self.write('a.sql', 'SELECT 1;\n')
+        self.commit()
+        with GitBlobReader(self.path) as reader:
+            self.assertEqual(reader.read('HEAD:a.sql'), b'SELECT 1;\n')
+            reader._process.kill()
+            reader._process.wait()
+            self.assertEqual(reader.read('HEAD:a.sql'), b'SELECT 1;\n')
+
+    def test_iter_file_contents_reads_object_store(self):
+        self.write('a.sql', 'SELECT 1;\n')
+        self.commit()
+        # 工作区的未提交修改不影响按提交读取
+        self.write('a.sql', 'SELECT 2;\n')
+        self.assertEqual(list(self.service.iter_file_contents(['a.sql'])), [('a.sql', 'SELECT 1;\n')])
+
+
+class CommitSnapshotTests(LocalRepoTestCase):
+
+    def test_resolve_ref_and_list_files_at_commit(self):
+        self.write('dw/a.sql', 'SELECT 1;\n')
+        first = self.commit()
+        self.git('tag', 'v1')
+        self.git('checkout', '-q', '-b', 'feature')
+        self.write('dw/b.SQL', 'SELECT 2;\n')
+        self.write('notes.txt', 'notes\n')
+        feature = self.commit()
+        self.git('checkout', '-q', 'main')
+
+        self.assertEqual(self.service.resolve_ref('v1'), first)
+        self.assertEqual(self.service.resolve_ref('feature'), feature)
+        self.assertEqual(self.service.resolve_ref(first[:10]), first)
+        with self.assertRaises(Exception):
+            self.service.resolve_ref('no-such-branch')
+
+        # 不切换工作区即可列出其他分支上的文件
+        self.assertEqual(self.service.list_sql_files_at(feature), [
+            {'path': 'dw/a.sql', 'blob_id': self.git('rev-parse', f'{first}:dw/a.sql')},
+            {'path': 'dw/b.SQL', 'blob_id': self.git('rev-parse', f'{feature}:dw/b.SQL')},
+        ])
+        self.assertEqual(self.git('rev-parse', '--abbrev-ref', 'HEAD'), 'main')
+
+
+class SynchronousExecutor:
+    """替换git线程池，提交的任务在当前线程执行"""
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+@override_settings(GIT_INFO_CACHE_CONFIG={'branches_ttl': 60, 'commits_ttl': 60, 'max_stale': 600})
+class RepoInfoCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.git_repo = GitRepo(id=1, name='repo')
+        self.now = 1000.0
+        patcher = mock.patch('apps_git.repo_info_cache.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('apps_git.repo_info_cache.get_executor', lambda name: SynchronousExecutor())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loads = []
+        self.etag = 'v1'
+
+    def loader(self):
+        self.loads.append(self.etag)
+        return f'value-{len(self.loads)}', self.etag
+
+    def get(self):
+        return RepoInfoCache().get(self.git_repo, 'commits', self.loader, validator=lambda: self.etag)
+
+    def test_fresh_entries_are_served_from_cache(self):
+        self.assertEqual(self.get(), ('value-1', 'v1'))
+        self.now += 59
+        self.assertEqual(self.get(), ('value-1', 'v1'))
+        self.assertEqual(len(self.loads), 1)
+
+    def test_stale_entry_revalidated_by_etag(self):
+        self.get()
+        self.now += 61
+        # 版本未变化时只续期
+        self.assertEqual(self.get(), ('value-1', 'v1'))
+        self.assertEqual(len(self.loads), 1)
+        self.now += 30
+        self.get()
+        self.assertEqual(len(self.loads), 1)
+
+        # 版本变化时先返回旧结果，后台重新加载
+        self.etag = 'v2'
+        self.now += 61
+        self.assertEqual(self.get(), ('value-1', 'v1'))
+        self.assertEqual(self.get(), ('value-2', 'v2'))
+
+    def test_expired_entry_and_invalidate_reload(self):
+        self.get()
+        self.now += 601
+        self.assertEqual(self.get(), ('value-2', 'v1'))
+        RepoInfoCache().invalidate(self.git_repo)
+        self.assertEqual(self.get(), ('value-3', 'v1'))
+
+
+class GitLabWebhookTests(TestCase):
+
+    URL = '/api/git/webhooks/gitlab/'
+
+    def setUp(self):
+        user = User.objects.create(username='webhook')
+        self.repo = GitRepo.objects.create(
+            user=user, name='repo', repo_url='https://git.example.com/dw/repo.git',
+            branch='main', webhook_token='secret'
+        )
+        LineageParseJob.objects.create(
+            git_repo=self.repo, parse_type='full', status='completed', commit_sha='a' * 40, completed_at=timezone.now()
+        )
+
+    def push(self, ref='refs/heads/main', after='b' * 40, token='secret', url='https://git.example.com/dw/repo'):
+        payload = {'object_kind': 'push', 'ref': ref, 'after': after, 'project': {'web_url': url}}
+        return self.client.post(self.URL, payload, content_type='application/json', HTTP_X_GITLAB_TOKEN=token)
+
+    def incremental_jobs(self):
+        return LineageParseJob.objects.filter(git_repo=self.repo, parse_type='incremental')
+
+    def test_push_to_configured_branch_queues_one_job(self):
+        response = self.push()
+        self.assertEqual(response.status_code, 202)
+        job = self.incremental_jobs().get()
+        self.assertEqual(response.json()['jobs'], [job.id])
+
+        # 连续推送合并到同一个待执行任务
+        self.assertEqual(self.push(after='c' * 40).json()['jobs'], [job.id])
+        self.assertEqual(self.incremental_jobs().count(), 1)
+
+    def test_push_of_parsed_commit_queues_nothing(self):
+        self.assertEqual(self.push(after='a' * 40).json()['jobs'], [])
+        self.assertFalse(self.incremental_jobs().exists())
+
+    def test_token_is_checked(self):
+        self.assertEqual(self.push(token='wrong').status_code, 403)
+        self.assertEqual(self.push(token='').status_code, 403)
+        self.assertFalse(self.incremental_jobs().exists())
+
+    def test_other_refs_and_projects_are_ignored(self):
+        for kwargs in (
+            {'ref': 'refs/tags/v1'},
+            {'ref': 'refs/heads/feature'},
+            {'after': '0' * 40},
+            {'url': 'https://git.example.com/dw/other'},
+        ):
+            with self.subTest(**kwargs):
+                response = self.push(**kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['status'], 'ignored')
+        self.assertFalse(self.incremental_jobs().exists())
+
+
+class FileListingTests(SimpleTestCase):
+
+    def test_api_listing_error_raises(self):
+        git_repo = GitRepo(name='repo', repo_url='https://git.example.com/dw/repo.git', access_mode='api')
+        service = GitService(git_repo)
+        with mock.patch.object(GitService, '_get_api_service', return_value=api_service({})):
+            with self.assertRaises(Exception):
+                service.get_sql_files()
+
+    def test_clone_listing_raises_when_sync_fails(self):
+        git_repo = GitRepo(name='repo', repo_url='https://git.example.com/dw/repo.git', local_path='/nonexistent')
+        service = GitService(git_repo)
+        with mock.patch.object(GitService, 'clone_or_pull', return_value=False):
+            with self.assertRaises(Exception):
+                service.get_sql_files()
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import GitRepoViewSet, UserViewSet
+from .views import GitRepoViewSet, UserViewSet, GitWebhookViewSet
 
 router = DefaultRouter()
 router.register(r'repos', GitRepoViewSet, basename='gitrepo')
 router.register(r'users', UserViewSet)
+router.register(r'webhooks', GitWebhookViewSet, basename='webhook')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
+import hmac
 import os
 import logging
 from .models import GitRepo
@@ -12,6 +13,8 @@ from .serializers import (
     FileContentSerializer, CommitSerializer, UserSerializer
 )
 from .git_service import GitService
+from .repo_info_cache import RepoInfoCache
+from apps_core.executors import run_blocking, ExecutorBusy
 
 logger = logging.getLogger(__name__)
 
@@ -60,7 +63,8 @@ class GitRepoViewSet(viewsets.ModelViewSet):
         git_service = GitService(git_repo)
         
         try:
-            success = git_service.clone_or_pull()
+            success = run_blocking('git', git_service.clone_or_pull)
+            RepoInfoCache().invalidate(git_repo)
             if success:
                 return Response({'status': 'success', 'message': 'Repository synced successfully'})
             else:
@@ -68,6 +72,8 @@ class GitRepoViewSet(viewsets.ModelViewSet):
                     {'status': 'error', 'message': 'Failed to sync repository'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        except ExecutorBusy:
+            raise
         except Exception as e:
             error_message = str(e)
             
@@ -91,7 +97,7 @@ class GitRepoViewSet(viewsets.ModelViewSet):
         """强制重新克隆仓库"""
         git_repo = self.get_object()
         
-        try:
+        def reclone():
             # 删除本地仓库目录
             local_path = git_repo.repo_local_path
             if os.path.exists(local_path):
@@ -101,7 +107,12 @@ class GitRepoViewSet(viewsets.ModelViewSet):
             
             # 重新克隆
             git_service = GitService(git_repo)
-            success = git_service.clone_or_pull()
+            return git_service.clone_or_pull()
+        
+        try:
+            # 删除与克隆在同一个任务中执行，线程池繁忙被拒绝时不会留下已删除的仓库
+            success = run_blocking('git', reclone)
+            RepoInfoCache().invalidate(git_repo)
             
             if success:
                 return Response({
@@ -114,6 +125,8 @@ class GitRepoViewSet(viewsets.ModelViewSet):
                     'message': '重新克隆失败'
                 }, status=status.HTTP_400_BAD_REQUEST)
                 
+        except ExecutorBusy:
+            raise
         except Exception as e:
             return Response({
                 'status': 'error',
@@ -126,7 +139,16 @@ class GitRepoViewSet(viewsets.ModelViewSet):
         git_repo = self.get_object()
         git_service = GitService(git_repo)
         
-        sql_files = git_service.get_sql_files()
+        try:
+            sql_files = run_blocking('git', git_service.get_sql_files)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            return Response({
+                'status': 'error',
+                'message': '获取文件列表失败',
+                'details': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         serializer = GitFileSerializer(sql_files, many=True)
         return Response(serializer.data)
 
@@ -142,7 +164,7 @@ class GitRepoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        content = git_service.read_file(file_path)
+        content = run_blocking('git', git_service.read_file, file_path)
         if content is None:
             return Response(
                 {'error': 'File not found'}, 
@@ -184,7 +206,8 @@ class GitRepoViewSet(viewsets.ModelViewSet):
         file_paths = serializer.validated_data['file_paths']
         commit_message = serializer.validated_data['commit_message']
         
-        success = git_service.commit_and_push(file_paths, commit_message)
+        success = run_blocking('git', git_service.commit_and_push, file_paths, commit_message)
+        RepoInfoCache().invalidate(git_repo)
         if success:
             return Response({'status': 'success', 'message': 'Changes committed and pushed successfully'})
         else:
@@ -200,12 +223,14 @@ class GitRepoViewSet(viewsets.ModelViewSet):
         git_service = GitService(git_repo)
         
         try:
-            branches = git_service.get_remote_branches()
-            return Response({
+            branches, etag = run_blocking('git', git_service.get_cached_branches)
+            return self._etag_response(request, etag, {
                 'branches': branches,
                 'current_branch': git_repo.branch,
                 'status': 'success'
             })
+        except ExecutorBusy:
+            raise
         except Exception as e:
             return Response({
                 'error': '获取分支列表失败',
@@ -228,6 +253,7 @@ class GitRepoViewSet(viewsets.ModelViewSet):
         # 更新仓库配置中的分支
         git_repo.branch = new_branch
         git_repo.save()
+        RepoInfoCache().invalidate(git_repo)
         
         return Response({
             'status': 'success',
@@ -241,9 +267,19 @@ class GitRepoViewSet(viewsets.ModelViewSet):
         git_service = GitService(git_repo)
         
         limit = int(request.query_params.get('limit', 10))
-        commits = git_service.get_commit_history(limit)
+        commits, etag = run_blocking('git', git_service.get_cached_commit_history, limit)
         serializer = GitCommitSerializer(commits, many=True)
-        return Response(serializer.data)
+        return self._etag_response(request, etag, serializer.data)
+
+    def _etag_response(self, request, etag, data):
+        """带ETag的响应，客户端版本未变化时返回304"""
+        quoted_etag = f'"{etag}"'
+        if request.headers.get('If-None-Match') == quoted_etag:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = quoted_etag
+        return response
     
     def destroy(self, request, *args, **kwargs):
         """删除Git仓库配置，同时清理本地文件"""
@@ -287,3 +323,58 @@ class GitRepoViewSet(viewsets.ModelViewSet):
                 'message': '删除仓库失败',
                 'details': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class GitWebhookViewSet(viewsets.ViewSet):
+    """GitLab推送Webhook：推送到仓库配置的分支后提交增量解析任务"""
+    permission_classes = [AllowAny]  # 通过X-Gitlab-Token校验
+    authentication_classes = []
+
+    @staticmethod
+    def _normalize_url(url):
+        url = (url or '').strip().lower().rstrip('/')
+        return url[:-4] if url.endswith('.git') else url
+
+    @action(detail=False, methods=['post'])
+    def gitlab(self, request):
+        from apps_lineage.repo_scheduler import RepoSyncScheduler
+        
+        payload = request.data
+        if payload.get('object_kind') != 'push':
+            return Response({'status': 'ignored', 'message': f"不处理 {payload.get('object_kind')} 事件"})
+        
+        ref = payload.get('ref', '')
+        after = payload.get('after', '')
+        if not ref.startswith('refs/heads/') or not after or set(after) == {'0'}:
+            # 标签推送或分支删除
+            return Response({'status': 'ignored', 'message': '非分支推送'})
+        branch = ref[len('refs/heads/'):]
+        
+        project = payload.get('project') or {}
+        project_urls = {
+            self._normalize_url(project.get(key))
+            for key in ('git_http_url', 'web_url', 'http_url')
+            if project.get(key)
+        }
+        token = request.headers.get('X-Gitlab-Token', '')
+        
+        repos = [
+            repo for repo in GitRepo.objects.filter(is_active=True, branch=branch).exclude(webhook_token='')
+            if self._normalize_url(repo.repo_url) in project_urls
+        ]
+        if not repos:
+            return Response({'status': 'ignored', 'message': '没有匹配的仓库配置'})
+        
+        authorized = [repo for repo in repos if hmac.compare_digest(repo.webhook_token, token)]
+        if not authorized:
+            return Response({'error': 'Webhook Token校验失败'}, status=status.HTTP_403_FORBIDDEN)
+        
+        scheduler = RepoSyncScheduler()
+        jobs = []
+        for repo in authorized:
+            job = scheduler.request_incremental_parse(repo, head_sha=after, reason='gitlab push')
+            if job:
+                jobs.append(job.id)
+        
+        return Response({'status': 'success', 'jobs': jobs}, status=status.HTTP_202_ACCEPTED)
+
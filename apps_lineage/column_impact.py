@@ -0,0 +1,219 @@
+"""
+字段级影响分析
+表级影响会把下游所有表都算作受影响；这里只沿字段级血缘（ColumnLineage）展开，
+并可按转换类型剪枝（如聚合后的字段不受源字段格式变化影响）。
+字段图在内存中按 (表ID, 小写字段名) 编号建立邻接表，随血缘图版本号重新加载
+"""
+import logging
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+
+from apps_metadata.models import HiveTable
+from .models import ColumnLineage
+from .graph_version import get_graph_version
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数有限，IN查询分批执行
+QUERY_CHUNK_SIZE = 500
+
+# 转换类型：direct 直接传递，expression 运算表达式，function 函数调用，aggregate 聚合，case 条件分支
+TRANSFORM_TYPES = ('direct', 'expression', 'function', 'aggregate', 'case')
+
+AGGREGATE_FUNCTIONS = {
+    'SUM', 'COUNT', 'AVG', 'MIN', 'MAX', 'COLLECT_SET', 'COLLECT_LIST', 'STDDEV', 'STDDEV_POP',
+    'STDDEV_SAMP', 'VARIANCE', 'VAR_POP', 'VAR_SAMP', 'PERCENTILE', 'PERCENTILE_APPROX',
+    'HISTOGRAM_NUMERIC', 'CORR', 'COVAR_POP', 'COVAR_SAMP',
+}
+
+_COLUMN_REFERENCE = re.compile(r'^[`"\w]+(\.[`"\w]+){0,2}$')
+_FUNCTION_CALL = re.compile(r'([A-Za-z_][\w]*)\s*\(')
+
+
+def classify_transform(code, transform_type=''):
+    """
+    根据转换表达式判断转换类型
+
+    Args:
+        code: 表达式文本，为空表示直接传递
+        transform_type: SQLFlow给出的类型，表达式无法判断时使用
+    """
+    code = (code or '').strip()
+    if not code or _COLUMN_REFERENCE.match(code):
+        return 'direct'
+    if code.upper().startswith('CASE') or code.upper().startswith('IF('):
+        return 'case'
+    functions = {name.upper() for name in _FUNCTION_CALL.findall(code)}
+    if functions & AGGREGATE_FUNCTIONS:
+        return 'aggregate'
+    if functions:
+        return 'function'
+    transform_type = (transform_type or '').lower()
+    return transform_type if transform_type in TRANSFORM_TYPES else 'expression'
+
+
+class ColumnLineageGraph:
+    """字段级血缘的内存邻接表，节点为 (表ID, 小写字段名) 的整数编号"""
+
+    def __init__(self, column_lineages):
+        """
+        Args:
+            column_lineages: 可迭代的 (source_table_id, source_column, target_table_id, target_column,
+                transformation, transform_type)
+        """
+        self.version = 0
+        self.node_ids = {}
+        self.nodes = []
+        self.adjacency = []
+        for source_table_id, source_column, target_table_id, target_column, transformation, transform_type \
+                in column_lineages:
+            source = self._node(source_table_id, source_column)
+            target = self._node(target_table_id, target_column)
+            self.adjacency[source].append((target, transform_type, transformation))
+
+    def _node(self, table_id, column):
+        key = (table_id, column.lower())
+        node = self.node_ids.get(key)
+        if node is None:
+            node = len(self.nodes)
+            self.node_ids[key] = node
+            self.nodes.append((table_id, column))
+            self.adjacency.append([])
+        return node
+
+    def find(self, table_id, column):
+        return self.node_ids.get((table_id, column.lower()))
+
+    def downstream(self, start, exclude_transforms=frozenset(), max_depth=None, max_results=None):
+        """
+        从start出发按层遍历下游字段，经过exclude_transforms类型的边不再继续
+
+        Returns:
+            (结果, 被剪枝的边数, 是否因数量上限截断)
+            结果为按发现顺序的 [(节点, 层数, 上游节点, 转换类型, 转换表达式)]
+        """
+        visited = {start}
+        queue = deque([(start, 0)])
+        result = []
+        pruned = 0
+        while queue:
+            node, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for target, transform_type, transformation in self.adjacency[node]:
+                if target in visited:
+                    continue
+                if transform_type in exclude_transforms:
+                    pruned += 1
+                    continue
+                visited.add(target)
+                result.append((target, depth + 1, node, transform_type, transformation))
+                if max_results is not None and len(result) >= max_results:
+                    return result, pruned, True
+                queue.append((target, depth + 1))
+        return result, pruned, False
+
+
+_graph_cache = {'key': None, 'graph': None}
+_graph_lock = threading.Lock()
+
+
+def get_column_graph():
+    """
+    获取进程内缓存的字段血缘图，血缘图版本号变化时重新加载
+    按ID顺序加载，同一版本在不同进程中的字段编号一致（导出的字段节点ID依赖于此）
+    """
+    key = get_graph_version()
+    with _graph_lock:
+        if _graph_cache['key'] != key:
+            column_lineages = ColumnLineage.objects.values_list(
+                'relation__source_table_id', 'source_column',
+                'relation__target_table_id', 'target_column',
+                'transformation', 'transform_type'
+            ).order_by('id').iterator(chunk_size=5000)
+            graph = ColumnLineageGraph(column_lineages)
+            graph.version = key
+            _graph_cache['graph'] = graph
+            _graph_cache['key'] = key
+            logger.info(f"Loaded column lineage graph version {key} with {len(graph.nodes)} columns")
+        return _graph_cache['graph']
+
+
+class ColumnImpactAnalyzer:
+    """单个字段的下游影响"""
+
+    def __init__(self):
+        self.config = getattr(settings, 'LINEAGE_COLUMN_IMPACT_CONFIG', {})
+        self.graph = get_column_graph()
+
+    def analyze(self, table, column, exclude_transforms=None, max_depth=None):
+        """
+        Args:
+            table: HiveTable实例
+            column: 字段名（不区分大小写）
+            exclude_transforms: 不再向下传播的转换类型，默认使用配置
+            max_depth: 最大跳数，不超过配置的max_depth
+
+        Returns:
+            {'source', 'downstream_columns', 'downstream_tables', 'total_count', 'table_count',
+             'pruned_edges', 'truncated'}
+        """
+        if exclude_transforms is None:
+            exclude_transforms = self.config.get('exclude_transforms', [])
+        unknown = set(exclude_transforms) - set(TRANSFORM_TYPES)
+        if unknown:
+            raise Exception(f"不支持的转换类型: {', '.join(sorted(unknown))}")
+        max_depth = min(max_depth or self.config.get('max_depth', 20), self.config.get('max_depth', 20))
+
+        result = {
+            'source': {'table': table.full_name, 'column': column},
+            'downstream_columns': [],
+            'downstream_tables': [],
+            'total_count': 0,
+            'table_count': 0,
+            'pruned_edges': 0,
+            'truncated': False
+        }
+        start = self.graph.find(table.id, column)
+        if start is None:
+            return result
+
+        found, pruned, truncated = self.graph.downstream(
+            start, frozenset(exclude_transforms), max_depth, self.config.get('max_results', 10000)
+        )
+        nodes = self.graph.nodes
+        names = self._table_names({nodes[node][0] for node, _, parent, _, _ in found} | {table.id})
+
+        def qualified(node):
+            table_id, column_name = nodes[node]
+            return f"{names.get(table_id, table_id)}.{column_name}"
+
+        result['downstream_columns'] = [
+            {
+                'table': names.get(nodes[node][0], str(nodes[node][0])),
+                'column': nodes[node][1],
+                'depth': depth,
+                'from': qualified(parent),
+                'transform_type': transform_type,
+                'transformation': transformation
+            }
+            for node, depth, parent, transform_type, transformation in found
+        ]
+        result['downstream_tables'] = sorted({item['table'] for item in result['downstream_columns']})
+        result['total_count'] = len(found)
+        result['table_count'] = len(result['downstream_tables'])
+        result['pruned_edges'] = pruned
+        result['truncated'] = truncated
+        return result
+
+    def _table_names(self, table_ids):
+        table_ids = list(table_ids)
+        names = {}
+        for start in range(0, len(table_ids), QUERY_CHUNK_SIZE):
+            names.update(HiveTable.objects.filter(
+                id__in=table_ids[start:start + QUERY_CHUNK_SIZE]
+            ).values_list('id', 'qualified_name'))
+        return names
@@ -0,0 +1,238 @@
+"""
+表级血缘图统计指标
+一次批量计算所有表的下游/上游可达表数、直接上下游数（fan-in/fan-out）、最长上游链深度，
+以及孤立表（没有任何血缘）和末端表（有上游但没有下游）。
+可达表数直接对闭包表分组计数；其余指标在内存血缘图上用NumPy数组计算，
+安装了SciPy时用其稀疏图算法求强连通分量，否则使用纯Python实现
+"""
+import logging
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from apps_metadata.models import HiveTable
+from .models import LineageReachability, LineageTableMetrics
+from .lineage_paths import get_lineage_graph
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数有限，IN查询分批执行
+QUERY_CHUNK_SIZE = 500
+
+METRIC_FIELDS = [
+    'downstream_count', 'upstream_count', 'fan_in', 'fan_out', 'upstream_depth', 'is_orphan', 'is_dead_end'
+]
+
+
+def strongly_connected_labels(node_count, sources, targets):
+    """
+    强连通分量编号
+
+    Args:
+        sources, targets: 边的起点、终点数组（0..node_count-1）
+
+    Returns:
+        (分量数, 每个节点所属分量的编号数组)
+    """
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError:
+        return _tarjan_labels(node_count, sources, targets)
+
+    matrix = csr_matrix(
+        (np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(node_count, node_count)
+    )
+    return connected_components(matrix, directed=True, connection='strong')
+
+
+def _tarjan_labels(node_count, sources, targets):
+    """迭代版Tarjan算法，未安装SciPy时使用"""
+    order = np.argsort(sources, kind='stable')
+    successors = targets[order].tolist()
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=node_count)))).tolist()
+
+    index = [-1] * node_count
+    low = [0] * node_count
+    on_stack = [False] * node_count
+    labels = [-1] * node_count
+    stack = []
+    counter = 0
+    component_count = 0
+
+    for root in range(node_count):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, indptr[root])]
+        while work:
+            node, position = work[-1]
+            if position < indptr[node + 1]:
+                work[-1] = (node, position + 1)
+                successor = successors[position]
+                if index[successor] == -1:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    work.append((successor, indptr[successor]))
+                elif on_stack[successor]:
+                    low[node] = min(low[node], index[successor])
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    labels[member] = component_count
+                    if member == node:
+                        break
+                component_count += 1
+
+    return component_count, np.array(labels, dtype=np.int64)
+
+
+def longest_upstream_depth(component_count, labels, sources, targets):
+    """
+    每个节点的最长上游链跳数，同一强连通分量（环）内的表视为一个节点
+
+    在收缩后的有向无环图上按层做拓扑排序：入度为0的分量为第0层，
+    某分量的全部上游都出队后才入队，入队的层数即最长上游链长度
+    """
+    component_sources = labels[sources]
+    component_targets = labels[targets]
+    between = component_sources != component_targets
+    pairs = np.unique(component_sources[between] * component_count + component_targets[between])
+    component_sources = pairs // component_count
+    component_targets = pairs % component_count
+
+    in_degree = np.bincount(component_targets, minlength=component_count)
+    # np.unique的结果按起点排序，可直接作为CSR的列下标
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(component_sources, minlength=component_count))))
+
+    depth = np.zeros(component_count, dtype=np.int64)
+    frontier = np.flatnonzero(in_degree == 0)
+    layer = 0
+    while frontier.size:
+        depth[frontier] = layer
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        reached = component_targets[offsets]
+        in_degree -= np.bincount(reached, minlength=component_count)
+        frontier = np.unique(reached[in_degree[reached] == 0])
+        layer += 1
+    return depth[labels]
+
+
+class LineageGraphAnalytics:
+    """计算并保存每张表的血缘统计指标（LineageTableMetrics）"""
+
+    def compute(self):
+        """
+        Returns:
+            {表ID: (downstream_count, upstream_count, fan_in, fan_out, upstream_depth, is_orphan, is_dead_end)}
+        """
+        table_ids = np.array(sorted(HiveTable.objects.values_list('id', flat=True)), dtype=np.int64)
+        node_count = len(table_ids)
+        if not node_count:
+            return {}
+
+        graph = get_lineage_graph()
+        edges = [
+            (source, target)
+            for source, targets in graph.adjacency.items()
+            for target in targets
+            if source != target
+        ]
+        edge_array = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        # 表ID映射为 0..node_count-1 的下标
+        sources = np.minimum(np.searchsorted(table_ids, edge_array[:, 0]), node_count - 1)
+        targets = np.minimum(np.searchsorted(table_ids, edge_array[:, 1]), node_count - 1)
+        # 血缘图缓存中可能有刚被删除的表，丢弃两端不在元数据中的边
+        valid = (table_ids[sources] == edge_array[:, 0]) & (table_ids[targets] == edge_array[:, 1])
+        sources, targets = sources[valid], targets[valid]
+
+        fan_out = np.bincount(sources, minlength=node_count)
+        fan_in = np.bincount(targets, minlength=node_count)
+        component_count, labels = strongly_connected_labels(node_count, sources, targets)
+        upstream_depth = longest_upstream_depth(component_count, np.asarray(labels, dtype=np.int64), sources, targets)
+
+        downstream_count = self._reach_counts(table_ids, 'source_table_id')
+        upstream_count = self._reach_counts(table_ids, 'target_table_id')
+        is_orphan = (fan_in == 0) & (fan_out == 0)
+        is_dead_end = (fan_in > 0) & (fan_out == 0)
+
+        return dict(zip(table_ids.tolist(), zip(
+            downstream_count.tolist(), upstream_count.tolist(), fan_in.tolist(), fan_out.tolist(),
+            upstream_depth.tolist(), is_orphan.tolist(), is_dead_end.tolist()
+        )))
+
+    def _reach_counts(self, table_ids, group_field):
+        """按闭包表分组计数，不计入表自身（位于环上时闭包表中有自身到自身的行）"""
+        counts = np.zeros(len(table_ids), dtype=np.int64)
+        rows = np.array(list(LineageReachability.objects.exclude(
+            source_table_id=F('target_table_id')
+        ).values(group_field).annotate(count=Count('id')).values_list(group_field, 'count')), dtype=np.int64)
+        if rows.size:
+            positions = np.minimum(np.searchsorted(table_ids, rows[:, 0]), len(table_ids) - 1)
+            known = table_ids[positions] == rows[:, 0]
+            counts[positions[known]] = rows[known, 1]
+        return counts
+
+    def refresh(self):
+        """
+        重新计算全部指标，只写入有变化的行
+
+        Returns:
+            {'tables', 'created', 'updated', 'deleted'}
+        """
+        metrics = self.compute()
+        existing = {
+            row[0]: row[1:]
+            for row in LineageTableMetrics.objects.values_list('table_id', *METRIC_FIELDS)
+        }
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        for table_id, values in metrics.items():
+            if table_id not in existing:
+                to_create.append(LineageTableMetrics(table_id=table_id, updated_at=now, **dict(zip(METRIC_FIELDS, values))))
+            elif tuple(existing[table_id]) != values:
+                to_update.append((table_id, values))
+        stale = [table_id for table_id in existing if table_id not in metrics]
+
+        with transaction.atomic():
+            for start in range(0, len(stale), QUERY_CHUNK_SIZE):
+                LineageTableMetrics.objects.filter(table_id__in=stale[start:start + QUERY_CHUNK_SIZE]).delete()
+            LineageTableMetrics.objects.bulk_create(to_create, batch_size=QUERY_CHUNK_SIZE)
+            if to_update:
+                objects = {
+                    row.table_id: row
+                    for start in range(0, len(to_update), QUERY_CHUNK_SIZE)
+                    for row in LineageTableMetrics.objects.filter(
+                        table_id__in=[table_id for table_id, _ in to_update[start:start + QUERY_CHUNK_SIZE]]
+                    )
+                }
+                for table_id, values in to_update:
+                    row = objects[table_id]
+                    for name, value in zip(METRIC_FIELDS, values):
+                        setattr(row, name, value)
+                    row.updated_at = now
+                LineageTableMetrics.objects.bulk_update(
+                    list(objects.values()), METRIC_FIELDS + ['updated_at'], batch_size=QUERY_CHUNK_SIZE
+                )
+
+        stats = {'tables': len(metrics), 'created': len(to_create), 'updated': len(to_update), 'deleted': len(stale)}
+        logger.info(f"Lineage table metrics refreshed: {stats}")
+        return stats
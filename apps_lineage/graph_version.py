@@ -0,0 +1,24 @@
+"""
+血缘图版本号
+存放在数据库中，解析worker与Web进程共享；查询结果缓存和内存血缘图都以它作为版本
+"""
+from django.db.models import F
+
+from .models import LineageGraphState
+
+STATE_ID = 1
+
+
+def get_graph_version():
+    """当前血缘图版本号"""
+    version = LineageGraphState.objects.filter(pk=STATE_ID).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_graph_version():
+    """血缘写入后递增版本号，返回新版本号"""
+    updated = LineageGraphState.objects.filter(pk=STATE_ID).update(version=F('version') + 1)
+    if not updated:
+        LineageGraphState.objects.get_or_create(pk=STATE_ID)
+        LineageGraphState.objects.filter(pk=STATE_ID).update(version=F('version') + 1)
+    return get_graph_version()
@@ -0,0 +1,85 @@
+"""
+解析任务进度记录
+按时间和文件数批量写入进度，只更新计数字段；同时记录每个文件的处理结果，任务中断后可从检查点继续
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .job_queue import ParseJobInterrupted
+from .models import LineageParseJob, LineageParseFileResult
+
+logger = logging.getLogger(__name__)
+
+
+class JobProgressReporter:
+    """
+    批量写入LineageParseJob进度和文件处理结果
+
+    提供lease_owner时计数以条件更新写入，租约已被其他worker接管时不写入并抛出ParseJobInterrupted
+    """
+
+    def __init__(self, job: LineageParseJob, flush_interval=None, flush_files=None, lease_owner=None):
+        config = getattr(settings, 'LINEAGE_JOB_CONFIG', {})
+        self.job = job
+        self.lease_owner = lease_owner
+        self.flush_interval = flush_interval if flush_interval is not None else config.get('progress_flush_interval', 2)
+        self.flush_files = flush_files if flush_files is not None else config.get('progress_flush_files', 50)
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def completed_files(self):
+        """
+        加载检查点：已记录结果的文件路径，并据此恢复任务计数
+
+        Returns:
+            已处理文件路径集合
+        """
+        results = list(LineageParseFileResult.objects.filter(job=self.job).values_list('file_path', 'status'))
+        self.job.processed_files = sum(1 for _, status in results if status == 'success')
+        self.job.failed_files = sum(1 for _, status in results if status == 'failed')
+        if results:
+            logger.info(
+                f"Resuming parse job {self.job.id} from checkpoint: "
+                f"{self.job.processed_files} processed, {self.job.failed_files} failed"
+            )
+        return {path for path, _ in results}
+
+    def record_success(self, file_path):
+        self.job.processed_files += 1
+        self._record(file_path, 'success', '')
+
+    def record_failure(self, file_path, error):
+        self.job.failed_files += 1
+        self._record(file_path, 'failed', str(error)[:500])
+
+    def _record(self, file_path, status, error_message):
+        self._pending.append(LineageParseFileResult(
+            job=self.job,
+            file_path=file_path[:500],
+            status=status,
+            error_message=error_message
+        ))
+        if (len(self._pending) >= self.flush_files or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """将缓存的文件结果和计数在一个事务中写入"""
+        if not self._pending:
+            return
+        with transaction.atomic():
+            LineageParseFileResult.objects.bulk_create(self._pending, ignore_conflicts=True)
+            if not self.lease_owner:
+                self.job.save(update_fields=['processed_files', 'failed_files'])
+            elif not LineageParseJob.objects.filter(id=self.job.id, lease_owner=self.lease_owner).update(
+                processed_files=self.job.processed_files,
+                failed_files=self.job.failed_files
+            ):
+                # 租约已被接管，回滚本批文件结果，由接管的worker重新处理
+                self._pending = []
+                raise ParseJobInterrupted(None, 'lease lost')
+        self._pending = []
+        self._last_flush = time.monotonic()
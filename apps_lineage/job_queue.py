@@ -0,0 +1,180 @@
+"""
+血缘解析任务队列
+以LineageParseJob表作为持久化队列：HTTP接口只负责入队，独立的worker进程
+（manage.py run_lineage_worker）通过租约领取并执行任务，worker崩溃后租约过期的任务会被重新领取
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import LineageParseJob
+
+logger = logging.getLogger(__name__)
+
+
+class ParseJobInterrupted(Exception):
+    """
+    解析任务被中断
+
+    Attributes:
+        status: 任务应记录的状态；None表示租约已被其他worker接管，不应再写入任务
+    """
+
+    def __init__(self, status, message=''):
+        super().__init__(message or status or 'lease lost')
+        self.status = status
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LineageJobQueue:
+    """基于数据库的解析任务队列"""
+
+    def __init__(self, lease_seconds=300):
+        self.lease_seconds = lease_seconds
+
+    def enqueue(self, git_repo, parse_type='full', ref=''):
+        """
+        提交解析任务；同一仓库已有相同类型（快照任务还需相同引用）的待执行任务时直接返回该任务
+
+        Returns:
+            (job, created)
+        """
+        existing = LineageParseJob.objects.filter(
+            git_repo=git_repo,
+            parse_type=parse_type,
+            ref=ref,
+            status='pending',
+            cancel_requested=False
+        ).order_by('created_at').first()
+        if existing:
+            return existing, False
+
+        job = LineageParseJob.objects.create(
+            git_repo=git_repo,
+            parse_type=parse_type,
+            ref=ref,
+            status='pending'
+        )
+        logger.info(f"Enqueued {parse_type} parse job {job.id} for repository {git_repo.name}")
+        return job, True
+
+    def claim(self, worker_id):
+        """
+        领取一个任务：待执行任务，或租约已过期的运行中任务（worker崩溃后恢复）
+
+        使用带条件的UPDATE保证同一任务只会被一个worker领取；同一仓库同时只运行一个任务
+        """
+        now = timezone.now()
+        busy_repos = LineageParseJob.objects.filter(
+            status='running',
+            lease_expires_at__gte=now
+        ).values('git_repo_id')
+        claimable = (
+            Q(status='pending', cancel_requested=False) |
+            Q(status='running', lease_expires_at__lt=now)
+        )
+
+        candidates = LineageParseJob.objects.filter(claimable).exclude(
+            git_repo_id__in=busy_repos
+        ).order_by('created_at').values_list('id', flat=True)[:10]
+
+        for job_id in candidates:
+            claimed = LineageParseJob.objects.filter(claimable, id=job_id).update(
+                status='running',
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                attempts=F('attempts') + 1
+            )
+            if claimed:
+                job = LineageParseJob.objects.select_related('git_repo').get(id=job_id)
+                logger.info(f"Worker {worker_id} claimed parse job {job.id} (attempt {job.attempts})")
+                return job
+        return None
+
+    def heartbeat(self, job, worker_id, should_stop=None):
+        """
+        生成供LineageService.run_parse_job使用的心跳回调
+
+        回调定期续约并检查取消标记，需要停止时抛出ParseJobInterrupted
+        """
+        renew_interval = max(1, self.lease_seconds / 3)
+        state = {'last_renewal': time.monotonic()}
+
+        def beat(current_job):
+            if should_stop and should_stop():
+                raise ParseJobInterrupted('pending', 'worker shutting down')
+
+            if time.monotonic() - state['last_renewal'] < renew_interval:
+                return
+            state['last_renewal'] = time.monotonic()
+
+            lease_expires_at = timezone.now() + timedelta(seconds=self.lease_seconds)
+            renewed = LineageParseJob.objects.filter(
+                id=current_job.id,
+                lease_owner=worker_id,
+                status='running'
+            ).update(lease_expires_at=lease_expires_at)
+            if not renewed:
+                raise ParseJobInterrupted(None, 'lease lost')
+            current_job.lease_expires_at = lease_expires_at
+
+            if LineageParseJob.objects.filter(id=current_job.id, cancel_requested=True).exists():
+                raise ParseJobInterrupted('cancelled', '任务已取消')
+
+        return beat
+
+    def release(self, job, worker_id):
+        """
+        任务结束后释放租约；被中断回到pending的任务可立即被再次领取
+
+        worker主动停止而回到pending的任务退还本次领取计入的尝试次数，
+        只有worker崩溃、租约过期后被重新领取的才计为一次失败的尝试
+        """
+        LineageParseJob.objects.filter(
+            id=job.id, lease_owner=worker_id, status='pending', attempts__gt=0
+        ).update(attempts=F('attempts') - 1)
+        LineageParseJob.objects.filter(id=job.id, lease_owner=worker_id).update(
+            lease_owner='',
+            lease_expires_at=None
+        )
+
+    def fail(self, job, message):
+        LineageParseJob.objects.filter(id=job.id).update(
+            status='failed',
+            error_message=message,
+            completed_at=timezone.now(),
+            lease_owner='',
+            lease_expires_at=None
+        )
+
+    def cancel(self, job, worker_id=None):
+        """
+        取消任务：待执行任务直接标记为已取消，运行中的任务设置取消标记由worker停止
+
+        Args:
+            worker_id: 由持有租约的worker调用时提供，直接结束该worker持有的运行中任务
+                （如租约过期后被重新领取、已请求取消的任务）
+
+        Returns:
+            取消后的任务状态
+        """
+        finished = Q(status='pending')
+        if worker_id:
+            finished |= Q(status='running', lease_owner=worker_id)
+        cancelled = LineageParseJob.objects.filter(finished, id=job.id).update(
+            status='cancelled',
+            cancel_requested=True,
+            completed_at=timezone.now()
+        )
+        if not cancelled:
+            LineageParseJob.objects.filter(id=job.id, status='running').update(cancel_requested=True)
+        job.refresh_from_db()
+        return job.status
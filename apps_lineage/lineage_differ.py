@@ -0,0 +1,179 @@
+"""
+按文件的血缘差量更新
+每条血缘关系归属于产生它的脚本文件（仓库、文件路径、blob SHA）。重新解析文件时，
+将新解析出的边与该文件已有的边比较，只插入新增的边、删除消失的边，未变化的边不做写入
+"""
+import hashlib
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LineageRelation, ColumnLineage, LineageSourceFile
+
+logger = logging.getLogger(__name__)
+
+
+def git_blob_sha(content):
+    """按Git blob对象格式计算内容的SHA1，与git ls-files / GitLab文件树中的blob id一致"""
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class LineageDiffer:
+    """
+    计算并应用单个脚本文件的血缘差量
+
+    edges格式: {(source_table_id, target_table_id): {'relation_type': str, 'process_id': str,
+    'columns': {(source_column, target_column), ...},
+    'transforms': {(source_column, target_column): (transform_type, transformation)}}}，transforms可省略
+    """
+
+    def __init__(self, git_repo, file_path):
+        self.git_repo = git_repo
+        self.file_path = file_path
+
+    def _get_source_file(self):
+        source_file, created = LineageSourceFile.objects.get_or_create(
+            git_repo=self.git_repo,
+            file_path=self.file_path
+        )
+        if created and self._owns_legacy_path():
+            # 接管按文件归属之前写入的同路径血缘关系，由本次差量更新清理
+            adopted = LineageRelation.objects.filter(
+                source_file__isnull=True,
+                sql_script_path=self.file_path
+            ).update(source_file=source_file)
+            if adopted:
+                logger.info(f"Adopted {adopted} legacy lineage relations for {self.file_path}")
+        return source_file
+
+    def _owns_legacy_path(self):
+        """
+        未归属的同路径血缘关系是否只可能来自本仓库
+
+        旧数据只记录了相对路径，无法区分来自哪个仓库（或手动解析）。只有其他仓库都已按文件登记过血缘、
+        且都没有该路径时才接管；否则保留为未归属的数据，既不接管也不会被按文件清理删除
+        """
+        from apps_git.models import GitRepo
+
+        other_repos = GitRepo.objects.exclude(id=self.git_repo.id)
+        if other_repos.filter(lineage_files__isnull=True).exists():
+            # 存在尚未按文件登记过血缘的仓库，其文件清单未知
+            return False
+        return not LineageSourceFile.objects.filter(
+            file_path=self.file_path
+        ).exclude(git_repo=self.git_repo).exists()
+
+    def apply(self, edges, blob_sha=''):
+        """
+        将文件的最新血缘应用到数据库
+
+        Returns:
+            dict: 新增/删除/更新的表级和字段级血缘数量
+        """
+        stats = {
+            'relations_created': 0,
+            'relations_deleted': 0,
+            'relations_updated': 0,
+            'columns_created': 0,
+            'columns_deleted': 0,
+            'columns_updated': 0,
+        }
+
+        with transaction.atomic():
+            source_file = self._get_source_file()
+            existing = {
+                (relation.source_table_id, relation.target_table_id): relation
+                for relation in LineageRelation.objects.filter(
+                    source_file=source_file
+                ).prefetch_related('column_lineages')
+            }
+
+            # 表级血缘：删除消失的边
+            removed_ids = [relation.id for key, relation in existing.items() if key not in edges]
+            if removed_ids:
+                LineageRelation.objects.filter(id__in=removed_ids).delete()
+                stats['relations_deleted'] = len(removed_ids)
+
+            # 表级血缘：更新类型变化的边
+            changed = []
+            for key, edge in edges.items():
+                relation = existing.get(key)
+                if relation and (relation.relation_type != edge['relation_type'] or
+                                 relation.process_id != edge['process_id']):
+                    relation.relation_type = edge['relation_type']
+                    relation.process_id = edge['process_id']
+                    changed.append(relation)
+            if changed:
+                LineageRelation.objects.bulk_update(changed, ['relation_type', 'process_id'])
+                stats['relations_updated'] = len(changed)
+
+            # 表级血缘：插入新增的边
+            new_keys = [key for key in edges if key not in existing]
+            if new_keys:
+                LineageRelation.objects.bulk_create([
+                    LineageRelation(
+                        source_table_id=key[0],
+                        target_table_id=key[1],
+                        sql_script_path=self.file_path,
+                        source_file=source_file,
+                        relation_type=edges[key]['relation_type'],
+                        process_id=edges[key]['process_id']
+                    )
+                    for key in new_keys
+                ])
+                stats['relations_created'] = len(new_keys)
+                # 部分数据库的bulk_create不回填主键，重新查询新建的边
+                for relation in LineageRelation.objects.filter(source_file=source_file).exclude(
+                        id__in=[r.id for r in existing.values()]):
+                    existing[(relation.source_table_id, relation.target_table_id)] = relation
+
+            # 字段级血缘
+            columns_to_create = []
+            columns_to_update = []
+            column_ids_to_delete = []
+            for key, edge in edges.items():
+                relation = existing[key]
+                transforms = edge.get('transforms', {})
+                current = {}
+                if key not in new_keys:
+                    current = {
+                        (column.source_column, column.target_column): column
+                        for column in relation.column_lineages.all()
+                    }
+                for pair in edge['columns']:
+                    transform_type, transformation = transforms.get(pair, ('', ''))
+                    column = current.get(pair)
+                    if column is None:
+                        columns_to_create.append(ColumnLineage(
+                            relation=relation,
+                            source_column=pair[0],
+                            target_column=pair[1],
+                            transform_type=transform_type,
+                            transformation=transformation
+                        ))
+                    elif pair in transforms and (column.transform_type, column.transformation) != transforms[pair]:
+                        column.transform_type = transform_type
+                        column.transformation = transformation
+                        columns_to_update.append(column)
+                column_ids_to_delete.extend(
+                    column.id for pair, column in current.items() if pair not in edge['columns']
+                )
+            if columns_to_update:
+                ColumnLineage.objects.bulk_update(columns_to_update, ['transform_type', 'transformation'])
+                stats['columns_updated'] = len(columns_to_update)
+            if column_ids_to_delete:
+                ColumnLineage.objects.filter(id__in=column_ids_to_delete).delete()
+                stats['columns_deleted'] = len(column_ids_to_delete)
+            if columns_to_create:
+                ColumnLineage.objects.bulk_create(columns_to_create)
+                stats['columns_created'] = len(columns_to_create)
+
+            source_file.blob_sha = blob_sha
+            source_file.parsed_at = timezone.now()
+            source_file.save(update_fields=['blob_sha', 'parsed_at'])
+
+        if any(stats.values()):
+            logger.info(f"Applied lineage delta for {self.file_path}: {stats}")
+        return stats
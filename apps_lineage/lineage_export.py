@@ -0,0 +1,300 @@
+"""
+血缘图批量导出
+把表级和字段级血缘导出为边列表（gzip压缩的CSV，或需要pyarrow的Parquet / Arrow IPC），
+以及整图格式（GraphML、JSON Graph）。节点使用整数ID，名称等信息放在单独的节点字典中：
+表节点ID即HiveTable的ID，字段节点ID为字段血缘图中的编号（同一血缘图版本内稳定）。
+导出开始时读取同一版本的表级、字段级血缘图和表列表作为快照，所有数据集都从快照产出；
+所有格式都按批次逐块产出，可直接用于流式响应
+"""
+import csv
+import io
+import json
+import logging
+import zlib
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+from apps_metadata.models import HiveTable
+from .graph_version import get_graph_version
+from .lineage_paths import get_lineage_graph
+from .column_impact import get_column_graph
+
+logger = logging.getLogger(__name__)
+
+# 边列表数据集及其字段 (字段名, Arrow类型)
+DATASETS = {
+    'tables': [('id', 'int64'), ('database', 'string'), ('name', 'string'), ('qualified_name', 'string')],
+    'table_edges': [
+        ('relation_id', 'int64'), ('source', 'int64'), ('target', 'int64'),
+        ('relation_type', 'string'), ('sql_script_path', 'string')
+    ],
+    'columns': [('id', 'int64'), ('table_id', 'int64'), ('column', 'string')],
+    'column_edges': [('source', 'int64'), ('target', 'int64'), ('transform_type', 'string'), ('transformation', 'string')],
+}
+
+TABULAR_FORMATS = {
+    'csv': ('application/gzip', 'csv.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+GRAPH_FORMATS = {
+    'graphml': ('application/graphml+xml', 'graphml'),
+    'json': ('application/json', 'json'),
+}
+
+# 格式 -> (Content-Type, 文件扩展名)
+FILE_FORMATS = {**TABULAR_FORMATS, **GRAPH_FORMATS}
+
+LEVELS = ('table', 'column')
+
+# 加载快照期间血缘图版本号变化时的最大重试次数
+SNAPSHOT_ATTEMPTS = 3
+
+
+class _ChunkSink(io.RawIOBase):
+    """pyarrow写入的目标文件，每写完一批取出已写入的字节"""
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class LineageExporter:
+    """按血缘图版本导出表级和字段级血缘"""
+
+    def __init__(self):
+        self.config = getattr(settings, 'LINEAGE_EXPORT_CONFIG', {})
+        self.batch_size = self.config.get('batch_size', 50000)
+        self.version, self.table_graph, self.column_graph, self.tables = self._load_snapshot()
+
+    def _load_snapshot(self):
+        """
+        读取同一版本的表级血缘图、字段血缘图和表列表；加载期间有解析任务写入血缘（版本号变化）时重新加载
+
+        Returns:
+            (版本号, 表级血缘图, 字段血缘图, [(表ID, 库名, 表名, 完整表名)])
+        """
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            table_graph = get_lineage_graph()
+            column_graph = get_column_graph()
+            # 表列表在两个血缘图之后读取，删除表的接口会递增版本号，加载期间删除表时重新加载
+            tables = list(HiveTable.objects.order_by('id').values_list('id', 'database', 'name', 'qualified_name'))
+            version = get_graph_version()
+            if table_graph.version == column_graph.version == version:
+                return version, table_graph, column_graph, tables
+            logger.info(f"Lineage graph changed to version {version} while preparing export, reloading")
+        raise Exception("血缘图在导出准备期间持续更新，请稍后重试")
+
+    # 数据行
+
+    def rows(self, dataset):
+        if dataset == 'tables':
+            return iter(self.tables)
+        if dataset == 'table_edges':
+            return (
+                (relation['id'], source, target, relation['relation_type'], relation['sql_script_path'])
+                for (source, target), relations in self.table_graph.relations.items()
+                for relation in relations
+            )
+        if dataset == 'columns':
+            return (
+                (node, table_id, column)
+                for node, (table_id, column) in enumerate(self.column_graph.nodes)
+            )
+        if dataset == 'column_edges':
+            return (
+                (source, target, transform_type, transformation)
+                for source, targets in enumerate(self.column_graph.adjacency)
+                for target, transform_type, transformation in targets
+            )
+        raise Exception(f"不支持的导出数据集: {dataset}")
+
+    def _batches(self, dataset):
+        batch = []
+        for row in self.rows(dataset):
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # 边列表格式
+
+    def export_tabular(self, dataset, file_format):
+        """
+        Returns:
+            逐块产出字节的生成器
+
+        Raises:
+            Exception: 数据集或格式不支持，或Parquet/Arrow格式缺少pyarrow
+        """
+        if dataset not in DATASETS:
+            raise Exception(f"不支持的导出数据集: {dataset}")
+        if file_format == 'csv':
+            return self._iter_csv(dataset)
+        if file_format in ('parquet', 'arrow'):
+            try:
+                import pyarrow
+            except ImportError:
+                raise Exception("pyarrow库未安装，无法导出Parquet/Arrow格式，请安装pyarrow或使用csv格式")
+            return self._iter_arrow(dataset, file_format)
+        raise Exception(f"不支持的导出格式: {file_format}")
+
+    def _iter_csv(self, dataset):
+        # wbits=31 输出gzip格式
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow([name for name, _ in DATASETS[dataset]])
+        for batch in self._batches(dataset):
+            writer.writerows(batch)
+            yield compressor.compress(text.getvalue().encode('utf-8'))
+            text.seek(0)
+            text.truncate()
+        yield compressor.compress(text.getvalue().encode('utf-8'))
+        yield compressor.flush()
+
+    def _iter_arrow(self, dataset, file_format):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(name, getattr(pa, arrow_type)()) for name, arrow_type in DATASETS[dataset]])
+        sink = _ChunkSink()
+        if file_format == 'parquet':
+            writer = pq.ParquetWriter(sink, schema, compression=self.config.get('parquet_compression', 'zstd'))
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+
+        for batch in self._batches(dataset):
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*batch), schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    # 整图格式
+
+    def export_graph(self, level, file_format):
+        """
+        Returns:
+            逐块产出字节的生成器
+        """
+        if level not in LEVELS:
+            raise Exception(f"不支持的导出级别: {level}")
+        if file_format == 'graphml':
+            return self._encode(self._iter_graphml(level))
+        if file_format == 'json':
+            return self._encode(self._iter_json_graph(level))
+        raise Exception(f"不支持的导出格式: {file_format}")
+
+    def _encode(self, chunks):
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= 65536:
+                yield ''.join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+        yield ''.join(buffer).encode('utf-8')
+
+    def _graph_elements(self, level):
+        """
+        Returns:
+            (节点属性名列表, 节点迭代器 [(ID, {属性})], 边属性名列表, 边迭代器 [(源ID, 目标ID, {属性})])
+        """
+        if level == 'table':
+            nodes = (
+                (table_id, {'database': database, 'name': name, 'label': qualified_name})
+                for table_id, database, name, qualified_name in self.rows('tables')
+            )
+            edges = (
+                (source, target, {
+                    'relation_type': relations[0]['relation_type'],
+                    'relation_count': len(relations)
+                })
+                for (source, target), relations in self.table_graph.relations.items()
+            )
+            return ['database', 'name', 'label'], nodes, ['relation_type', 'relation_count'], edges
+
+        nodes = (
+            (node, {'table_id': table_id, 'column': column})
+            for node, table_id, column in self.rows('columns')
+        )
+        edges = (
+            (source, target, {'transform_type': transform_type, 'transformation': transformation})
+            for source, target, transform_type, transformation in self.rows('column_edges')
+        )
+        return ['table_id', 'column'], nodes, ['transform_type', 'transformation'], edges
+
+    def _iter_graphml(self, level):
+        node_keys, nodes, edge_keys, edges = self._graph_elements(level)
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        for name in node_keys:
+            key_type = 'long' if name == 'table_id' else 'string'
+            yield f'  <key id="n_{name}" for="node" attr.name="{name}" attr.type="{key_type}"/>\n'
+        for name in edge_keys:
+            key_type = 'int' if name == 'relation_count' else 'string'
+            yield f'  <key id="e_{name}" for="edge" attr.name="{name}" attr.type="{key_type}"/>\n'
+        yield f'  <graph id="lineage_{level}_v{self.version}" edgedefault="directed">\n'
+        for node, attributes in nodes:
+            data = ''.join(f'<data key="n_{name}">{escape(str(value))}</data>' for name, value in attributes.items())
+            yield f'    <node id="{node}">{data}</node>\n'
+        for source, target, attributes in edges:
+            data = ''.join(f'<data key="e_{name}">{escape(str(value))}</data>' for name, value in attributes.items())
+            yield f'    <edge source="{source}" target="{target}">{data}</edge>\n'
+        yield '  </graph>\n</graphml>\n'
+
+    def _iter_json_graph(self, level):
+        """JSON Graph Format：nodes为以节点ID为键的对象，edges为数组"""
+        _, nodes, _, edges = self._graph_elements(level)
+        metadata = json.dumps({'level': level, 'version': self.version})
+        yield f'{{"graph": {{"directed": true, "metadata": {metadata}, "nodes": {{'
+        separator = ''
+        for node, attributes in nodes:
+            label = attributes.pop('label', attributes.get('column', ''))
+            yield f'{separator}\n"{node}": ' + json.dumps({'label': label, 'metadata': attributes}, ensure_ascii=False)
+            separator = ','
+        yield '\n}, "edges": ['
+        separator = ''
+        for source, target, attributes in edges:
+            yield f'{separator}\n' + json.dumps(
+                {'source': str(source), 'target': str(target), 'metadata': attributes}, ensure_ascii=False
+            )
+            separator = ','
+        yield '\n]}}\n'
+
+    # 文件信息
+
+    @staticmethod
+    def content_type(file_format):
+        return FILE_FORMATS[file_format][0]
+
+    @staticmethod
+    def filename(name, file_format):
+        return f"lineage_{name}.{FILE_FORMATS[file_format][1]}"
@@ -0,0 +1,222 @@
+"""
+表的血缘邻域图
+从中心表出发按层（同时沿上游和下游）展开，节点按 (层数, 表ID) 的确定顺序输出，
+每页最多limit个节点，通过游标继续；某张表在一个方向上的新邻居超过阈值时，
+超出部分按数据库汇总成一个汇总节点，不再继续展开。结果以逐项生成的方式产出，可直接用于NDJSON流式响应
+"""
+import base64
+import json
+import logging
+
+from django.conf import settings
+
+from apps_metadata.models import HiveTable
+from .lineage_paths import get_lineage_graph
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数有限，IN查询分批执行
+QUERY_CHUNK_SIZE = 500
+
+
+class GraphCursorExpired(Exception):
+    """游标生成后血缘图已变化，需要从头查询"""
+
+
+def encode_cursor(offset, version):
+    payload = json.dumps({'offset': offset, 'version': version}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(payload['offset']), payload['version']
+    except Exception:
+        raise Exception("无效的游标")
+
+
+class LineageNeighborhood:
+    """按层展开中心表的血缘邻域，逐项产出节点、边、汇总节点和结束标记"""
+
+    def __init__(self, center_table, depth=2):
+        self.config = getattr(settings, 'LINEAGE_GRAPH_CONFIG', {})
+        self.graph = get_lineage_graph()
+        self.center = center_table
+        self.depth = depth
+        self.aggregate_threshold = self.config.get('aggregate_threshold', 50)
+        self._names = {}
+
+    def _load_tables(self, table_ids):
+        missing = [table_id for table_id in table_ids if table_id not in self._names]
+        for start in range(0, len(missing), QUERY_CHUNK_SIZE):
+            for table_id, database, qualified_name in HiveTable.objects.filter(
+                id__in=missing[start:start + QUERY_CHUNK_SIZE]
+            ).values_list('id', 'database', 'qualified_name'):
+                self._names[table_id] = (database, qualified_name)
+
+    def _name(self, table_id):
+        return self._names.get(table_id, ('', str(table_id)))[1]
+
+    def _levels(self):
+        """
+        逐层产出 (层数, [(表ID, {方向: 被汇总的邻居ID列表})])，不访问数据库
+
+        新邻居按ID排序，前aggregate_threshold个进入下一层，其余记入汇总；
+        被汇总的表视为已访问，不会再从其他表展开
+        """
+        visited = {self.center.id}
+        level = [self.center.id]
+        for current_depth in range(self.depth + 1):
+            entries = []
+            next_level = []
+            for node in level:
+                aggregated = {}
+                if current_depth < self.depth:
+                    for direction, neighbours in (
+                        ('downstream', self.graph.adjacency),
+                        ('upstream', self.graph.reverse_adjacency)
+                    ):
+                        new = sorted(n for n in neighbours.get(node, ()) if n not in visited)
+                        visited.update(new)
+                        next_level.extend(new[:self.aggregate_threshold])
+                        if len(new) > self.aggregate_threshold:
+                            aggregated[direction] = new[self.aggregate_threshold:]
+                entries.append((node, aggregated))
+            yield current_depth, entries
+            level = sorted(next_level)
+            if not level:
+                break
+
+    def iter_items(self, offset=0, limit=None):
+        """
+        从第offset个节点开始产出图元素
+
+        Yields:
+            {'type': 'node' | 'edge' | 'aggregate', ...}，最后是
+            {'type': 'end', 'next_cursor', 'truncated', 'version'}
+        """
+        order = {}
+        position = 0
+        emitted = 0
+        next_offset = None
+
+        for current_depth, entries in self._levels():
+            page = []
+            for node, aggregated in entries:
+                order[node] = position
+                if position >= offset:
+                    if limit is not None and emitted >= limit:
+                        next_offset = position
+                        break
+                    page.append((node, position, aggregated))
+                    emitted += 1
+                position += 1
+
+            # 每层只查询需要输出的表名：本页节点、被汇总的表，以及边另一端已输出的表（可能在之前的页）
+            table_ids = set()
+            for node, _, aggregated in page:
+                table_ids.add(node)
+                table_ids.update(n for ids in aggregated.values() for n in ids)
+                table_ids.update(n for n in self.graph.adjacency.get(node, ()) if n in order)
+                table_ids.update(n for n in self.graph.reverse_adjacency.get(node, ()) if n in order)
+            self._load_tables(list(table_ids))
+            for node, node_position, aggregated in page:
+                yield from self._node_items(node, node_position, current_depth, order, aggregated)
+
+            if next_offset is not None:
+                break
+
+        yield {
+            'type': 'end',
+            'next_cursor': encode_cursor(next_offset, self.graph.version) if next_offset is not None else None,
+            'truncated': next_offset is not None,
+            'version': self.graph.version
+        }
+
+    def _node_items(self, node, position, current_depth, order, aggregated):
+        name = self._name(node)
+        yield {'type': 'node', 'id': name, 'label': name, 'depth': current_depth}
+
+        # 每条边在两端中后输出的一端输出一次
+        for target in sorted(self.graph.adjacency.get(node, ())):
+            if target in order and order[target] <= position:
+                yield self._edge(name, self._name(target), node, target)
+        for source in sorted(self.graph.reverse_adjacency.get(node, ())):
+            if source in order and order[source] < position:
+                yield self._edge(self._name(source), name, source, node)
+
+        for direction, table_ids in aggregated.items():
+            counts = {}
+            for table_id in table_ids:
+                database = self._names.get(table_id, ('', ''))[0]
+                counts[database] = counts.get(database, 0) + 1
+            for database, count in sorted(counts.items()):
+                aggregate_id = f"aggregate:{name}:{direction}:{database}"
+                yield {
+                    'type': 'aggregate',
+                    'id': aggregate_id,
+                    'label': f"{database} ({count})",
+                    'database': database,
+                    'count': count,
+                    'parent': name,
+                    'direction': direction,
+                    'depth': current_depth + 1
+                }
+                if direction == 'downstream':
+                    yield {'type': 'edge', 'source': name, 'target': aggregate_id, 'relation_type': 'aggregate'}
+                else:
+                    yield {'type': 'edge', 'source': aggregate_id, 'target': name, 'relation_type': 'aggregate'}
+
+    def _edge(self, source_name, target_name, source_id, target_id):
+        relations = self.graph.relations.get((source_id, target_id), [])
+        return {
+            'type': 'edge',
+            'source': source_name,
+            'target': target_name,
+            'relation_type': relations[0]['relation_type'] if relations else ''
+        }
+
+    def cursor_offset(self, cursor):
+        """
+        游标对应的起始节点序号，未传游标时为0
+
+        Raises:
+            GraphCursorExpired: 游标对应的血缘图版本已变化
+        """
+        if not cursor:
+            return 0
+        offset, version = decode_cursor(cursor)
+        if version != self.graph.version:
+            raise GraphCursorExpired("血缘数据已更新，请重新查询")
+        return offset
+
+    def build_page(self, cursor=None, limit=None):
+        """非流式查询：返回一页 {'nodes', 'edges', 'next_cursor', 'truncated'}"""
+        offset = self.cursor_offset(cursor)
+        nodes = []
+        edges = []
+        result = {}
+        for item in self.iter_items(offset, limit):
+            item_type = item.pop('type')
+            if item_type == 'node':
+                nodes.append(item)
+            elif item_type == 'aggregate':
+                nodes.append(dict(item, type='aggregate'))
+            elif item_type == 'edge':
+                # 与原接口一致，边的血缘类型字段名为type
+                edges.append({'source': item['source'], 'target': item['target'], 'type': item['relation_type']})
+            else:
+                result = item
+        return {
+            'nodes': nodes,
+            'edges': edges,
+            'next_cursor': result.get('next_cursor'),
+            'truncated': result.get('truncated', False)
+        }
+
+    def iter_ndjson(self, cursor=None, limit=None):
+        """流式查询：每行一个JSON对象"""
+        offset = self.cursor_offset(cursor)
+        for item in self.iter_items(offset, limit):
+            yield json.dumps(item, ensure_ascii=False) + '\n'
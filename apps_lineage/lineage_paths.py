@@ -0,0 +1,288 @@
+"""
+表级血缘路径查询
+在内存邻接表上回答"表A经过哪些表、哪些脚本流向表B"：最短路径（双向BFS）、
+前k短路径（Yen算法，子过程使用双向BFS）和带数量上限的全部简单路径
+"""
+import heapq
+import logging
+import threading
+
+from django.conf import settings
+
+from apps_metadata.models import HiveTable
+from .models import LineageRelation
+from .graph_version import get_graph_version
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数有限，IN查询分批执行
+QUERY_CHUNK_SIZE = 500
+
+
+class LineageGraph:
+    """表级血缘的内存邻接表，节点为表ID，同一对表之间的多条血缘关系合并为一条边"""
+
+    def __init__(self, relations):
+        """
+        Args:
+            relations: 可迭代的 (relation_id, source_id, target_id, relation_type, sql_script_path)
+        """
+        self.version = 0
+        self.adjacency = {}
+        self.reverse_adjacency = {}
+        self.relations = {}
+        for relation_id, source_id, target_id, relation_type, sql_script_path in relations:
+            self.adjacency.setdefault(source_id, set()).add(target_id)
+            self.reverse_adjacency.setdefault(target_id, set()).add(source_id)
+            self.relations.setdefault((source_id, target_id), []).append({
+                'id': relation_id,
+                'relation_type': relation_type,
+                'sql_script_path': sql_script_path
+            })
+
+    def shortest_path(self, source, target, banned_nodes=frozenset(), banned_edges=frozenset()):
+        """
+        双向BFS求最短路径，每轮扩展较小的一侧
+
+        Returns:
+            节点列表，不可达时返回None
+        """
+        if source == target:
+            return [source]
+        if source in banned_nodes or target in banned_nodes:
+            return None
+
+        parents_forward = {source: None}
+        parents_backward = {target: None}
+        depth_forward = {source: 0}
+        depth_backward = {target: 0}
+        frontier_forward = [source]
+        frontier_backward = [target]
+
+        while frontier_forward and frontier_backward:
+            forward = len(frontier_forward) <= len(frontier_backward)
+            if forward:
+                frontier, neighbours = frontier_forward, self.adjacency
+                parents, depth, other_depth = parents_forward, depth_forward, depth_backward
+            else:
+                frontier, neighbours = frontier_backward, self.reverse_adjacency
+                parents, depth, other_depth = parents_backward, depth_backward, depth_forward
+
+            next_frontier = []
+            best_meeting = None
+            best_length = None
+            for node in frontier:
+                for neighbour in neighbours.get(node, ()):
+                    edge = (node, neighbour) if forward else (neighbour, node)
+                    if neighbour in banned_nodes or edge in banned_edges or neighbour in parents:
+                        continue
+                    parents[neighbour] = node
+                    depth[neighbour] = depth[node] + 1
+                    next_frontier.append(neighbour)
+                    # 同一轮中可能在不同深度相遇，扩展完整一层后取总长度最短的相遇点
+                    if neighbour in other_depth:
+                        length = depth[neighbour] + other_depth[neighbour]
+                        if best_length is None or length < best_length:
+                            best_meeting, best_length = neighbour, length
+
+            if best_meeting is not None:
+                return self._join(best_meeting, parents_forward, parents_backward)
+
+            if forward:
+                frontier_forward = next_frontier
+            else:
+                frontier_backward = next_frontier
+        return None
+
+    @staticmethod
+    def _join(meeting, parents_forward, parents_backward):
+        path = []
+        node = meeting
+        while node is not None:
+            path.append(node)
+            node = parents_forward[node]
+        path.reverse()
+        node = parents_backward[meeting]
+        while node is not None:
+            path.append(node)
+            node = parents_backward[node]
+        return path
+
+    def k_shortest_paths(self, source, target, k):
+        """Yen算法求前k短的无环路径"""
+        first = self.shortest_path(source, target)
+        if first is None:
+            return []
+
+        paths = [first]
+        candidates = []
+        seen = {tuple(first)}
+        counter = 0
+
+        while len(paths) < k:
+            previous = paths[-1]
+            for i in range(len(previous) - 1):
+                spur_node = previous[i]
+                root = previous[:i + 1]
+                banned_edges = {
+                    (path[i], path[i + 1]) for path in paths
+                    if len(path) > i + 1 and path[:i + 1] == root
+                }
+                spur_path = self.shortest_path(spur_node, target, frozenset(root[:-1]), banned_edges)
+                if spur_path is None:
+                    continue
+                candidate = root[:-1] + spur_path
+                key = tuple(candidate)
+                if key not in seen:
+                    seen.add(key)
+                    counter += 1
+                    heapq.heappush(candidates, (len(candidate), counter, candidate))
+            if not candidates:
+                break
+            paths.append(heapq.heappop(candidates)[2])
+        return paths
+
+    def _distances(self, start, neighbours, max_depth):
+        distances = {start: 0}
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                if distances[node] >= max_depth:
+                    continue
+                for neighbour in neighbours.get(node, ()):
+                    if neighbour not in distances:
+                        distances[neighbour] = distances[node] + 1
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return distances
+
+    def all_simple_paths(self, source, target, max_paths, max_depth):
+        """
+        全部简单路径（不重复经过同一张表）
+
+        只在源表可达、且能在剩余跳数内到达目标表的节点上做深度优先搜索
+
+        Returns:
+            (路径列表, 是否因数量上限被截断)
+        """
+        if source == target:
+            return [[source]], False
+
+        to_target = self._distances(target, self.reverse_adjacency, max_depth)
+        if source not in to_target:
+            return [], False
+
+        paths = []
+        path = [source]
+        on_path = {source}
+        stack = [iter(sorted(self.adjacency.get(source, ())))]
+        while stack:
+            for neighbour in stack[-1]:
+                if neighbour in on_path or neighbour not in to_target:
+                    continue
+                if len(path) + to_target[neighbour] > max_depth:
+                    continue
+                if neighbour == target:
+                    paths.append(path + [target])
+                    if len(paths) >= max_paths:
+                        return paths, True
+                    continue
+                path.append(neighbour)
+                on_path.add(neighbour)
+                stack.append(iter(sorted(self.adjacency.get(neighbour, ()))))
+                break
+            else:
+                stack.pop()
+                on_path.discard(path.pop())
+        return paths, False
+
+
+_graph_cache = {'key': None, 'graph': None}
+_graph_lock = threading.Lock()
+
+
+def get_lineage_graph():
+    """获取进程内缓存的血缘图，血缘图版本号变化时重新加载"""
+    key = get_graph_version()
+    with _graph_lock:
+        if _graph_cache['key'] != key:
+            relations = LineageRelation.objects.values_list(
+                'id', 'source_table_id', 'target_table_id', 'relation_type', 'sql_script_path'
+            ).iterator(chunk_size=5000)
+            graph = LineageGraph(relations)
+            graph.version = key
+            _graph_cache['graph'] = graph
+            _graph_cache['key'] = key
+            logger.info(f"Loaded lineage graph version {key} with {len(graph.relations)} edges")
+        return _graph_cache['graph']
+
+
+class LineagePathFinder:
+    """路径查询，结果包含每一跳的血缘关系及其脚本路径"""
+
+    MODES = ('shortest', 'k_shortest', 'all')
+
+    def __init__(self):
+        self.config = getattr(settings, 'LINEAGE_PATH_CONFIG', {})
+        self.graph = get_lineage_graph()
+
+    def find(self, source_table, target_table, mode='shortest', k=None, max_paths=None, max_depth=None):
+        """
+        Args:
+            mode: 'shortest'、'k_shortest' 或 'all'
+            k: k_shortest模式返回的路径数，不超过配置的max_k
+            max_paths: all模式最多返回的路径数，不超过配置的max_paths
+            max_depth: all模式路径的最大跳数，不超过配置的max_depth
+
+        Returns:
+            {'source', 'target', 'mode', 'paths', 'total_count', 'truncated'}
+        """
+        if mode not in self.MODES:
+            raise Exception(f"不支持的路径查询模式: {mode}")
+
+        source, target = source_table.id, target_table.id
+        truncated = False
+        if mode == 'shortest':
+            path = self.graph.shortest_path(source, target)
+            paths = [path] if path else []
+        elif mode == 'k_shortest':
+            k = min(k or 3, self.config.get('max_k', 10))
+            paths = self.graph.k_shortest_paths(source, target, k)
+        else:
+            max_paths = min(max_paths or self.config.get('max_paths', 100), self.config.get('max_paths', 100))
+            max_depth = min(max_depth or self.config.get('max_depth', 10), self.config.get('max_depth', 10))
+            paths, truncated = self.graph.all_simple_paths(source, target, max_paths, max_depth)
+
+        names = self._table_names({node for path in paths for node in path})
+        return {
+            'source': source_table.full_name,
+            'target': target_table.full_name,
+            'mode': mode,
+            'paths': [self._serialize_path(path, names) for path in paths],
+            'total_count': len(paths),
+            'truncated': truncated
+        }
+
+    def _table_names(self, table_ids):
+        table_ids = list(table_ids)
+        names = {}
+        for start in range(0, len(table_ids), QUERY_CHUNK_SIZE):
+            names.update(HiveTable.objects.filter(
+                id__in=table_ids[start:start + QUERY_CHUNK_SIZE]
+            ).values_list('id', 'qualified_name'))
+        return names
+
+    def _serialize_path(self, path, names):
+        return {
+            'length': len(path) - 1,
+            'tables': [names.get(node, str(node)) for node in path],
+            'hops': [
+                {
+                    'source': names.get(source, str(source)),
+                    'target': names.get(target, str(target)),
+                    'relations': self.graph.relations.get((source, target), [])
+                }
+                for source, target in zip(path, path[1:])
+            ]
+        }
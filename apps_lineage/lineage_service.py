@@ -1,18 +1,37 @@
 import requests
 import json
 import logging
+from contextlib import closing
 from django.conf import settings
 from django.utils import timezone
 from apps_metadata.models import HiveTable
-from .models import LineageRelation, ColumnLineage, LineageParseJob
+from apps_metadata.table_resolver import get_table_resolver, qualify_table_name
+from .models import LineageRelation, ColumnLineage, LineageParseJob, LineageSourceFile, LineageBlobResult
+from .lineage_differ import LineageDiffer, git_blob_sha
+from .lineage_snapshot import LineageSnapshotBuilder
+from .reachability import ReachabilityIndex
+from .graph_version import bump_graph_version
+from .lineage_paths import LineagePathFinder
+from .lineage_impact import BatchImpactAnalyzer
+from .column_impact import ColumnImpactAnalyzer, classify_transform
+from .graph_analytics import LineageGraphAnalytics
+from .sql_lineage_parser import LocalLineageParser
+from .sqlflow_guard import get_sqlflow_guard, SQLFlowUnavailable
+from .job_queue import LineageJobQueue, ParseJobInterrupted
+from .job_progress import JobProgressReporter
 
 
 logger = logging.getLogger(__name__)
 
 
+class SQLFlowServerError(Exception):
+    """SQLFlow返回5xx"""
+
+
 class LineageService:
     def __init__(self):
         self.config = settings.SQLFLOW_CONFIG
+        self.guard = get_sqlflow_guard(self.config)
         self.session = requests.Session()
         
         # 设置默认请求头，模拟浏览器请求以避免跨域问题
@@ -33,7 +52,7 @@ class LineageService:
             home_url = f"{base_url}/"
             
             logger.info(f"Initializing session by visiting: {home_url}")
-            response = self.session.get(home_url, timeout=10)
+            response = self.session.get(home_url, timeout=(self.config.get('connect_timeout', 3), 10))
             
             if response.status_code == 200:
                 logger.info(f"Session initialized successfully. Cookies: {dict(self.session.cookies)}")
@@ -74,6 +93,13 @@ class LineageService:
         # 如果启用模拟模式，返回示例数据
         if self.config.get('mock_mode', False):
             return self._mock_parse_sql(sql_text)
+        
+        # 简单的INSERT…SELECT语句优先本地解析，无法确定时再请求SQLFlow
+        if self.config.get('local_fast_path', True):
+            local_result = LocalLineageParser().parse(sql_text)
+            if local_result is not None:
+                logger.info("SQL resolved by local fast-path parser, skipping SQLFlow")
+                return local_result
             
         payload = {
             "dbVendor": "dbvhive",
@@ -83,20 +109,24 @@ class LineageService:
             "simpleShowFunction": False,
             "indirect": False,
             "tableLevel": False,
-            "showTransform": False
+            "showTransform": True
         }
         
         try:
             logger.info(f"Sending SQL to lineage service: {self.config['url']}")
             
             # 确保有正确的会话，如果需要的话先访问主页获取会话
-            if not self.session.cookies.get('JSESSIONID'):
+            # 熔断期间不做会话初始化，避免额外的超时等待
+            if not self.session.cookies.get('JSESSIONID') and self.guard.breaker.state == 'closed':
                 self._init_session()
             
-            response = self.session.post(
-                self.config['url'],
-                json=payload,
-                timeout=self.config['timeout']
+            response = self.guard.call(
+                lambda: self._post_sqlflow(payload),
+                retryable_exceptions=(
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    SQLFlowServerError,
+                )
             )
             
             logger.info(f"Response status: {response.status_code}")
@@ -118,6 +148,12 @@ class LineageService:
                 logger.error(f"SQL parsing failed: {result.get('msg', 'Unknown error')}")
                 return None
                 
+        except SQLFlowUnavailable as e:
+            logger.warning(f"SQLFlow call rejected: {str(e)}")
+            raise
+        except SQLFlowServerError as e:
+            logger.error(f"SQL lineage service error: {str(e)}")
+            raise Exception(f"血缘解析服务内部错误: {str(e)}")
         except requests.exceptions.ConnectionError as e:
             logger.error(f"Cannot connect to SQL lineage service at {self.config['url']}: {str(e)}")
             raise Exception(f"血缘解析服务无法访问，请确保服务运行在 {self.config['url']}")
@@ -131,6 +167,14 @@ class LineageService:
             logger.error(f"Failed to decode response: {str(e)}")
             raise Exception("血缘解析服务返回无效响应")
 
+    def _post_sqlflow(self, payload):
+        """发送一次SQLFlow请求，5xx视为服务故障以便熔断和重试"""
+        timeout = (self.config.get('connect_timeout', 3), self.config['timeout'])
+        response = self.session.post(self.config['url'], json=payload, timeout=timeout)
+        if response.status_code >= 500:
+            raise SQLFlowServerError(f"HTTP {response.status_code}")
+        return response
+
     def _mock_parse_sql(self, sql_text):
         """模拟SQL解析，用于演示和测试"""
         import re
@@ -207,114 +251,207 @@ class LineageService:
         logger.info(f"Mock parsing found {len(relationships)} relationships")
         return mock_response["data"]
 
+    def _split_table_name(self, parent_name):
+        """将parentName拆分为(数据库, 表名)，不带库名时返回None"""
+        parent_name = self._clean_name(parent_name)
+        if not parent_name or '.' not in parent_name:
+            return None
+        database, table = parent_name.split('.', 1)
+        return self._clean_name(database), self._clean_name(table)
+
+    def _extract_named_edges(self, parsed_data):
+        """
+        将SQLFlow解析结果归并为以表名为键的血缘边，与元数据无关，可按blob缓存复用
+        
+        Returns:
+            [{'source': 'db.table', 'target': 'db.table', 'relation_type', 'process_id',
+              'columns': [[source_column, target_column], ...],
+              'transforms': [[source_column, target_column, transform_type, transformation], ...]}]
+            早期缓存的结果没有transforms
+        """
+        edges = {}
+        
+        # 处理真实SQLFlow服务的响应格式
+        if 'data' in parsed_data and 'sqlflow' in parsed_data['data']:
+            # 真实SQLFlow服务格式
+            sqlflow_data = parsed_data['data']['sqlflow']
+        elif 'sqlflow' in parsed_data:
+            # 模拟格式
+            sqlflow_data = parsed_data['sqlflow']
+        else:
+            logger.warning("No sqlflow data found in response")
+            return []
+        
+        relationships = sqlflow_data.get('relationships', [])
+        logger.info(f"Found {len(relationships)} relationships in SQLFlow data")
+        
+        for relationship in relationships:
+            sources = relationship.get('sources', [])
+            target = relationship.get('target', {})
+            
+            if not sources or not target:
+                continue
+            
+            target_name = self._split_table_name(target.get('parentName', ''))
+            if not target_name:
+                continue
+            target_column = self._clean_name(target.get('column', ''))
+            
+            for source in sources:
+                source_name = self._split_table_name(source.get('parentName', ''))
+                if not source_name:
+                    continue
+                
+                edge = edges.setdefault(('.'.join(source_name), '.'.join(target_name)), {
+                    'relation_type': relationship.get('effectType', 'insert'),
+                    'process_id': relationship.get('processId', ''),
+                    'columns': set(),
+                    'transforms': {}
+                })
+                
+                source_column = self._clean_name(source.get('column', ''))
+                if source_column and target_column:
+                    edge['columns'].add((source_column, target_column))
+                    edge['transforms'].setdefault(
+                        (source_column, target_column), self._extract_transform(source, target)
+                    )
+                else:
+                    logger.debug(f"Missing column info - source: '{source_column}', target: '{target_column}'")
+        
+        return [
+            {
+                'source': source,
+                'target': target,
+                'relation_type': edge['relation_type'],
+                'process_id': edge['process_id'],
+                'columns': sorted([list(pair) for pair in edge['columns']]),
+                'transforms': sorted([list(pair) + list(transform) for pair, transform in edge['transforms'].items()])
+            }
+            for (source, target), edge in edges.items()
+        ]
+
+    def _extract_transform(self, source, target):
+        """
+        字段的转换表达式（SQLFlow showTransform输出的transforms），没有转换时为直接传递
+        
+        Returns:
+            (transform_type, transformation)
+        """
+        transforms = source.get('transforms') or target.get('transforms') or []
+        for transform in transforms:
+            code = (transform.get('code') or '').strip()
+            if code:
+                return classify_transform(code, transform.get('type', '')), code
+        return 'direct', ''
+
+    def _resolve_edges(self, named_edges):
+        """
+        将表名血缘边解析为以表ID为键的血缘边，只匹配元数据中已存在的表
+        
+        Returns:
+            (edges, skipped_tables)
+            edges: {(source_table_id, target_table_id): {'relation_type', 'process_id', 'columns',
+                'transforms': {(source_column, target_column): (transform_type, transformation)}}}
+        """
+        edges = {}
+        
+        # 一次批量解析文件中出现的全部表名，只匹配现有的表，不创建新表
+        table_ids = get_table_resolver().resolve_ids(
+            [named_edge['source'] for named_edge in named_edges] +
+            [named_edge['target'] for named_edge in named_edges]
+        )
+        skipped_tables = {name for name, table_id in table_ids.items() if table_id is None}
+        for name in skipped_tables:
+            logger.debug(f"表 {name} 在元数据中不存在，跳过血缘关系创建")
+        
+        for named_edge in named_edges:
+            target_id = table_ids[named_edge['target']]
+            source_id = table_ids[named_edge['source']]
+            if target_id is None or source_id is None:
+                continue
+            
+            edge = edges.setdefault((source_id, target_id), {
+                'relation_type': named_edge['relation_type'],
+                'process_id': named_edge['process_id'],
+                'columns': set(),
+                'transforms': {}
+            })
+            edge['columns'].update(tuple(pair) for pair in named_edge['columns'])
+            for source_column, target_column, transform_type, transformation in named_edge.get('transforms', []):
+                edge['transforms'].setdefault((source_column, target_column), (transform_type, transformation))
+        
+        return edges, skipped_tables
+
+    def _collect_lineage_edges(self, parsed_data):
+        """将SQLFlow解析结果归并为以表ID为键的血缘边，只匹配元数据中已存在的表"""
+        return self._resolve_edges(self._extract_named_edges(parsed_data))
+
+    def parse_blob(self, blob_sha, content, use_cache=True):
+        """
+        解析一个文件内容，结果按blob SHA缓存；任何仓库、分支、提交中内容相同的文件直接复用
+        
+        Returns:
+            _extract_named_edges格式的表名血缘边
+            
+        Raises:
+            Exception: SQL解析失败
+        """
+        if use_cache:
+            cached = LineageBlobResult.objects.filter(blob_sha=blob_sha).first()
+            if cached:
+                return cached.edges
+        
+        named_edges = []
+        if content and content.strip():
+            parsed_data = self.parse_sql(content)
+            if not parsed_data:
+                raise Exception("SQL解析失败，未返回血缘数据")
+            named_edges = self._extract_named_edges(parsed_data)
+        
+        result, _ = LineageBlobResult.objects.get_or_create(blob_sha=blob_sha)
+        result.edges = named_edges
+        result.save()
+        return named_edges
+
     def extract_lineage_relations(self, parsed_data, sql_script_path=""):
         relations = []
-        skipped_tables = set()  # 记录跳过的表
         
         try:
-            # 处理真实SQLFlow服务的响应格式
-            if 'data' in parsed_data and 'sqlflow' in parsed_data['data']:
-                # 真实SQLFlow服务格式
-                sqlflow_data = parsed_data['data']['sqlflow']
-            elif 'sqlflow' in parsed_data:
-                # 模拟格式
-                sqlflow_data = parsed_data['sqlflow']
-            else:
-                logger.warning("No sqlflow data found in response")
-                return []
-                
-            relationships = sqlflow_data.get('relationships', [])
-            logger.info(f"Found {len(relationships)} relationships in SQLFlow data")
+            edges, skipped_tables = self._collect_lineage_edges(parsed_data)
             
-            for relationship in relationships:
+            for (source_id, target_id), edge in edges.items():
                 try:
-                    # Get source table info
-                    sources = relationship.get('sources', [])
-                    target = relationship.get('target', {})
+                    # Create or update lineage relation
+                    relation, created = LineageRelation.objects.get_or_create(
+                        source_table_id=source_id,
+                        target_table_id=target_id,
+                        sql_script_path=sql_script_path,
+                        source_file=None,
+                        defaults={
+                            'relation_type': edge['relation_type'],
+                            'process_id': edge['process_id']
+                        }
+                    )
                     
-                    if not sources or not target:
-                        continue
-                    
-                    # Extract target table information
-                    target_parent_name = target.get('parentName', '')
-                    target_parent_name = self._clean_name(target_parent_name)
-                    if '.' in target_parent_name:
-                        target_db, target_table = target_parent_name.split('.', 1)
-                        target_db = self._clean_name(target_db)
-                        target_table = self._clean_name(target_table)
-                    else:
-                        continue
-                    
-                    # 只匹配现有的目标表，不创建新表
-                    try:
-                        target_hive_table = HiveTable.objects.get(
-                            name=target_table,
-                            database=target_db
-                        )
-                    except HiveTable.DoesNotExist:
-                        skipped_tables.add(f"{target_db}.{target_table}")
-                        logger.debug(f"目标表 {target_db}.{target_table} 在元数据中不存在，跳过血缘关系创建")
-                        continue
-                    
-                    # Process each source
-                    for source in sources:
-                        source_parent_name = source.get('parentName', '')
-                        source_parent_name = self._clean_name(source_parent_name)
-                        if '.' in source_parent_name:
-                            source_db, source_table = source_parent_name.split('.', 1)
-                            source_db = self._clean_name(source_db)
-                            source_table = self._clean_name(source_table)
-                        else:
-                            continue
-                        
-                        # 只匹配现有的源表，不创建新表
+                    # Create column lineage if available
+                    for source_column, target_column in edge['columns']:
                         try:
-                            source_hive_table = HiveTable.objects.get(
-                                name=source_table,
-                                database=source_db
+                            transform_type, transformation = edge['transforms'].get(
+                                (source_column, target_column), ('', '')
                             )
-                        except HiveTable.DoesNotExist:
-                            skipped_tables.add(f"{source_db}.{source_table}")
-                            logger.debug(f"源表 {source_db}.{source_table} 在元数据中不存在，跳过血缘关系创建")
-                            continue
-                        
-                        # Create or update lineage relation
-                        relation, created = LineageRelation.objects.get_or_create(
-                            source_table=source_hive_table,
-                            target_table=target_hive_table,
-                            sql_script_path=sql_script_path,
-                            defaults={
-                                'relation_type': relationship.get('effectType', 'insert'),
-                                'process_id': relationship.get('processId', '')
-                            }
-                        )
-                        
-                        # Create column lineage if available
-                        source_column = source.get('column', '')
-                        target_column = target.get('column', '')
-                        
-                        if source_column and target_column:
-                            # 清理字段名
-                            source_column_clean = self._clean_name(source_column)
-                            target_column_clean = self._clean_name(target_column)
-                            
-                            try:
-                                column_lineage, created = ColumnLineage.objects.get_or_create(
-                                    relation=relation,
-                                    source_column=source_column_clean,
-                                    target_column=target_column_clean
-                                )
-                                if created:
-                                    logger.info(f"Created column lineage: {source_column_clean} -> {target_column_clean}")
-                                else:
-                                    logger.debug(f"Column lineage already exists: {source_column_clean} -> {target_column_clean}")
-                            except Exception as col_e:
-                                logger.error(f"Failed to create column lineage {source_column_clean} -> {target_column_clean}: {str(col_e)}")
-                        else:
-                            logger.debug(f"Missing column info - source: '{source_column}', target: '{target_column}'")
-                        
-                        relations.append(relation)
-                        
+                            column_lineage, created = ColumnLineage.objects.update_or_create(
+                                relation=relation,
+                                source_column=source_column,
+                                target_column=target_column,
+                                defaults={'transform_type': transform_type, 'transformation': transformation}
+                            )
+                            if created:
+                                logger.info(f"Created column lineage: {source_column} -> {target_column}")
+                        except Exception as col_e:
+                            logger.error(f"Failed to create column lineage {source_column} -> {target_column}: {str(col_e)}")
+                    
+                    relations.append(relation)
+                    
                 except Exception as e:
                     logger.error(f"Error processing relationship: {str(e)}")
                     continue
@@ -325,6 +462,8 @@ class LineageService:
             else:
                 logger.info(f"Git仓库解析完成: 创建了{len(relations)}个血缘关系，所有表都在现有元数据中找到")
             
+            if relations:
+                self.on_lineage_changed()
             return relations
             
         except Exception as e:
@@ -402,13 +541,16 @@ class LineageService:
                                 
                                 # 添加字段级关系（只有当源字段和目标字段都存在时）
                                 if target_table_name_clean and target_column_clean:
+                                    transform_type, transformation = self._extract_transform(source, target)
                                     column_relationships.append({
                                         'id': f"rel_{len(column_relationships)}",
                                         'source_table': source_table_name_clean,
                                         'source_column': source_column_clean,
                                         'target_table': target_table_name_clean,
                                         'target_column': target_column_clean,
-                                        'relation_type': relationship.get('effectType', 'insert')
+                                        'relation_type': relationship.get('effectType', 'insert'),
+                                        'transform_type': transform_type,
+                                        'transformation': transformation
                                     })
                                 
                 except Exception as e:
@@ -439,38 +581,32 @@ class LineageService:
             return self.extract_lineage_relations(parsed_data, file_path)
         return []
 
+    def parse_repository_file(self, git_repo, file_path, content, use_cache=True):
+        """
+        解析仓库中的脚本文件，并按文件做血缘差量更新；内容已解析过时复用缓存结果
+        
+        Returns:
+            dict: LineageDiffer.apply返回的变更统计
+        """
+        blob_sha = git_blob_sha(content or '')
+        # 解析失败时抛出异常，保留文件原有的血缘关系
+        named_edges = self.parse_blob(blob_sha, content, use_cache=use_cache)
+        edges, skipped_tables = self._resolve_edges(named_edges)
+        if skipped_tables:
+            logger.info(f"{file_path}: 跳过了{len(skipped_tables)}个元数据中不存在的表")
+        
+        return LineageDiffer(git_repo, file_path).apply(edges, blob_sha=blob_sha)
+
+    def get_table(self, table_name):
+        """按 database.table 查找表，省略库名时使用default库"""
+        return HiveTable.objects.get(qualified_name=qualify_table_name(table_name))
+
     def get_downstream_impact(self, table_name):
         try:
-            if '.' in table_name:
-                database, table = table_name.split('.', 1)
-            else:
-                database = 'default'
-                table = table_name
+            source_table = self.get_table(table_name)
             
-            source_table = HiveTable.objects.get(name=table, database=database)
-            
-            # Get direct downstream tables
-            direct_relations = LineageRelation.objects.filter(
-                source_table=source_table
-            ).select_related('target_table')
-            
-            downstream_tables = set()
-            visited = set()
-            
-            def traverse_downstream(current_table):
-                if current_table.id in visited:
-                    return
-                visited.add(current_table.id)
-                
-                relations = LineageRelation.objects.filter(
-                    source_table=current_table
-                ).select_related('target_table')
-                
-                for relation in relations:
-                    downstream_tables.add(relation.target_table)
-                    traverse_downstream(relation.target_table)
-            
-            traverse_downstream(source_table)
+            # 全部下游表直接从可达性索引读取
+            downstream_tables = ReachabilityIndex().downstream(source_table)
             
             return {
                 'source_table': {
@@ -495,199 +631,354 @@ class LineageService:
             logger.error(f"Error getting downstream impact: {str(e)}")
             return {'error': str(e)}
 
-    def batch_parse_repository(self, git_repo):
-        from apps_git.git_service import GitService
+    def check_reachability(self, source_name, target_name):
+        """判断source表是否（直接或间接）流向target表"""
+        try:
+            source_table = self.get_table(source_name)
+            target_table = self.get_table(target_name)
+        except HiveTable.DoesNotExist:
+            return {'error': f'Table {source_name} or {target_name} not found'}
+        
+        return {
+            'source': source_table.full_name,
+            'target': target_table.full_name,
+            'reachable': ReachabilityIndex().reaches(source_table, target_table)
+        }
+
+    def find_lineage_paths(self, source_name, target_name, mode='shortest', **limits):
+        """查询source表流向target表的路径，limits为k、max_paths、max_depth"""
+        try:
+            source_table = self.get_table(source_name)
+            target_table = self.get_table(target_name)
+        except HiveTable.DoesNotExist:
+            return {'error': f'Table {source_name} or {target_name} not found'}
         
+        return LineagePathFinder().find(source_table, target_table, mode=mode, **limits)
+
+    def get_column_impact(self, table_name, column, exclude_transforms=None, max_depth=None):
+        """字段的下游影响，只沿字段级血缘展开，经过exclude_transforms类型的转换不再向下传播"""
+        try:
+            table = self.get_table(table_name)
+        except HiveTable.DoesNotExist:
+            return {'error': f'Table {table_name} not found'}
+        
+        return ColumnImpactAnalyzer().analyze(table, column, exclude_transforms, max_depth)
+
+    def get_batch_downstream_impact(self, table_names):
+        """多张表的下游影响，一次遍历得到每张表的下游集合与并集"""
+        return BatchImpactAnalyzer().analyze(table_names)
+
+    def enqueue_parse_job(self, git_repo, parse_type='full', ref=''):
+        """提交后台解析任务，由worker进程（manage.py run_lineage_worker）执行"""
+        job, created = LineageJobQueue().enqueue(git_repo, parse_type, ref=ref)
+        return job
+
+    def batch_parse_repository(self, git_repo):
+        """同步全量解析仓库（命令行和脚本使用，HTTP接口通过任务队列异步执行）"""
         job = LineageParseJob.objects.create(
             git_repo=git_repo,
             status='pending'
         )
-        
-        try:
-            job.status = 'running'
-            job.started_at = timezone.now()
-            job.save()
-            
-            git_service = GitService(git_repo)
-            sql_files = git_service.get_sql_files()
-            
-            job.total_files = len(sql_files)
-            job.save()
-            
-            for sql_file in sql_files:
-                try:
-                    content = git_service.read_file(sql_file['path'])
-                    if content:
-                        self.parse_sql_file(content, sql_file['path'])
-                    
-                    job.processed_files += 1
-                    job.save()
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process file {sql_file['path']}: {str(e)}")
-                    job.failed_files += 1
-                    job.save()
-                    continue
-            
-            job.status = 'completed'
-            job.completed_at = timezone.now()
-            job.save()
-            
-            return job
-            
-        except Exception as e:
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.completed_at = timezone.now()
-            job.save()
-            logger.error(f"Batch parsing failed: {str(e)}")
-            return job
+        return self.run_parse_job(job)
 
     def incremental_parse_repository(self, git_repo):
         """增量解析仓库 - 只解析变更的文件"""
-        from apps_git.git_service import GitService
-        
         job = LineageParseJob.objects.create(
             git_repo=git_repo,
             status='pending',
             parse_type='incremental'
         )
-        
-        try:
-            job.status = 'running'
-            job.started_at = timezone.now()
-            job.save()
-            
-            git_service = GitService(git_repo)
-            
-            # 获取最近的解析任务
-            last_successful_job = LineageParseJob.objects.filter(
-                git_repo=git_repo,
-                status='completed'
-            ).order_by('-completed_at').first()
-            
-            if last_successful_job and last_successful_job.completed_at:
-                # 获取自上次解析以来变更的文件
-                try:
-                    changed_files = git_service.get_changed_files_since(last_successful_job.completed_at)
-                    # 过滤出SQL文件
-                    sql_files = [f for f in changed_files if f.endswith('.sql')]
-                except Exception as e:
-                    logger.warning(f"Failed to get changed files, falling back to all files: {str(e)}")
-                    # 如果获取变更文件失败，回退到全量解析
-                    sql_files = [f['path'] for f in git_service.get_sql_files()]
-            else:
-                # 如果没有之前的成功解析记录，进行全量解析
-                logger.info("No previous successful parsing found, performing full parse")
-                sql_files = [f['path'] for f in git_service.get_sql_files()]
-            
-            job.total_files = len(sql_files)
-            job.save()
-            
-            logger.info(f"Incremental parsing: processing {len(sql_files)} files")
-            
-            for sql_file_path in sql_files:
-                try:
-                    content = git_service.read_file(sql_file_path)
-                    if content:
-                        self.parse_sql_file(content, sql_file_path)
-                    
-                    job.processed_files += 1
-                    job.save()
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process file {sql_file_path}: {str(e)}")
-                    job.failed_files += 1
-                    job.save()
-                    continue
-            
-            job.status = 'completed'
-            job.completed_at = timezone.now()
-            job.save()
-            
-            return job
-            
-        except Exception as e:
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.completed_at = timezone.now()
-            job.save()
-            logger.error(f"Incremental parsing failed: {str(e)}")
-            return job
+        return self.run_parse_job(job)
 
     def full_parse_repository(self, git_repo):
         """全量覆盖解析仓库 - 清除所有相关血缘关系，重新解析"""
-        from apps_git.git_service import GitService
-        
         job = LineageParseJob.objects.create(
             git_repo=git_repo,
             status='pending',
             parse_type='full_overwrite'
         )
+        return self.run_parse_job(job)
+
+    def run_parse_job(self, job, heartbeat=None, lease_owner=None):
+        """
+        执行解析任务
+        
+        Args:
+            job: LineageParseJob实例，parse_type决定全量、增量、全量覆盖或提交快照
+            heartbeat: 可选回调，在准备阶段的各步骤之间和每处理一个文件前调用，用于续约和检查取消，
+                需要停止时抛出ParseJobInterrupted
+            lease_owner: 持有任务租约的worker；提供时任务状态只在租约仍属于该worker时写入
+        """
+        from apps_git.git_service import GitService
+        
+        git_repo = job.git_repo
+        progress = JobProgressReporter(job, lease_owner=lease_owner)
+        
+        def beat():
+            if heartbeat:
+                heartbeat(job)
         
         try:
-            job.status = 'running'
-            job.started_at = timezone.now()
-            job.save()
+            # 从检查点恢复：已记录结果的文件不再重复解析
+            completed_files = progress.completed_files()
             
-            # 清除该仓库相关的血缘关系
-            deleted_relations = self._clear_repository_lineage(git_repo)
-            logger.info(f"Cleared {deleted_relations} existing lineage relations for repository {git_repo.name}")
+            job.status = 'running'
+            if not completed_files or not job.started_at:
+                job.started_at = timezone.now()
+            job.completed_at = None
+            job.error_message = ''
+            if not self._save_job(job, [
+                'status', 'started_at', 'completed_at', 'processed_files', 'failed_files', 'error_message'
+            ], lease_owner):
+                raise ParseJobInterrupted(None, 'lease lost')
             
             git_service = GitService(git_repo)
-            sql_files = git_service.get_sql_files()
+            
+            beat()
+            blob_by_path = {}
+            if job.parse_type == 'snapshot':
+                # 快照任务解析指定引用对应的提交，只解析没有缓存结果的文件内容
+                if not job.commit_sha:
+                    job.commit_sha = git_service.resolve_ref(job.ref)
+                    beat()
+                snapshot, sql_files, blob_by_path = LineageSnapshotBuilder(job, git_service).prepare()
+                removed_files = []
+            else:
+                # 记录本次解析对应的HEAD提交，作为下次增量解析的基线（续跑时沿用原提交）
+                if not job.commit_sha:
+                    job.commit_sha = git_service.get_head_sha() or ''
+                    beat()
+                
+                sql_files, removed_files = self._collect_job_files(job, git_service)
+                
+                if job.parse_type == 'full_overwrite' and not completed_files:
+                    # 文件列表获取成功后才清除该仓库相关的血缘关系，列表失败时任务失败且保留原有血缘
+                    beat()
+                    deleted_relations = self._clear_repository_lineage(git_repo)
+                    logger.info(f"Cleared {deleted_relations} existing lineage relations for repository {git_repo.name}")
+                    removed_files = []
+            
+            beat()
+            if removed_files:
+                purged = self._purge_file_lineage(git_repo, removed_files)
+                logger.info(f"Purged {purged} lineage relations of {len(removed_files)} removed files")
             
             job.total_files = len(sql_files)
-            job.save()
+            if not self._save_job(job, ['total_files', 'commit_sha'], lease_owner):
+                raise ParseJobInterrupted(None, 'lease lost')
             
-            logger.info(f"Full parsing: processing {len(sql_files)} files")
+            pending_files = [path for path in sql_files if path not in completed_files]
+            logger.info(f"{job.get_parse_type_display()}: processing {len(pending_files)} files")
             
-            for sql_file in sql_files:
-                try:
-                    content = git_service.read_file(sql_file['path'])
-                    if content:
-                        self.parse_sql_file(content, sql_file['path'])
-                    
-                    job.processed_files += 1
-                    job.save()
+            prefetch_batch = getattr(settings, 'LINEAGE_JOB_CONFIG', {}).get('prefetch_batch', 100)
+            file_contents = git_service.iter_file_contents(
+                pending_files,
+                commit=job.commit_sha or None,
+                batch_size=prefetch_batch
+            )
+            # 任务中断时及时关闭读取进程
+            with closing(file_contents):
+                for sql_file_path, content in file_contents:
+                    beat()
                     
-                except Exception as e:
-                    logger.error(f"Failed to process file {sql_file['path']}: {str(e)}")
-                    job.failed_files += 1
-                    job.save()
-                    continue
+                    try:
+                        if content is None:
+                            # 读取失败时保留文件原有的血缘关系
+                            raise Exception("文件读取失败")
+                        if job.parse_type == 'snapshot':
+                            blob_sha = blob_by_path[sql_file_path]
+                            # 解析结果按blob缓存并被其他任务复用，内容必须确实是快照中的该blob
+                            if git_blob_sha(content) != blob_sha:
+                                raise Exception(f"读取的文件内容与提交中的blob {blob_sha[:8]} 不一致")
+                            self.parse_blob(blob_sha, content)
+                        else:
+                            # 全量覆盖解析不使用缓存结果，全部重新解析
+                            self.parse_repository_file(
+                                git_repo, sql_file_path, content,
+                                use_cache=job.parse_type != 'full_overwrite'
+                            )
+                        
+                        progress.record_success(sql_file_path)
+                        
+                    except ParseJobInterrupted:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Failed to process file {sql_file_path}: {str(e)}")
+                        progress.record_failure(sql_file_path, e)
+                        continue
+            
+            progress.flush()
             
             job.status = 'completed'
             job.completed_at = timezone.now()
-            job.save()
+            self._finish_job(job, ['status', 'completed_at'], lease_owner)
+            return job
             
+        except ParseJobInterrupted as e:
+            if e.status is None:
+                # 租约已被其他worker接管，不再写入任务状态
+                logger.warning(f"Parse job {job.id} lost its lease, stopping")
+                return job
+            try:
+                progress.flush()
+            except ParseJobInterrupted:
+                logger.warning(f"Parse job {job.id} lost its lease, stopping")
+                return job
+            job.status = e.status
+            job.error_message = str(e) if e.status == 'cancelled' else ''
+            job.completed_at = timezone.now() if e.status == 'cancelled' else None
+            logger.info(f"Parse job {job.id} interrupted: {str(e)}")
+            self._finish_job(job, ['status', 'error_message', 'completed_at'], lease_owner)
             return job
             
         except Exception as e:
+            try:
+                progress.flush()
+            except Exception as flush_error:
+                logger.error(f"Failed to save parse progress: {str(flush_error)}")
             job.status = 'failed'
             job.error_message = str(e)
             job.completed_at = timezone.now()
-            job.save()
-            logger.error(f"Full parsing failed: {str(e)}")
+            logger.error(f"{job.get_parse_type_display()} failed: {str(e)}")
+            self._finish_job(job, ['status', 'error_message', 'completed_at'], lease_owner)
             return job
 
-    def _clear_repository_lineage(self, git_repo):
-        """清除指定仓库相关的血缘关系"""
-        # 找到与该仓库相关的所有血缘关系（通过file_path匹配）
-        relations_to_delete = LineageRelation.objects.filter(
-            file_path__contains=git_repo.name
-        )
+    def _save_job(self, job, fields, lease_owner=None):
+        """
+        保存任务字段；提供lease_owner时以条件更新写入，租约已被其他worker接管时不写入
+
+        Returns:
+            是否写入成功
+        """
+        if not lease_owner:
+            job.save(update_fields=fields)
+            return True
+        return bool(LineageParseJob.objects.filter(id=job.id, lease_owner=lease_owner).update(
+            **{field: getattr(job, field) for field in fields}
+        ))
+
+    def _finish_job(self, job, fields, lease_owner=None):
+        """写入任务的最终状态；租约已丢失时由接管的worker负责，不再刷新索引"""
+        if not self._save_job(job, fields, lease_owner):
+            logger.warning(f"Parse job {job.id} lost its lease before finishing, result not recorded")
+            return
+        self._refresh_after_job(job)
+
+    def _refresh_after_job(self, job):
+        # 快照任务不写入表级血缘；其他任务即使中途失败，已处理的文件也可能改变了血缘
+        if job.parse_type != 'snapshot':
+            self.on_lineage_changed()
+            if getattr(settings, 'LINEAGE_ANALYTICS_CONFIG', {}).get('refresh_after_job', True):
+                self.refresh_table_metrics()
+
+    def refresh_table_metrics(self):
+        """重新计算每张表的血缘统计指标，失败只记录日志"""
+        try:
+            return LineageGraphAnalytics().refresh()
+        except Exception as e:
+            logger.error(f"Failed to refresh lineage table metrics: {str(e)}")
+            return None
+
+    def on_lineage_changed(self):
+        """
+        血缘写入后增量更新可达性索引并递增血缘图版本号（使查询结果缓存失效）
+        索引刷新失败只记录日志，下次刷新会重新比较
+        """
+        try:
+            ReachabilityIndex().refresh()
+        except Exception as e:
+            logger.error(f"Failed to refresh reachability index: {str(e)}")
+        bump_graph_version()
+
+    def get_last_parsed_job(self, git_repo, exclude_job=None):
+        """仓库当前分支最近一次成功解析的任务（快照任务解析的是其他提交，不作为基线）"""
+        jobs = LineageParseJob.objects.filter(
+            git_repo=git_repo,
+            status='completed'
+        ).exclude(commit_sha='').exclude(parse_type='snapshot')
+        if exclude_job is not None:
+            jobs = jobs.exclude(id=exclude_job.id)
+        return jobs.order_by('-completed_at').first()
+
+    def _collect_job_files(self, job, git_service):
+        """
+        确定任务需要解析的文件
+        
+        Returns:
+            (需要解析的文件路径列表, 已删除或被重命名的旧文件路径列表)
+        """
+        if job.parse_type != 'incremental':
+            return self._collect_all_files(job, git_service)
+        
+        # 以上一次成功解析的提交为基线
+        last_successful_job = self.get_last_parsed_job(job.git_repo, exclude_job=job)
+        
+        if not last_successful_job or not job.commit_sha:
+            # 如果没有之前的成功解析记录，进行全量解析
+            logger.info("No previous parsed commit found, performing full parse")
+            return self._collect_all_files(job, git_service)
         
-        deleted_count = relations_to_delete.count()
+        if last_successful_job.commit_sha == job.commit_sha:
+            logger.info(f"HEAD {job.commit_sha[:8]} already parsed, nothing to do")
+            return [], []
         
-        # 删除相关的字段级血缘
-        from .models import ColumnLineage
-        ColumnLineage.objects.filter(
-            lineage_relation__in=relations_to_delete
-        ).delete()
+        try:
+            changes = git_service.get_changes_between(last_successful_job.commit_sha, job.commit_sha)
+        except Exception as e:
+            # 基线提交不存在（如强制推送）、比较结果被截断等情况无法确定变化的文件，任务失败，需执行全量解析
+            raise Exception(f"比较提交 {last_successful_job.commit_sha[:8]}..{job.commit_sha[:8]} 失败，"
+                            f"请执行全量解析: {str(e)}")
+        
+        changed_files = []
+        removed_files = []
+        for change in changes:
+            if change['status'] == 'D':
+                removed_files.append(change['path'])
+                continue
+            if change['status'] == 'R' and change['old_path']:
+                removed_files.append(change['old_path'])
+            changed_files.append(change['path'])
+        
+        # 过滤出SQL文件
+        is_sql = lambda path: path.lower().endswith('.sql')
+        return [f for f in changed_files if is_sql(f)], [f for f in removed_files if is_sql(f)]
+
+    def _collect_all_files(self, job, git_service):
+        """
+        全部SQL文件，以及已有血缘记录但已不在仓库中的文件
+        文件列表获取失败，或列表为空而已有解析记录时抛出异常，任务失败且不删除任何血缘
+        """
+        files = git_service.get_sql_files()
+        parsed_blobs = dict(LineageSourceFile.objects.filter(
+            git_repo=job.git_repo
+        ).values_list('file_path', 'blob_sha'))
+        if not files and parsed_blobs:
+            # 列表为空而仓库已有解析记录，多半是分支或权限异常，不能据此删除全部血缘
+            raise Exception(f"仓库中未找到SQL文件，但已有{len(parsed_blobs)}个文件的血缘记录，任务终止以免误删血缘")
         
-        # 删除表级血缘关系
-        relations_to_delete.delete()
+        current = {f['path'] for f in files}
+        stale_files = [path for path in parsed_blobs if path not in current]
+        return [f['path'] for f in files], stale_files
+
+    def _purge_file_lineage(self, git_repo, file_paths):
+        """
+        删除指定脚本文件产生的血缘关系（字段级血缘级联删除）
+        只删除归属于本仓库的血缘；未归属的旧数据可能来自其他仓库的同名文件或手动解析，不删除
+        """
+        relations = LineageRelation.objects.filter(
+            source_file__git_repo=git_repo,
+            source_file__file_path__in=file_paths
+        )
+        deleted_count = relations.count()
+        relations.delete()
+        LineageSourceFile.objects.filter(git_repo=git_repo, file_path__in=file_paths).delete()
+        return deleted_count
+
+    def _clear_repository_lineage(self, git_repo):
+        """清除指定仓库相关的血缘关系"""
+        # 血缘关系归属于仓库的脚本文件，删除文件记录时表级和字段级血缘级联删除
+        deleted_count = LineageRelation.objects.filter(source_file__git_repo=git_repo).count()
+        LineageSourceFile.objects.filter(git_repo=git_repo).delete()
         
         return deleted_count
 
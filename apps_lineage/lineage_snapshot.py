@@ -0,0 +1,144 @@
+"""
+提交级血缘快照
+按 (仓库, 提交SHA) 从Git对象库构建血缘快照，不切换工作区；快照只记录文件到blob SHA的映射，
+血缘来自按blob缓存的解析结果，因此另一个分支只需解析内容不同的文件
+"""
+import logging
+
+from .models import LineageSnapshot, LineageSnapshotFile, LineageBlobResult
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数有限，IN查询分批执行
+QUERY_CHUNK_SIZE = 500
+
+
+def cached_blob_shas(blob_shas):
+    """已有解析结果的blob SHA集合"""
+    blob_shas = list(blob_shas)
+    cached = set()
+    for start in range(0, len(blob_shas), QUERY_CHUNK_SIZE):
+        cached.update(LineageBlobResult.objects.filter(
+            blob_sha__in=blob_shas[start:start + QUERY_CHUNK_SIZE]
+        ).values_list('blob_sha', flat=True))
+    return cached
+
+
+class LineageSnapshotBuilder:
+    """为快照任务登记文件清单，并找出需要解析的文件"""
+
+    def __init__(self, job, git_service):
+        self.job = job
+        self.git_service = git_service
+
+    def prepare(self):
+        """
+        Returns:
+            (snapshot, 需要解析的文件路径列表, {路径: blob SHA})
+            内容相同的多个文件只解析其中一个
+        """
+        files = self.git_service.list_sql_files_at(self.job.commit_sha)
+        blob_by_path = {f['path']: f['blob_id'] for f in files}
+
+        snapshot, created = LineageSnapshot.objects.get_or_create(
+            git_repo=self.job.git_repo,
+            commit_sha=self.job.commit_sha,
+            defaults={'ref': self.job.ref, 'job': self.job}
+        )
+        if not created:
+            snapshot.job = self.job
+            snapshot.ref = self.job.ref or snapshot.ref
+
+        # 提交的内容不可变，文件清单只需登记一次
+        if not snapshot.files.exists():
+            LineageSnapshotFile.objects.bulk_create([
+                LineageSnapshotFile(snapshot=snapshot, file_path=path, blob_sha=blob_sha)
+                for path, blob_sha in blob_by_path.items()
+            ], batch_size=QUERY_CHUNK_SIZE, ignore_conflicts=True)
+
+        cached = cached_blob_shas(set(blob_by_path.values()))
+        to_parse = []
+        seen_blobs = set()
+        for path, blob_sha in blob_by_path.items():
+            if blob_sha in cached or blob_sha in seen_blobs:
+                continue
+            seen_blobs.add(blob_sha)
+            to_parse.append(path)
+
+        snapshot.total_files = len(blob_by_path)
+        snapshot.reused_files = sum(1 for blob_sha in blob_by_path.values() if blob_sha in cached)
+        snapshot.save()
+
+        logger.info(
+            f"Snapshot {snapshot} of {self.job.git_repo.name}: {snapshot.total_files} files, "
+            f"{snapshot.reused_files} reused, {len(to_parse)} to parse"
+        )
+        return snapshot, to_parse, blob_by_path
+
+
+def get_snapshot_edges(snapshot):
+    """
+    合并快照中所有文件的解析结果
+
+    Returns:
+        {(source, target): {'source', 'target', 'relation_type', 'columns', 'sql_script_paths'}}
+        未解析成功的文件不产生血缘
+    """
+    paths_by_blob = {}
+    for file_path, blob_sha in snapshot.files.values_list('file_path', 'blob_sha'):
+        paths_by_blob.setdefault(blob_sha, []).append(file_path)
+
+    blob_shas = list(paths_by_blob)
+    edges = {}
+    for start in range(0, len(blob_shas), QUERY_CHUNK_SIZE):
+        results = LineageBlobResult.objects.filter(blob_sha__in=blob_shas[start:start + QUERY_CHUNK_SIZE])
+        for result in results:
+            for named_edge in result.edges:
+                key = (named_edge['source'], named_edge['target'])
+                edge = edges.setdefault(key, {
+                    'source': named_edge['source'],
+                    'target': named_edge['target'],
+                    'relation_type': named_edge['relation_type'],
+                    'columns': set(),
+                    'sql_script_paths': set()
+                })
+                edge['columns'].update(tuple(pair) for pair in named_edge['columns'])
+                edge['sql_script_paths'].update(paths_by_blob[result.blob_sha])
+    return edges
+
+
+def serialize_edge(edge):
+    return {
+        'source': edge['source'],
+        'target': edge['target'],
+        'relation_type': edge['relation_type'],
+        'columns': sorted([list(pair) for pair in edge['columns']]),
+        'sql_script_paths': sorted(edge['sql_script_paths'])
+    }
+
+
+def compare_snapshots(base, head):
+    """
+    比较两个快照的血缘差异
+
+    Returns:
+        {'added': [...], 'removed': [...], 'changed': [...]}，changed为字段级血缘有变化的表级血缘
+    """
+    base_edges = get_snapshot_edges(base)
+    head_edges = get_snapshot_edges(head)
+
+    added = [serialize_edge(head_edges[key]) for key in sorted(head_edges.keys() - base_edges.keys())]
+    removed = [serialize_edge(base_edges[key]) for key in sorted(base_edges.keys() - head_edges.keys())]
+    changed = []
+    for key in sorted(head_edges.keys() & base_edges.keys()):
+        head_columns = head_edges[key]['columns']
+        base_columns = base_edges[key]['columns']
+        if head_columns != base_columns:
+            changed.append({
+                'source': key[0],
+                'target': key[1],
+                'added_columns': sorted([list(pair) for pair in head_columns - base_columns]),
+                'removed_columns': sorted([list(pair) for pair in base_columns - head_columns])
+            })
+
+    return {'added': added, 'removed': removed, 'changed': changed}
@@ -0,0 +1,100 @@
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from apps_lineage.job_queue import LineageJobQueue, default_worker_id
+from apps_lineage.lineage_service import LineageService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run the background worker that executes queued lineage parse jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--worker-id',
+            type=str,
+            default=None,
+            help='Worker identifier used as lease owner (default: hostname-pid)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=300,
+            help='Job lease duration; jobs of crashed workers are reclaimed after it expires',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=3,
+            help='Mark a job as failed once it has been claimed this many times',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process all currently queued jobs and exit',
+        )
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        queue = LineageJobQueue(lease_seconds=options['lease_seconds'])
+        self._stopping = False
+
+        def request_stop(signum, frame):
+            self.stdout.write(self.style.WARNING('Stop requested, finishing current file...'))
+            self._stopping = True
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        self.stdout.write(self.style.SUCCESS(f'Lineage worker {worker_id} started'))
+
+        while not self._stopping:
+            try:
+                job = queue.claim(worker_id)
+            except Exception as e:
+                # 数据库暂时不可用等错误不退出worker，丢弃失效的连接后等待重试
+                if options['once']:
+                    raise
+                logger.error(f"Worker {worker_id} failed to claim a parse job: {str(e)}")
+                close_old_connections()
+                time.sleep(options['poll_interval'])
+                continue
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            if job.cancel_requested:
+                queue.cancel(job, worker_id)
+                queue.release(job, worker_id)
+                continue
+
+            if job.attempts > options['max_attempts']:
+                queue.fail(job, f"任务已尝试 {job.attempts - 1} 次仍未完成，放弃执行")
+                self.stdout.write(self.style.ERROR(f'Job {job.id} exceeded max attempts'))
+                continue
+
+            self.stdout.write(f'Running job {job.id} ({job.parse_type}) for {job.git_repo.name}')
+            try:
+                heartbeat = queue.heartbeat(job, worker_id, should_stop=lambda: self._stopping)
+                job = LineageService().run_parse_job(job, heartbeat=heartbeat, lease_owner=worker_id)
+            finally:
+                queue.release(job, worker_id)
+
+            self.stdout.write(
+                f'Job {job.id} {job.status}: {job.processed_files}/{job.total_files} files, '
+                f'{job.failed_files} failed'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Lineage worker {worker_id} stopped'))
@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps_lineage.repo_scheduler import RepoSyncScheduler
+
+
+class Command(BaseCommand):
+    help = 'Periodically check active repositories and queue incremental parses when HEAD moved'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tick',
+            type=float,
+            default=None,
+            help='Seconds between scheduler rounds (default: REPO_SCHEDULER_CONFIG tick)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Check all due repositories once and exit',
+        )
+
+    def handle(self, *args, **options):
+        config = getattr(settings, 'REPO_SCHEDULER_CONFIG', {})
+        tick = options['tick'] or config.get('tick', 30)
+        scheduler = RepoSyncScheduler()
+        self._stopping = False
+
+        def request_stop(signum, frame):
+            self._stopping = True
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Repository scheduler started (check interval {config.get('interval', 300)}s)"
+        ))
+
+        while not self._stopping:
+            queued = scheduler.tick()
+            if queued:
+                self.stdout.write(f'Queued {queued} incremental parse jobs')
+            if options['once']:
+                break
+            deadline = time.monotonic() + tick
+            while not self._stopping and time.monotonic() < deadline:
+                time.sleep(1)
+
+        self.stdout.write(self.style.SUCCESS('Repository scheduler stopped'))
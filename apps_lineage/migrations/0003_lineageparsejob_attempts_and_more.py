@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_git', '0005_gitrepo_successful_auth_format'),
+        ('apps_lineage', '0002_lineageparsejob_parse_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lineageparsejob',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lineageparsejob',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='lineageparsejob',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lineageparsejob',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='lineageparsejob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='lineageparsejob',
+            index=models.Index(fields=['status', 'created_at'], name='apps_lineag_status_f2c715_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_lineage', '0003_lineageparsejob_attempts_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineageParseFileResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed')], max_length=10)),
+                ('error_message', models.CharField(blank=True, max_length=500)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_results', to='apps_lineage.lineageparsejob')),
+            ],
+            options={
+                'unique_together': {('job', 'file_path')},
+            },
+        ),
+    ]
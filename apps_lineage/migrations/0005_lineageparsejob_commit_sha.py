@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_lineage', '0004_lineageparsefileresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lineageparsejob',
+            name='commit_sha',
+            field=models.CharField(blank=True, help_text='本次解析对应的分支HEAD提交，增量解析以此为基线', max_length=40),
+        ),
+    ]
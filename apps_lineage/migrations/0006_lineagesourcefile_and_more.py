@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_git', '0005_gitrepo_successful_auth_format'),
+        ('apps_lineage', '0005_lineageparsejob_commit_sha'),
+        ('apps_metadata', '0002_hiveauthconfig_hivejarfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineageSourceFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=500)),
+                ('blob_sha', models.CharField(blank=True, help_text='最近一次解析时文件内容的Git blob SHA', max_length=40)),
+                ('parsed_at', models.DateTimeField(blank=True, null=True)),
+                ('git_repo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineage_files', to='apps_git.gitrepo')),
+            ],
+            options={
+                'unique_together': {('git_repo', 'file_path')},
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='lineagerelation',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='lineagerelation',
+            name='source_file',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='relations', to='apps_lineage.lineagesourcefile'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='lineagerelation',
+            unique_together={('source_table', 'target_table', 'sql_script_path', 'source_file')},
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_git', '0006_gitrepo_clone_depth_gitrepo_clone_strategy'),
+        ('apps_lineage', '0006_lineagesourcefile_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineageBlobResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blob_sha', models.CharField(max_length=40, unique=True)),
+                ('edges_json', models.TextField(default='[]')),
+                ('parsed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='lineageparsejob',
+            name='ref',
+            field=models.CharField(blank=True, help_text='快照任务要解析的分支、标签或提交', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='lineageparsejob',
+            name='parse_type',
+            field=models.CharField(choices=[('full', 'Full Parse'), ('incremental', 'Incremental Parse'), ('full_overwrite', 'Full Overwrite Parse'), ('snapshot', 'Commit Snapshot')], default='full', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='LineageSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commit_sha', models.CharField(max_length=40)),
+                ('ref', models.CharField(blank=True, help_text='构建时请求的分支、标签或提交', max_length=255)),
+                ('total_files', models.IntegerField(default=0)),
+                ('reused_files', models.IntegerField(default=0, help_text='直接复用已有解析结果的文件数')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('git_repo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineage_snapshots', to='apps_git.gitrepo')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='snapshots', to='apps_lineage.lineageparsejob')),
+            ],
+            options={
+                'unique_together': {('git_repo', 'commit_sha')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LineageSnapshotFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=500)),
+                ('blob_sha', models.CharField(db_index=True, max_length=40)),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='apps_lineage.lineagesnapshot')),
+            ],
+            options={
+                'unique_together': {('snapshot', 'file_path')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_reachability(apps, schema_editor):
+    """根据已有的表级血缘构建闭包表"""
+    from apps_lineage.reachability import compute_reach
+
+    LineageRelation = apps.get_model('apps_lineage', 'LineageRelation')
+    LineageReachability = apps.get_model('apps_lineage', 'LineageReachability')
+
+    edges = set(LineageRelation.objects.values_list('source_table_id', 'target_table_id').distinct())
+    adjacency = {}
+    for source_id, target_id in edges:
+        adjacency.setdefault(source_id, set()).add(target_id)
+
+    LineageReachability.objects.bulk_create([
+        LineageReachability(
+            source_table_id=source_id,
+            target_table_id=target_id,
+            is_direct=(source_id, target_id) in edges
+        )
+        for source_id, targets in compute_reach(adjacency, list(adjacency)).items()
+        for target_id in targets
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_lineage', '0007_lineageblobresult_lineageparsejob_ref_and_more'),
+        ('apps_metadata', '0002_hiveauthconfig_hivejarfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineageReachability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_direct', models.BooleanField(default=False, help_text='两表之间存在直接血缘关系')),
+                ('source_table', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='apps_metadata.hivetable')),
+                ('target_table', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='apps_metadata.hivetable')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target_table', 'source_table'], name='apps_lineag_target__751ada_idx')],
+                'unique_together': {('source_table', 'target_table')},
+            },
+        ),
+        migrations.RunPython(build_reachability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_lineage', '0009_lineagegraphstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='columnlineage',
+            name='transform_type',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
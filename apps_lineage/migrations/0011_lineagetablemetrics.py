@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_lineage', '0010_columnlineage_transform_type'),
+        ('apps_metadata', '0003_hivetable_qualified_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineageTableMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('downstream_count', models.IntegerField(default=0, help_text='直接或间接下游表数')),
+                ('upstream_count', models.IntegerField(default=0, help_text='直接或间接上游表数')),
+                ('fan_in', models.IntegerField(default=0, help_text='直接上游表数')),
+                ('fan_out', models.IntegerField(default=0, help_text='直接下游表数')),
+                ('upstream_depth', models.IntegerField(default=0, help_text='最长上游链的跳数，环上的表视为一个节点')),
+                ('is_orphan', models.BooleanField(default=False, help_text='没有任何血缘关系')),
+                ('is_dead_end', models.BooleanField(default=False, help_text='有上游但没有下游')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('table', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lineage_metrics', to='apps_metadata.hivetable')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['downstream_count'], name='apps_lineag_downstr_c44ed6_idx'), models.Index(fields=['upstream_depth'], name='apps_lineag_upstrea_4deb4a_idx')],
+            },
+        ),
+    ]
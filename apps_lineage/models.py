@@ -3,6 +3,20 @@ from apps_metadata.models import HiveTable
 import json
 
 
+class LineageSourceFile(models.Model):
+    """产生血缘关系的仓库脚本文件，血缘关系按文件归属，重新解析时按文件做增量更新"""
+    git_repo = models.ForeignKey('apps_git.GitRepo', on_delete=models.CASCADE, related_name='lineage_files')
+    file_path = models.CharField(max_length=500)
+    blob_sha = models.CharField(max_length=40, blank=True, help_text='最近一次解析时文件内容的Git blob SHA')
+    parsed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['git_repo', 'file_path']
+
+    def __str__(self):
+        return f"{self.git_repo_id}:{self.file_path}"
+
+
 class LineageRelation(models.Model):
     source_table = models.ForeignKey(
         HiveTable, 
@@ -15,12 +29,19 @@ class LineageRelation(models.Model):
         related_name='incoming_relations'
     )
     sql_script_path = models.CharField(max_length=500, blank=True)
+    source_file = models.ForeignKey(
+        LineageSourceFile,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='relations'
+    )
     relation_type = models.CharField(max_length=50, default='insert')
     process_id = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ['source_table', 'target_table', 'sql_script_path']
+        unique_together = ['source_table', 'target_table', 'sql_script_path', 'source_file']
 
     def __str__(self):
         return f"{self.source_table.full_name} -> {self.target_table.full_name}"
@@ -31,6 +52,8 @@ class ColumnLineage(models.Model):
     source_column = models.CharField(max_length=255)
     target_column = models.CharField(max_length=255)
     transformation = models.TextField(blank=True)
+    # direct/expression/function/aggregate/case，为空表示解析结果中没有转换信息
+    transform_type = models.CharField(max_length=20, blank=True, default='')
 
     class Meta:
         unique_together = ['relation', 'source_column', 'target_column']
@@ -45,12 +68,14 @@ class LineageParseJob(models.Model):
         ('running', 'Running'), 
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
     ]
     
     PARSE_TYPE_CHOICES = [
         ('full', 'Full Parse'),
         ('incremental', 'Incremental Parse'),
         ('full_overwrite', 'Full Overwrite Parse'),
+        ('snapshot', 'Commit Snapshot'),
     ]
     
     git_repo = models.ForeignKey('apps_git.GitRepo', on_delete=models.CASCADE, null=True, blank=True)
@@ -60,9 +85,22 @@ class LineageParseJob(models.Model):
     processed_files = models.IntegerField(default=0)
     failed_files = models.IntegerField(default=0)
     error_message = models.TextField(blank=True)
+    commit_sha = models.CharField(max_length=40, blank=True, help_text='本次解析对应的分支HEAD提交，增量解析以此为基线')
+    ref = models.CharField(max_length=255, blank=True, help_text='快照任务要解析的分支、标签或提交')
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    # 后台任务队列：worker通过租约领取任务，租约过期的任务可被其他worker接管
+    lease_owner = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
 
     def __str__(self):
         repo_name = self.git_repo.name if self.git_repo else "Manual"
@@ -73,3 +111,125 @@ class LineageParseJob(models.Model):
         if self.total_files == 0:
             return 0
         return (self.processed_files / self.total_files) * 100
+
+
+class LineageParseFileResult(models.Model):
+    """解析任务中单个文件的处理结果，用于断点续跑"""
+    STATUS_CHOICES = [
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+    
+    job = models.ForeignKey(LineageParseJob, on_delete=models.CASCADE, related_name='file_results')
+    file_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    error_message = models.CharField(max_length=500, blank=True)
+
+    class Meta:
+        unique_together = ['job', 'file_path']
+
+    def __str__(self):
+        return f"{self.file_path} ({self.status})"
+
+
+class LineageBlobResult(models.Model):
+    """按文件内容（Git blob SHA）缓存的解析结果，不同提交、分支中内容相同的文件直接复用"""
+    blob_sha = models.CharField(max_length=40, unique=True)
+    edges_json = models.TextField(default='[]')
+    parsed_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def edges(self):
+        try:
+            return json.loads(self.edges_json)
+        except (json.JSONDecodeError, TypeError):
+            return []
+
+    @edges.setter
+    def edges(self, value):
+        self.edges_json = json.dumps(value, ensure_ascii=False)
+
+    def __str__(self):
+        return self.blob_sha
+
+
+class LineageSnapshot(models.Model):
+    """仓库某个提交的血缘快照，直接从Git对象库构建，不切换工作区"""
+    git_repo = models.ForeignKey('apps_git.GitRepo', on_delete=models.CASCADE, related_name='lineage_snapshots')
+    commit_sha = models.CharField(max_length=40)
+    ref = models.CharField(max_length=255, blank=True, help_text='构建时请求的分支、标签或提交')
+    job = models.ForeignKey(LineageParseJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='snapshots')
+    total_files = models.IntegerField(default=0)
+    reused_files = models.IntegerField(default=0, help_text='直接复用已有解析结果的文件数')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['git_repo', 'commit_sha']
+
+    def __str__(self):
+        return f"{self.git_repo_id}@{self.commit_sha[:8]}"
+
+
+class LineageSnapshotFile(models.Model):
+    """快照中的SQL文件及其blob SHA，快照的血缘由这些blob的解析结果合并而成"""
+    snapshot = models.ForeignKey(LineageSnapshot, on_delete=models.CASCADE, related_name='files')
+    file_path = models.CharField(max_length=500)
+    blob_sha = models.CharField(max_length=40, db_index=True)
+
+    class Meta:
+        unique_together = ['snapshot', 'file_path']
+
+    def __str__(self):
+        return f"{self.file_path} ({self.blob_sha[:8]})"
+
+
+class LineageReachability(models.Model):
+    """表级血缘的传递闭包：source_table 直接或间接流向 target_table，由 ReachabilityIndex 维护"""
+    # 不建外键约束，删除表时保留这些行，由下一次刷新根据直接血缘的变化重新计算
+    source_table = models.ForeignKey(
+        HiveTable, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    target_table = models.ForeignKey(
+        HiveTable, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    is_direct = models.BooleanField(default=False, help_text='两表之间存在直接血缘关系')
+
+    class Meta:
+        unique_together = ['source_table', 'target_table']
+        indexes = [
+            models.Index(fields=['target_table', 'source_table']),
+        ]
+
+    def __str__(self):
+        return f"{self.source_table_id} ~> {self.target_table_id}"
+
+
+class LineageGraphState(models.Model):
+    """血缘图版本号（单行），每次写入血缘后递增，用于使查询结果缓存失效"""
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"v{self.version}"
+
+
+class LineageTableMetrics(models.Model):
+    """表在血缘图中的统计指标，由 LineageGraphAnalytics 在解析任务结束后批量计算"""
+    table = models.OneToOneField(HiveTable, on_delete=models.CASCADE, related_name='lineage_metrics')
+    downstream_count = models.IntegerField(default=0, help_text='直接或间接下游表数')
+    upstream_count = models.IntegerField(default=0, help_text='直接或间接上游表数')
+    fan_in = models.IntegerField(default=0, help_text='直接上游表数')
+    fan_out = models.IntegerField(default=0, help_text='直接下游表数')
+    upstream_depth = models.IntegerField(default=0, help_text='最长上游链的跳数，环上的表视为一个节点')
+    is_orphan = models.BooleanField(default=False, help_text='没有任何血缘关系')
+    is_dead_end = models.BooleanField(default=False, help_text='有上游但没有下游')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['downstream_count']),
+            models.Index(fields=['upstream_depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.table_id}: {self.downstream_count} downstream"
@@ -0,0 +1,56 @@
+"""
+血缘查询结果缓存
+缓存键为 (接口, 查询参数, 血缘图版本号)，解析任务写入血缘后版本号递增，旧结果自然不再命中
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .graph_version import get_graph_version
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'lineage_query'
+
+
+class LineageQueryCache:
+    """基于Django缓存框架的查询结果缓存，使用 LINEAGE_QUERY_CACHE_CONFIG 指定的缓存"""
+
+    def __init__(self):
+        config = getattr(settings, 'LINEAGE_QUERY_CACHE_CONFIG', {})
+        self.enabled = config.get('enabled', True)
+        self.timeout = config.get('timeout', 3600)
+        self.cache = caches[config.get('cache_alias', 'default')]
+
+    def _key(self, endpoint, params, version):
+        digest = hashlib.sha1(
+            json.dumps(sorted(params.items()), ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        return f"{CACHE_PREFIX}:{endpoint}:{version}:{digest}"
+
+    def get_or_compute(self, endpoint, params, compute):
+        """
+        Args:
+            endpoint: 接口名
+            params: 影响结果的查询参数
+            compute: 无参调用，返回 (data, status_code)，只缓存200的结果
+
+        Returns:
+            (data, status_code, 是否命中缓存)
+        """
+        if not self.enabled:
+            data, status_code = compute()
+            return data, status_code, False
+
+        key = self._key(endpoint, params, get_graph_version())
+        data = self.cache.get(key)
+        if data is not None:
+            return data, 200, True
+
+        data, status_code = compute()
+        if status_code == 200:
+            self.cache.set(key, data, self.timeout)
+        return data, status_code, False
@@ -0,0 +1,219 @@
+"""
+表级血缘可达性索引
+物化的传递闭包表：每个 (上游表, 可达的下游表) 一行。计算时先用Tarjan算法把强连通分量（环）收缩成单个节点，
+同一分量内的表共享可达集合；解析任务结束后只重新计算直接血缘有变化的表及其所有上游表。
+"某表的全部下游"和"A是否可达B"都只需一次索引查询
+"""
+import logging
+
+from django.db import transaction
+
+from .models import LineageRelation, LineageReachability
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数有限，IN查询分批执行
+QUERY_CHUNK_SIZE = 500
+
+
+def compute_reach(adjacency, sources):
+    """
+    计算sources中每个节点可达的节点集合（不含自身，除非自身位于环上）
+
+    Args:
+        adjacency: {节点: 下游节点集合}
+        sources: 需要计算的起点
+
+    Returns:
+        {节点: 可达节点集合}，同一强连通分量内的节点共享同一个集合对象
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    component_of = {}
+    component_members = []
+    component_reach = []
+    counter = 0
+
+    for root in sources:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(adjacency.get(root, ())))]
+
+        # 迭代版Tarjan算法，避免长血缘链超过Python递归深度
+        while work:
+            node, successors = work[-1]
+            descended = False
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(adjacency.get(successor, ()))))
+                    descended = True
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            if descended:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] != index[node]:
+                continue
+
+            # node是强连通分量的根，分量按逆拓扑序产生，下游分量的可达集合均已算好
+            members = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                members.append(member)
+                if member == node:
+                    break
+            component_id = len(component_members)
+            for member in members:
+                component_of[member] = component_id
+
+            reach = set()
+            cyclic = len(members) > 1
+            for member in members:
+                for successor in adjacency.get(member, ()):
+                    successor_component = component_of[successor]
+                    if successor_component == component_id:
+                        cyclic = True
+                    else:
+                        reach.update(component_members[successor_component])
+                        reach |= component_reach[successor_component]
+            if cyclic:
+                reach.update(members)
+
+            component_members.append(members)
+            component_reach.append(reach)
+
+    return {node: component_reach[component_of[node]] for node in sources}
+
+
+class ReachabilityIndex:
+    """维护 LineageReachability 闭包表"""
+
+    def _load_edges(self):
+        return set(
+            LineageRelation.objects.values_list('source_table_id', 'target_table_id').distinct()
+        )
+
+    def _indexed_ancestors(self, table_ids):
+        """闭包表中（更新前）能到达table_ids的表"""
+        table_ids = list(table_ids)
+        ancestors = set()
+        for start in range(0, len(table_ids), QUERY_CHUNK_SIZE):
+            ancestors.update(LineageReachability.objects.filter(
+                target_table_id__in=table_ids[start:start + QUERY_CHUNK_SIZE]
+            ).values_list('source_table_id', flat=True))
+        return ancestors
+
+    @staticmethod
+    def _graph_ancestors(reverse_adjacency, table_ids):
+        """当前血缘图中能到达table_ids的表（含table_ids自身）"""
+        ancestors = set(table_ids)
+        frontier = list(table_ids)
+        while frontier:
+            node = frontier.pop()
+            for parent in reverse_adjacency.get(node, ()):
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    frontier.append(parent)
+        return ancestors
+
+    def refresh(self):
+        """
+        按直接血缘的变化增量更新闭包表
+
+        以闭包表中标记为直接血缘的行作为上次的图，与当前 LineageRelation 比较；
+        只有变化边的上游表（更新前后两张图中的上游并集）的可达集合可能改变
+
+        Returns:
+            {'changed_edges', 'affected_tables', 'rows'}
+        """
+        edges = self._load_edges()
+        indexed_edges = set(
+            LineageReachability.objects.filter(is_direct=True).values_list('source_table_id', 'target_table_id')
+        )
+        changed = edges ^ indexed_edges
+        if not changed:
+            return {'changed_edges': 0, 'affected_tables': 0, 'rows': 0}
+
+        adjacency = {}
+        reverse_adjacency = {}
+        for source_id, target_id in edges:
+            adjacency.setdefault(source_id, set()).add(target_id)
+            reverse_adjacency.setdefault(target_id, set()).add(source_id)
+
+        changed_sources = {source_id for source_id, _ in changed}
+        affected = self._graph_ancestors(reverse_adjacency, changed_sources)
+        affected |= self._indexed_ancestors(changed_sources)
+
+        rows = self._write(affected, compute_reach(adjacency, affected), edges)
+        logger.info(
+            f"Reachability index refreshed: {len(changed)} changed edges, "
+            f"{len(affected)} affected tables, {rows} rows"
+        )
+        return {'changed_edges': len(changed), 'affected_tables': len(affected), 'rows': rows}
+
+    def rebuild(self):
+        """从 LineageRelation 重新构建整个闭包表"""
+        edges = self._load_edges()
+        adjacency = {}
+        for source_id, target_id in edges:
+            adjacency.setdefault(source_id, set()).add(target_id)
+
+        with transaction.atomic():
+            LineageReachability.objects.all().delete()
+            rows = self._write(set(), compute_reach(adjacency, list(adjacency)), edges)
+        logger.info(f"Reachability index rebuilt: {len(edges)} edges, {rows} rows")
+        return {'edges': len(edges), 'rows': rows}
+
+    def _write(self, replaced_sources, reach, edges):
+        """删除replaced_sources的旧行并写入新的可达集合，返回写入行数"""
+        replaced_sources = list(replaced_sources)
+        rows = [
+            LineageReachability(
+                source_table_id=source_id,
+                target_table_id=target_id,
+                is_direct=(source_id, target_id) in edges
+            )
+            for source_id, targets in reach.items()
+            for target_id in targets
+        ]
+        with transaction.atomic():
+            for start in range(0, len(replaced_sources), QUERY_CHUNK_SIZE):
+                LineageReachability.objects.filter(
+                    source_table_id__in=replaced_sources[start:start + QUERY_CHUNK_SIZE]
+                ).delete()
+            LineageReachability.objects.bulk_create(rows, batch_size=QUERY_CHUNK_SIZE, ignore_conflicts=True)
+        return len(rows)
+
+    def downstream(self, table):
+        """table的全部下游表"""
+        return [
+            row.target_table
+            for row in LineageReachability.objects.filter(source_table=table).select_related('target_table')
+        ]
+
+    def upstream(self, table):
+        """table的全部上游表"""
+        return [
+            row.source_table
+            for row in LineageReachability.objects.filter(target_table=table).select_related('source_table')
+        ]
+
+    def reaches(self, source_table, target_table):
+        """source_table是否（直接或间接）流向target_table"""
+        return LineageReachability.objects.filter(source_table=source_table, target_table=target_table).exists()
@@ -0,0 +1,84 @@
+"""
+仓库定时同步
+定期检查每个启用仓库的远程分支HEAD，与最近一次解析的提交不同时提交增量解析任务；
+GitLab推送Webhook也通过这里提交任务。同一仓库的待执行任务会被合并，连续推送只产生一个任务
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps_git.models import GitRepo
+from apps_git.git_service import GitService
+from .job_queue import LineageJobQueue
+from .lineage_service import LineageService
+
+logger = logging.getLogger(__name__)
+
+
+class RepoSyncScheduler:
+    """按仓库检测HEAD变化并提交增量解析任务"""
+
+    def __init__(self):
+        self.config = getattr(settings, 'REPO_SCHEDULER_CONFIG', {})
+        self.queue = LineageJobQueue()
+        self.lineage_service = LineageService()
+
+    def request_incremental_parse(self, git_repo, head_sha=None, reason=''):
+        """
+        HEAD与最近一次解析的提交不同时提交增量解析任务
+
+        Args:
+            head_sha: 已知的最新提交（如Webhook中的after），为空时查询远程
+            reason: 日志中记录的触发原因
+
+        Returns:
+            提交或合并到的任务；HEAD未变化或仓库从未解析过时返回None
+        """
+        last_job = self.lineage_service.get_last_parsed_job(git_repo)
+        if last_job is None:
+            # 首次解析需要手动发起，避免定时任务自动对所有仓库做全量解析
+            logger.debug(f"Repository {git_repo.name} has never been parsed, skipping")
+            return None
+
+        if head_sha is None:
+            head_sha = GitService(git_repo).get_remote_heads().get(git_repo.branch)
+            if head_sha is None:
+                logger.warning(f"Branch {git_repo.branch} not found on remote of {git_repo.name}")
+                return None
+
+        if head_sha == last_job.commit_sha:
+            return None
+
+        job, created = self.queue.enqueue(git_repo, parse_type='incremental')
+        if created:
+            logger.info(
+                f"Queued incremental parse of {git_repo.name} ({reason}): "
+                f"{last_job.commit_sha[:8]} -> {head_sha[:8]}"
+            )
+        return job
+
+    def due_repositories(self):
+        """启用且距离上次检查超过间隔的仓库"""
+        interval = self.config.get('interval', 300)
+        threshold = timezone.now() - timedelta(seconds=interval)
+        return GitRepo.objects.filter(is_active=True).exclude(last_checked_at__gte=threshold)
+
+    def tick(self):
+        """
+        检查一轮到期的仓库
+
+        Returns:
+            本轮提交（或合并到）的任务数
+        """
+        queued = 0
+        for git_repo in self.due_repositories():
+            try:
+                if self.request_incremental_parse(git_repo, reason='scheduled check'):
+                    queued += 1
+            except Exception as e:
+                logger.error(f"Scheduled check of {git_repo.name} failed: {str(e)}")
+            finally:
+                GitRepo.objects.filter(id=git_repo.id).update(last_checked_at=timezone.now())
+        return queued
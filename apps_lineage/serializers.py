@@ -1,17 +1,18 @@
 from rest_framework import serializers
-from .models import LineageRelation, ColumnLineage, LineageParseJob
-from apps_metadata.serializers import HiveTableSerializer
+from .models import LineageRelation, ColumnLineage, LineageParseJob, LineageSnapshot, LineageTableMetrics
+from apps_core.serializers import SparseFieldsMixin
+from apps_metadata.serializers import HiveTableSerializer, HiveTableSummarySerializer
 
 
 class ColumnLineageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ColumnLineage
-        fields = ['id', 'source_column', 'target_column', 'transformation']
+        fields = ['id', 'source_column', 'target_column', 'transformation', 'transform_type']
 
 
-class LineageRelationSerializer(serializers.ModelSerializer):
-    source_table = HiveTableSerializer(read_only=True)
-    target_table = HiveTableSerializer(read_only=True)
+class LineageRelationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    source_table = HiveTableSummarySerializer(read_only=True)
+    target_table = HiveTableSummarySerializer(read_only=True)
     column_lineages = ColumnLineageSerializer(many=True, read_only=True)
 
     class Meta:
@@ -20,6 +21,15 @@ class LineageRelationSerializer(serializers.ModelSerializer):
             'id', 'source_table', 'target_table', 'sql_script_path', 
             'relation_type', 'process_id', 'created_at', 'column_lineages'
         ]
+        default_fields = [
+            'id', 'source_table', 'target_table', 'sql_script_path', 'relation_type', 'process_id', 'created_at'
+        ]
+        # expand=source_table,target_table 输出完整的表信息（含字段），expand=column_lineages 输出字段级血缘
+        expandable_fields = {
+            'source_table': (HiveTableSerializer, {}),
+            'target_table': (HiveTableSerializer, {}),
+            'column_lineages': (ColumnLineageSerializer, {'many': True}),
+        }
 
 
 class LineageParseJobSerializer(serializers.ModelSerializer):
@@ -29,12 +39,28 @@ class LineageParseJobSerializer(serializers.ModelSerializer):
     class Meta:
         model = LineageParseJob
         fields = [
-            'id', 'git_repo', 'git_repo_name', 'status', 'total_files', 
+            'id', 'git_repo', 'git_repo_name', 'status', 'parse_type', 'total_files', 
             'processed_files', 'failed_files', 'progress_percentage',
-            'error_message', 'started_at', 'completed_at', 'created_at'
+            'error_message', 'commit_sha', 'ref', 'attempts', 'cancel_requested',
+            'started_at', 'completed_at', 'created_at'
         ]
 
 
+class LineageSnapshotSerializer(serializers.ModelSerializer):
+    git_repo_name = serializers.CharField(source='git_repo.name', read_only=True)
+    status = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LineageSnapshot
+        fields = [
+            'id', 'git_repo', 'git_repo_name', 'commit_sha', 'ref', 'job', 'status',
+            'total_files', 'reused_files', 'created_at'
+        ]
+
+    def get_status(self, obj):
+        return obj.job.status if obj.job else 'completed'
+
+
 class ParseSQLSerializer(serializers.Serializer):
     sql_text = serializers.CharField(max_length=10000)
     file_path = serializers.CharField(max_length=500, required=False, default="", allow_blank=True)
@@ -44,6 +70,23 @@ class ImpactAnalysisSerializer(serializers.Serializer):
     table_name = serializers.CharField(max_length=255)
 
 
+class BatchImpactSerializer(serializers.Serializer):
+    tables = serializers.ListField(
+        child=serializers.CharField(max_length=255), allow_empty=False
+    )
+
+
 class LineageGraphSerializer(serializers.Serializer):
     nodes = serializers.ListField()
-    edges = serializers.ListField()
\ No newline at end of file
+    edges = serializers.ListField()
+
+
+class LineageTableMetricsSerializer(serializers.ModelSerializer):
+    table = HiveTableSummarySerializer(read_only=True)
+
+    class Meta:
+        model = LineageTableMetrics
+        fields = [
+            'table', 'downstream_count', 'upstream_count', 'fan_in', 'fan_out',
+            'upstream_depth', 'is_orphan', 'is_dead_end', 'updated_at'
+        ]
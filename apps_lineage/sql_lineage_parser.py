@@ -0,0 +1,486 @@
+"""
+本地SQL血缘快速解析器
+基于sqlparse词法分析处理常见的Hive INSERT…SELECT / CTAS 语句，
+输出与SQLFlow相同结构的结果；无法确定解析正确时返回None，由调用方回退到SQLFlow
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import sqlparse
+from sqlparse import tokens as T
+
+logger = logging.getLogger(__name__)
+
+
+# 不产生血缘、可以安全跳过的语句
+IGNORABLE_STATEMENTS = {'SET', 'USE', 'ADD', 'DROP', 'ALTER', 'MSCK', 'ANALYZE', 'DESCRIBE', 'SHOW', 'RESET'}
+
+# FROM子句之后的顶层子句关键字
+CLAUSE_KEYWORDS = {
+    'WHERE', 'GROUP BY', 'GROUP', 'ORDER BY', 'ORDER', 'HAVING', 'LIMIT',
+    'DISTRIBUTE BY', 'DISTRIBUTE', 'SORT BY', 'SORT', 'CLUSTER BY', 'CLUSTER',
+}
+
+# 表连接关键字（sqlparse会将"LEFT JOIN"等合并为一个token）
+JOIN_KEYWORDS = {
+    'JOIN', 'INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN', 'FULL JOIN', 'CROSS JOIN',
+    'LEFT OUTER JOIN', 'RIGHT OUTER JOIN', 'FULL OUTER JOIN',
+    'LEFT SEMI JOIN', 'LEFT ANTI JOIN',
+}
+
+# 字段表达式中允许出现的关键字，其余关键字可能是被误识别的字段名
+EXPRESSION_KEYWORDS = {
+    'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'AND', 'OR', 'NOT', 'NULL', 'IS', 'IN',
+    'AS', 'DISTINCT', 'TRUE', 'FALSE', 'BETWEEN', 'LIKE',
+}
+
+# 出现即认为语句过于复杂，交给SQLFlow处理
+UNSUPPORTED_KEYWORDS = {
+    'UNION', 'UNION ALL', 'INTERSECT', 'EXCEPT', 'MINUS', 'LATERAL', 'LATERAL VIEW',
+    'OVER', 'WITH', 'VALUES', 'TRANSFORM', 'MAP', 'REDUCE',
+}
+
+
+class _Token:
+    """精简后的词法单元"""
+
+    __slots__ = ('ttype', 'value', 'upper')
+
+    def __init__(self, ttype, value):
+        self.ttype = ttype
+        self.value = value
+        self.upper = ' '.join(value.upper().split())
+
+    def is_keyword(self, *words):
+        return self.ttype in T.Keyword and self.upper in words
+
+    def is_punct(self, value):
+        return self.ttype in T.Punctuation and self.value == value
+
+    @property
+    def is_name(self):
+        return self.ttype in T.Name and self.ttype not in T.Name.Builtin
+
+
+class UnsupportedSQL(Exception):
+    """语句超出本地解析器的处理范围"""
+
+
+class LocalLineageParser:
+    """sqlparse实现的轻量血缘解析器，只处理能够完全确定字段映射的语句"""
+
+    def __init__(self, default_database: Optional[str] = None):
+        self.default_database = default_database
+        self._current_database = default_database
+
+    def parse(self, sql_text: str) -> Optional[Dict]:
+        """
+        解析SQL脚本
+
+        Args:
+            sql_text: SQL脚本，可以包含多条语句
+
+        Returns:
+            与SQLFlow相同结构的字典（{'sqlflow': {'relationships': [...]}}），
+            任何一条语句无法确定解析时返回None
+        """
+        if not sql_text or not sql_text.strip():
+            return None
+
+        self._current_database = self.default_database
+        relationships = []
+        lineage_statements = 0
+
+        try:
+            cleaned = sqlparse.format(sql_text, strip_comments=True)
+            for index, statement in enumerate(sqlparse.split(cleaned)):
+                tokens = self._tokenize(statement)
+                if not tokens:
+                    continue
+                statement_relationships = self._parse_statement(tokens, index)
+                if statement_relationships is not None:
+                    lineage_statements += 1
+                    relationships.extend(statement_relationships)
+        except UnsupportedSQL as e:
+            logger.debug(f"Local lineage parser fallback: {str(e)}")
+            return None
+        except Exception as e:
+            logger.warning(f"Local lineage parser failed unexpectedly: {str(e)}")
+            return None
+
+        if not lineage_statements:
+            return None
+
+        for i, relationship in enumerate(relationships, 1):
+            relationship['id'] = f"local_{i}"
+
+        logger.info(f"Local parser resolved {len(relationships)} relationships from {lineage_statements} statements")
+        return {
+            'parser': 'local',
+            'sqlflow': {
+                'relationships': relationships
+            }
+        }
+
+    def _tokenize(self, statement: str) -> List[_Token]:
+        parsed = sqlparse.parse(statement)
+        if not parsed:
+            return []
+        tokens = [
+            _Token(token.ttype, token.value)
+            for token in parsed[0].flatten()
+            if not token.is_whitespace and token.ttype not in T.Comment
+        ]
+        # 去掉语句末尾的分号
+        while tokens and tokens[-1].is_punct(';'):
+            tokens.pop()
+        return tokens
+
+    def _parse_statement(self, tokens: List[_Token], index: int) -> Optional[List[Dict]]:
+        """解析单条语句，返回None表示该语句不产生血缘（可忽略）"""
+        head = tokens[0].upper
+
+        if head in IGNORABLE_STATEMENTS:
+            if head == 'USE' and len(tokens) >= 2:
+                self._current_database = self._clean(tokens[1].value)
+            return None
+
+        if head == 'CREATE':
+            return self._parse_create(tokens, index)
+
+        if head == 'INSERT':
+            return self._parse_insert(tokens, index)
+
+        raise UnsupportedSQL(f"unsupported statement type: {head}")
+
+    def _parse_create(self, tokens: List[_Token], index: int) -> Optional[List[Dict]]:
+        words = [t.upper for t in tokens[:4]]
+        if 'FUNCTION' in words or 'DATABASE' in words or 'SCHEMA' in words:
+            return None
+        if 'VIEW' in words:
+            raise UnsupportedSQL("CREATE VIEW")
+
+        select_pos = self._find_top_level(tokens, lambda t: t.ttype in T.DML and t.upper == 'SELECT')
+        if select_pos is None:
+            # 纯DDL，不产生血缘
+            return None
+        if select_pos == 0 or not tokens[select_pos - 1].is_keyword('AS'):
+            raise UnsupportedSQL("CREATE statement with unexpected SELECT")
+
+        pos = self._skip_keywords(tokens, 1, {'TEMPORARY', 'EXTERNAL', 'TRANSACTIONAL'})
+        if pos >= len(tokens) or not tokens[pos].is_keyword('TABLE'):
+            raise UnsupportedSQL("CREATE without TABLE")
+        pos = self._skip_keywords(tokens, pos + 1, {'IF NOT EXISTS', 'IF', 'NOT', 'EXISTS'})
+        target, _ = self._read_qualified_name(tokens, pos)
+        target = self._qualify_table(target)
+
+        return self._parse_select(tokens[select_pos:], target, 'create_table', index)
+
+    def _parse_insert(self, tokens: List[_Token], index: int) -> List[Dict]:
+        pos = 1
+        if pos < len(tokens) and tokens[pos].upper in ('OVERWRITE', 'INTO'):
+            pos += 1
+        else:
+            raise UnsupportedSQL("INSERT without OVERWRITE/INTO")
+        if pos < len(tokens) and tokens[pos].is_keyword('TABLE'):
+            pos += 1
+
+        target, pos = self._read_qualified_name(tokens, pos)
+        target = self._qualify_table(target)
+
+        if pos < len(tokens) and tokens[pos].is_keyword('PARTITION'):
+            end = self._matching_paren(tokens, pos + 1)
+            partition_tokens = tokens[pos + 2:end]
+            # 动态分区的字段由SELECT末尾的列决定，交给SQLFlow
+            for part in self._split_top_level(partition_tokens, ','):
+                if not any(t.ttype in T.Operator.Comparison and t.value == '=' for t in part):
+                    raise UnsupportedSQL("dynamic partition insert")
+            pos = end + 1
+
+        pos = self._skip_keywords(tokens, pos, {'IF NOT EXISTS', 'IF', 'NOT', 'EXISTS'})
+        if pos < len(tokens) and tokens[pos].is_punct('('):
+            # 显式列出目标字段时按位置对应，需要SQLFlow按目标表结构解析
+            raise UnsupportedSQL("INSERT with column list")
+        if pos >= len(tokens) or not (tokens[pos].ttype in T.DML and tokens[pos].upper == 'SELECT'):
+            raise UnsupportedSQL("INSERT without a direct SELECT")
+
+        return self._parse_select(tokens[pos:], target, 'insert', index)
+
+    def _parse_select(self, tokens: List[_Token], target: str, effect_type: str, index: int) -> List[Dict]:
+        for token in tokens[1:]:
+            if token.ttype in T.DML and token.upper == 'SELECT':
+                raise UnsupportedSQL("subquery")
+            if token.ttype in T.Keyword and token.upper in UNSUPPORTED_KEYWORDS:
+                raise UnsupportedSQL(token.upper)
+
+        from_pos = self._find_top_level(tokens, lambda t: t.is_keyword('FROM'))
+        if from_pos is None:
+            raise UnsupportedSQL("SELECT without FROM")
+
+        select_tokens = tokens[1:from_pos]
+        if select_tokens and select_tokens[0].upper in ('DISTINCT', 'ALL'):
+            select_tokens = select_tokens[1:]
+
+        clause_end = self._find_top_level(
+            tokens, lambda t: t.ttype in T.Keyword and t.upper in CLAUSE_KEYWORDS, start=from_pos + 1
+        )
+        from_tokens = tokens[from_pos + 1:clause_end]
+        tables = self._parse_from(from_tokens)
+
+        items = [self._split_alias(item) for item in self._split_top_level(select_tokens, ',')]
+        # INSERT按位置写入目标表，SELECT中没有任何别名时输出字段名很可能与目标表字段不对应
+        if effect_type == 'insert' and not any(alias for _, alias in items):
+            raise UnsupportedSQL("INSERT select without aliases")
+
+        relationships = []
+        target_columns = set()
+        for expression, alias in items:
+            if not expression:
+                raise UnsupportedSQL("empty select item")
+            references = self._column_references(expression)
+
+            if alias:
+                target_column = alias
+            elif len(references) == 1 and all(t.is_name or t.is_punct('.') for t in expression):
+                target_column = references[0][-1]
+            else:
+                raise UnsupportedSQL("select expression without alias")
+
+            # 如 SELECT a.id, b.id：两列输出同名，按名称无法区分写入的是哪一列
+            if target_column.lower() in target_columns:
+                raise UnsupportedSQL(f"duplicate output column: {target_column}")
+            target_columns.add(target_column.lower())
+
+            sources = []
+            seen = set()
+            for reference in references:
+                source = self._resolve_column(reference, tables)
+                if source not in seen:
+                    seen.add(source)
+                    sources.append({
+                        'column': source[1],
+                        'parentName': source[0],
+                        'transforms': [{'code': self._expression_text(expression)}]
+                    })
+
+            if not sources:
+                # 常量列，与SQLFlow（showConstantTable=False）一致不输出
+                continue
+
+            relationships.append({
+                'type': 'fdd',
+                'effectType': effect_type,
+                'target': {'column': target_column, 'parentName': target},
+                'sources': sources,
+                'processId': f"local_process_{index}",
+                'processType': 'local',
+            })
+
+        return relationships
+
+    def _parse_from(self, tokens: List[_Token]) -> Dict[str, str]:
+        """解析FROM子句，返回 别名/表名 -> 完整表名 的映射"""
+        tables = {}
+        full_names = []
+        pos = 0
+        expect_table = True
+
+        while pos < len(tokens):
+            token = tokens[pos]
+
+            if token.is_punct('(') and expect_table:
+                raise UnsupportedSQL("derived table in FROM")
+
+            if expect_table:
+                name, pos = self._read_qualified_name(tokens, pos)
+                full_name = self._qualify_table(name)
+                alias = None
+                if pos < len(tokens) and tokens[pos].is_keyword('AS'):
+                    pos += 1
+                if pos < len(tokens) and tokens[pos].is_name:
+                    alias = self._clean(tokens[pos].value)
+                    pos += 1
+
+                full_names.append(full_name)
+                short_name = full_name.split('.', 1)[1]
+                for key in filter(None, (alias, full_name, short_name)):
+                    if key in tables and tables[key] != full_name:
+                        raise UnsupportedSQL(f"ambiguous table reference: {key}")
+                    tables[key] = full_name
+                expect_table = False
+                continue
+
+            if token.is_punct(',') or (token.ttype in T.Keyword and token.upper in JOIN_KEYWORDS):
+                expect_table = True
+                pos += 1
+                continue
+
+            if token.is_keyword('ON'):
+                # 跳过连接条件，直到下一个顶层JOIN或逗号
+                pos += 1
+                depth = 0
+                while pos < len(tokens):
+                    current = tokens[pos]
+                    if current.is_punct('('):
+                        depth += 1
+                    elif current.is_punct(')'):
+                        depth -= 1
+                    elif depth == 0 and (current.is_punct(',') or
+                                         (current.ttype in T.Keyword and current.upper in JOIN_KEYWORDS)):
+                        break
+                    pos += 1
+                continue
+
+            raise UnsupportedSQL(f"unexpected token in FROM: {token.value}")
+
+        if not full_names:
+            raise UnsupportedSQL("no source tables")
+
+        tables['*'] = full_names[0] if len(set(full_names)) == 1 else None
+        return tables
+
+    def _split_alias(self, item: List[_Token]) -> Tuple[List[_Token], Optional[str]]:
+        if len(item) >= 3 and item[-2].is_keyword('AS') and item[-1].is_name:
+            return item[:-2], self._clean(item[-1].value)
+        if len(item) >= 2 and item[-1].is_name:
+            previous = item[-2]
+            if (previous.is_name or previous.is_punct(')') or previous.ttype in T.Literal or
+                    previous.is_keyword('END')):
+                return item[:-1], self._clean(item[-1].value)
+        return item, None
+
+    def _expression_text(self, tokens: List[_Token]) -> str:
+        """将表达式的词法单元还原为文本（词法分析时已去掉空白）"""
+        text = ''
+        previous = None
+        for token in tokens:
+            if previous is not None and not (
+                    token.value in ('.', ',', ')') or previous.value in ('.', '(') or
+                    (token.value == '(' and previous.ttype not in T.Operator and previous.upper not in EXPRESSION_KEYWORDS)):
+                text += ' '
+            text += token.value
+            previous = token
+        return text
+
+    def _column_references(self, tokens: List[_Token]) -> List[Tuple[str, ...]]:
+        """提取表达式中的字段引用，如 (alias, column)"""
+        if any(t.ttype in T.Wildcard for t in tokens):
+            raise UnsupportedSQL("wildcard select")
+
+        for pos, token in enumerate(tokens):
+            after_as = pos > 0 and tokens[pos - 1].is_keyword('AS')
+            before_call = pos + 1 < len(tokens) and tokens[pos + 1].is_punct('(')
+            after_dot = pos > 0 and tokens[pos - 1].is_punct('.')
+            if token.ttype in T.Keyword and token.upper not in EXPRESSION_KEYWORDS and not after_dot:
+                raise UnsupportedSQL(f"keyword in expression: {token.value}")
+            if token.ttype in T.Name.Builtin and not (after_as or before_call):
+                raise UnsupportedSQL(f"builtin name in expression: {token.value}")
+
+        references = []
+        in_condition = False
+        pos = 0
+        while pos < len(tokens):
+            token = tokens[pos]
+            # CASE WHEN 条件中的字段属于间接血缘（SQLFlow indirect=False 时不输出）
+            if token.is_keyword('WHEN'):
+                in_condition = True
+            elif token.is_keyword('THEN'):
+                in_condition = False
+            if in_condition or not token.is_name or (pos > 0 and tokens[pos - 1].is_keyword('AS')):
+                pos += 1
+                continue
+
+            parts = [self._clean(token.value)]
+            pos += 1
+            while (pos + 1 < len(tokens) and tokens[pos].is_punct('.') and
+                   (tokens[pos + 1].is_name or tokens[pos + 1].ttype in T.Keyword)):
+                parts.append(self._clean(tokens[pos + 1].value))
+                pos += 2
+
+            # 函数调用（包括 udf_db.func(...)）
+            if pos < len(tokens) and tokens[pos].is_punct('('):
+                continue
+            if len(parts) > 3:
+                raise UnsupportedSQL("unexpected column reference")
+            references.append(tuple(parts))
+
+        return references
+
+    def _resolve_column(self, reference: Tuple[str, ...], tables: Dict[str, str]) -> Tuple[str, str]:
+        if len(reference) == 1:
+            table = tables.get('*')
+            if not table:
+                raise UnsupportedSQL(f"unqualified column with multiple tables: {reference[0]}")
+            return table, reference[0]
+
+        qualifier = '.'.join(reference[:-1])
+        table = tables.get(qualifier)
+        if not table:
+            raise UnsupportedSQL(f"unknown table qualifier: {qualifier}")
+        return table, reference[-1]
+
+    def _read_qualified_name(self, tokens: List[_Token], pos: int) -> Tuple[str, int]:
+        if pos >= len(tokens) or not tokens[pos].is_name:
+            raise UnsupportedSQL("expected table name")
+        parts = [self._clean(tokens[pos].value)]
+        pos += 1
+        while pos + 1 < len(tokens) and tokens[pos].is_punct('.') and tokens[pos + 1].is_name:
+            parts.append(self._clean(tokens[pos + 1].value))
+            pos += 2
+        return '.'.join(parts), pos
+
+    def _qualify_table(self, name: str) -> str:
+        if '.' in name:
+            if name.count('.') > 1:
+                raise UnsupportedSQL(f"unexpected table name: {name}")
+            return name
+        if not self._current_database:
+            raise UnsupportedSQL(f"table without database: {name}")
+        return f"{self._current_database}.{name}"
+
+    def _find_top_level(self, tokens: List[_Token], predicate, start: int = 0) -> Optional[int]:
+        depth = 0
+        for pos in range(start, len(tokens)):
+            token = tokens[pos]
+            if token.is_punct('('):
+                depth += 1
+            elif token.is_punct(')'):
+                depth -= 1
+            elif depth == 0 and predicate(token):
+                return pos
+        return None
+
+    def _split_top_level(self, tokens: List[_Token], separator: str) -> List[List[_Token]]:
+        parts = [[]]
+        depth = 0
+        for token in tokens:
+            if token.is_punct('('):
+                depth += 1
+            elif token.is_punct(')'):
+                depth -= 1
+            elif depth == 0 and token.is_punct(separator):
+                parts.append([])
+                continue
+            parts[-1].append(token)
+        return parts
+
+    def _matching_paren(self, tokens: List[_Token], pos: int) -> int:
+        if pos >= len(tokens) or not tokens[pos].is_punct('('):
+            raise UnsupportedSQL("expected '('")
+        depth = 0
+        for current in range(pos, len(tokens)):
+            if tokens[current].is_punct('('):
+                depth += 1
+            elif tokens[current].is_punct(')'):
+                depth -= 1
+                if depth == 0:
+                    return current
+        raise UnsupportedSQL("unbalanced parentheses")
+
+    def _skip_keywords(self, tokens: List[_Token], pos: int, words) -> int:
+        while pos < len(tokens) and tokens[pos].ttype in T.Keyword and tokens[pos].upper in words:
+            pos += 1
+        return pos
+
+    def _clean(self, name: str) -> str:
+        return name.strip().strip('`"\'[]').strip()
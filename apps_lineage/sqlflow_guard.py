@@ -0,0 +1,269 @@
+"""
+SQLFlow 调用保护
+熔断器（含半开探测）、带抖动的有限重试与重试预算、并发限制与排队背压，
+在SQLFlow JVM停顿或宕机时快速失败，避免所有请求都耗尽超时时间
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class SQLFlowUnavailable(Exception):
+    """SQLFlow服务当前不可用（熔断或背压拒绝），调用方应快速失败"""
+
+
+class CircuitBreaker:
+    """
+    三态熔断器：closed -> open -> half_open -> closed/open
+
+    连续失败达到阈值后进入open状态，在recovery_timeout内直接拒绝请求；
+    超时后进入half_open，只放行有限个探测请求，探测成功则关闭熔断，失败则重新打开
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info("SQLFlow circuit breaker half-open, probing service")
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("SQLFlow circuit breaker closed, service recovered")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"SQLFlow circuit breaker opened after {self._consecutive_failures} consecutive failures"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def release_probe(self):
+        """探测请求未真正发出（如被并发限制拒绝）时归还探测名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def retry_after(self) -> float:
+        """熔断打开时距离下一次探测的剩余秒数"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+
+class RetryBudget:
+    """
+    重试预算：滑动窗口内重试次数不超过请求数的一定比例（至少保留min_retries次），
+    防止服务异常时重试放大流量
+    """
+
+    def __init__(self, ratio=0.2, min_retries=3, window=60):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._requests = deque()
+        self._retries = deque()
+
+    def _trim(self, now):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_acquire_retry(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            allowed = max(self.min_retries, int(len(self._requests) * self.ratio))
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class ConcurrencyLimiter:
+    """并发限制器：最多max_concurrency个请求同时访问SQLFlow，排队数超过max_queue时直接拒绝"""
+
+    def __init__(self, max_concurrency=4, max_queue=16, queue_timeout=10):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+    @contextmanager
+    def acquire(self):
+        with self._condition:
+            if self._active >= self.max_concurrency:
+                if self._waiting >= self.max_queue:
+                    raise SQLFlowUnavailable("血缘解析服务繁忙，排队请求过多，请稍后重试")
+                self._waiting += 1
+                try:
+                    deadline = time.monotonic() + self.queue_timeout
+                    while self._active >= self.max_concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise SQLFlowUnavailable("血缘解析服务繁忙，等待超时，请稍后重试")
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                'active': self._active,
+                'waiting': self._waiting,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+            }
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0) -> float:
+    """指数退避 + 全抖动（full jitter）"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class SQLFlowGuard:
+    """组合熔断器、重试预算和并发限制，进程内所有LineageService实例共享"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.max_retries = config.get('max_retries', 2)
+        self.backoff_base = config.get('backoff_base', 0.5)
+        self.backoff_cap = config.get('backoff_cap', 8.0)
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get('failure_threshold', 5),
+            recovery_timeout=config.get('recovery_timeout', 30),
+            half_open_max_calls=config.get('half_open_max_calls', 1),
+        )
+        self.retry_budget = RetryBudget(
+            ratio=config.get('retry_budget_ratio', 0.2),
+            min_retries=config.get('retry_budget_min', 3),
+        )
+        self.limiter = ConcurrencyLimiter(
+            max_concurrency=config.get('max_concurrency', 4),
+            max_queue=config.get('max_queue', 16),
+            queue_timeout=config.get('queue_timeout', 10),
+        )
+
+    def call(self, func, retryable_exceptions=()):
+        """
+        在保护下执行func
+
+        Args:
+            func: 无参调用，返回SQLFlow响应
+            retryable_exceptions: 视为服务故障、可以重试的异常类型
+
+        Raises:
+            SQLFlowUnavailable: 熔断打开或排队背压拒绝
+        """
+        self.retry_budget.record_request()
+        attempt = 0
+
+        while True:
+            if not self.breaker.allow_request():
+                raise SQLFlowUnavailable(
+                    f"血缘解析服务暂时不可用（熔断中），请在 {int(self.breaker.retry_after()) + 1} 秒后重试"
+                )
+
+            try:
+                with self.limiter.acquire():
+                    result = func()
+            except SQLFlowUnavailable:
+                self.breaker.release_probe()
+                raise
+            except retryable_exceptions as e:
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or not self.retry_budget.try_acquire_retry():
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                attempt += 1
+                logger.warning(f"SQLFlow call failed ({str(e)}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except Exception:
+                # 服务有响应（如4xx、响应格式错误），说明服务本身存活
+                self.breaker.record_success()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'circuit_state': self.breaker.state,
+            'retry_after': round(self.breaker.retry_after(), 1),
+            'limiter': self.limiter.snapshot(),
+        }
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_sqlflow_guard(config: Dict[str, Any]) -> SQLFlowGuard:
+    """获取进程级共享的SQLFlowGuard实例"""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = SQLFlowGuard(config.get('resilience', {}))
+    return _guard
@@ -1,3 +1,1300 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import random
+import sys
+import unittest
+from datetime import timedelta
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps_git.models import GitRepo
+from apps_metadata.models import HiveTable
+from . import column_impact, lineage_paths
+from .column_impact import ColumnLineageGraph, classify_transform, get_column_graph
+from .graph_analytics import LineageGraphAnalytics, strongly_connected_labels
+from .graph_version import bump_graph_version, get_graph_version
+from .job_progress import JobProgressReporter
+from .job_queue import LineageJobQueue, ParseJobInterrupted
+from .lineage_differ import LineageDiffer
+from .lineage_export import LineageExporter
+from .lineage_impact import BatchImpactAnalyzer
+from .lineage_neighborhood import GraphCursorExpired, LineageNeighborhood
+from .lineage_paths import LineageGraph, get_lineage_graph
+from .lineage_service import LineageService
+from .lineage_snapshot import LineageSnapshotBuilder, compare_snapshots
+from .management.commands import run_lineage_worker
+from .models import (
+    ColumnLineage,
+    LineageBlobResult,
+    LineageParseFileResult,
+    LineageParseJob,
+    LineageReachability,
+    LineageRelation,
+    LineageSourceFile,
+    LineageTableMetrics,
+)
+from .query_cache import LineageQueryCache
+from .reachability import ReachabilityIndex, compute_reach
+from .repo_scheduler import RepoSyncScheduler
+from .sql_lineage_parser import LocalLineageParser
+from .sqlflow_guard import CircuitBreaker, ConcurrencyLimiter, RetryBudget, SQLFlowGuard, SQLFlowUnavailable
+
+
+def column_mappings(result):
+    """本地解析结果中的 (目标表, 目标字段, [(源表, 源字段)])"""
+    return [
+        (
+            relationship['target']['parentName'],
+            relationship['target']['column'],
+            [(source['parentName'], source['column']) for source in relationship['sources']]
+        )
+        for relationship in result['sqlflow']['relationships']
+    ]
+
+
+
+class LocalLineageParserTests(SimpleTestCase):
+
+    def parse(self, sql):
+        return LocalLineageParser(default_database='dw').parse(sql)
+
+    def test_insert_select_with_aliases(self):
+        result = self.parse(
+            "INSERT OVERWRITE TABLE dw.user_stats "
+            "SELECT u.id AS user_id, u.name, upper(u.city) AS city FROM dw.users u"
+        )
+        self.assertEqual(column_mappings(result), [
+            ('dw.user_stats', 'user_id', [('dw.users', 'id')]),
+            ('dw.user_stats', 'name', [('dw.users', 'name')]),
+            ('dw.user_stats', 'city', [('dw.users', 'city')]),
+        ])
+
+    def test_ctas_with_join_and_use(self):
+        result = self.parse(
+            "USE ods;\n"
+            "CREATE TABLE dw.orders_wide AS "
+            "SELECT o.id AS order_id, c.name AS customer_name "
+            "FROM orders o LEFT JOIN customers c ON o.customer_id = c.id;"
+        )
+        self.assertEqual(column_mappings(result), [
+            ('dw.orders_wide', 'order_id', [('ods.orders', 'id')]),
+            ('dw.orders_wide', 'customer_name', [('ods.customers', 'name')]),
+        ])
+
+    def test_static_partition_and_constant_column(self):
+        result = self.parse(
+            "INSERT OVERWRITE TABLE dw.t PARTITION (dt='2024-01-01') "
+            "SELECT s.id AS id, 1 AS flag FROM dw.s s"
+        )
+        self.assertEqual(column_mappings(result), [('dw.t', 'id', [('dw.s', 'id')])])
+
+    def test_ddl_only_script_falls_back(self):
+        self.assertIsNone(self.parse("CREATE TABLE dw.t (id INT); DROP TABLE dw.s;"))
+
+    def test_duplicate_output_column_falls_back(self):
+        # a.id和b.id输出字段同名，按名称会都映射到t.id并丢失第二列
+        self.assertIsNone(self.parse(
+            "INSERT OVERWRITE TABLE dw.t SELECT a.id, b.id AS id FROM dw.a a JOIN dw.b b ON a.k = b.k"
+        ))
+        self.assertIsNone(self.parse(
+            "CREATE TABLE dw.t AS SELECT a.id AS id, b.id AS ID FROM dw.a a JOIN dw.b b ON a.k = b.k"
+        ))
+
+    def test_insert_without_aliases_falls_back(self):
+        self.assertIsNone(self.parse(
+            "INSERT OVERWRITE TABLE dw.t SELECT a.id, b.id FROM dw.a a JOIN dw.b b ON a.k = b.k"
+        ))
+        self.assertIsNone(self.parse("INSERT INTO TABLE dw.t SELECT s.id, s.name FROM dw.s s"))
+
+    def test_insert_with_column_list_falls_back(self):
+        self.assertIsNone(self.parse("INSERT INTO dw.t (x, y) SELECT s.id AS x, s.name AS y FROM dw.s s"))
+
+    def test_unsupported_constructs_fall_back(self):
+        for sql in (
+            "INSERT OVERWRITE TABLE dw.t SELECT s.id AS id FROM (SELECT id FROM dw.s) s",
+            "INSERT OVERWRITE TABLE dw.t SELECT s.id AS id FROM dw.s s UNION ALL SELECT r.id AS id FROM dw.r r",
+            "INSERT OVERWRITE TABLE dw.t PARTITION (dt) SELECT s.id AS id, s.dt AS dt FROM dw.s s",
+            "INSERT OVERWRITE TABLE dw.t SELECT * FROM dw.s",
+            "INSERT OVERWRITE TABLE dw.t SELECT id AS id FROM dw.a a JOIN dw.b b ON a.k = b.k",
+            "INSERT OVERWRITE TABLE dw.t SELECT s.id + 1 FROM dw.s s",
+            "UPDATE dw.t SET id = 1",
+        ):
+            with self.subTest(sql=sql):
+                self.assertIsNone(self.parse(sql))
+
+    def test_transform_expressions_are_recorded(self):
+        result = self.parse(
+            "INSERT INTO TABLE dw.t SELECT u.id AS id, cast(u.age AS bigint) AS age, u.a + u.b AS total FROM dw.users u"
+        )
+        transforms = [
+            [source['transforms'][0]['code'] for source in relationship['sources']]
+            for relationship in result['sqlflow']['relationships']
+        ]
+        self.assertEqual(transforms, [['u.id'], ['cast(u.age AS bigint)'], ['u.a + u.b', 'u.a + u.b']])
+
+
+class FakeClock:
+    """替换 time.monotonic，由测试推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SQLFlowGuardTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('apps_lineage.sqlflow_guard.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_breaker_opens_after_threshold_and_probes_when_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30, half_open_max_calls=1)
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.retry_after(), 30)
+
+        self.clock.now += 30
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        # 半开状态只放行一个探测请求
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_probe_reopens_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10)
+        breaker.record_failure()
+        self.clock.now += 10
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.retry_after(), 10)
+
+    def test_released_probe_can_be_retried(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10)
+        breaker.record_failure()
+        self.clock.now += 10
+        self.assertTrue(breaker.allow_request())
+        breaker.release_probe()
+        self.assertTrue(breaker.allow_request())
+
+    def test_retry_budget_limits_retries_within_window(self):
+        budget = RetryBudget(ratio=0.5, min_retries=1, window=60)
+        for _ in range(4):
+            budget.record_request()
+        self.assertTrue(budget.try_acquire_retry())
+        self.assertTrue(budget.try_acquire_retry())
+        self.assertFalse(budget.try_acquire_retry())
+
+        # 窗口过期后重新按最小重试次数计算
+        self.clock.now += 61
+        self.assertTrue(budget.try_acquire_retry())
+        self.assertFalse(budget.try_acquire_retry())
+
+    def test_limiter_rejects_when_queue_is_full(self):
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=0, queue_timeout=1)
+        with limiter.acquire():
+            with self.assertRaises(SQLFlowUnavailable):
+                with limiter.acquire():
+                    pass
+        with limiter.acquire():
+            self.assertEqual(limiter.snapshot()['active'], 1)
+
+    def test_guard_retries_service_failures_then_fails_fast(self):
+        guard = SQLFlowGuard({'max_retries': 1, 'failure_threshold': 2, 'recovery_timeout': 30})
+        calls = []
+
+        def failing():
+            calls.append(1)
+            raise ConnectionError('connection refused')
+
+        with mock.patch('apps_lineage.sqlflow_guard.time.sleep'):
+            with self.assertRaises(ConnectionError):
+                guard.call(failing, retryable_exceptions=(ConnectionError,))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(guard.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(SQLFlowUnavailable):
+            guard.call(failing, retryable_exceptions=(ConnectionError,))
+        self.assertEqual(len(calls), 2)
+
+    def test_guard_treats_other_errors_as_service_alive(self):
+        guard = SQLFlowGuard({'failure_threshold': 1})
+
+        def bad_request():
+            raise ValueError('invalid response')
+
+        with self.assertRaises(ValueError):
+            guard.call(bad_request, retryable_exceptions=(ConnectionError,))
+        self.assertEqual(guard.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(guard.call(lambda: 'ok'), 'ok')
+
+
+def create_repo(name):
+    user, _ = User.objects.get_or_create(username='lineage')
+    return GitRepo.objects.create(user=user, name=name, repo_url=f'https://git.example.com/dw/{name}.git')
+
+
+class LineageJobQueueTests(TestCase):
+
+    def setUp(self):
+        self.queue = LineageJobQueue(lease_seconds=60)
+        self.repo = create_repo('repo')
+
+    def test_enqueue_reuses_pending_job(self):
+        job, created = self.queue.enqueue(self.repo, 'full')
+        self.assertTrue(created)
+        self.assertEqual(self.queue.enqueue(self.repo, 'full'), (job, False))
+        self.assertTrue(self.queue.enqueue(self.repo, 'incremental')[1])
+
+    def test_claim_runs_one_job_per_repository(self):
+        first, _ = self.queue.enqueue(self.repo, 'full')
+        self.queue.enqueue(self.repo, 'incremental')
+        other, _ = self.queue.enqueue(create_repo('other'), 'full')
+
+        job = self.queue.claim('worker-1')
+        self.assertEqual(job.id, first.id)
+        self.assertEqual((job.status, job.lease_owner, job.attempts), ('running', 'worker-1', 1))
+        # 同一仓库已有运行中的任务，只能领取其他仓库的任务
+        self.assertEqual(self.queue.claim('worker-2').id, other.id)
+        self.assertIsNone(self.queue.claim('worker-3'))
+
+    def test_expired_lease_is_reclaimed(self):
+        self.queue.enqueue(self.repo, 'full')
+        job = self.queue.claim('worker-1')
+        LineageParseJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        reclaimed = self.queue.claim('worker-2')
+        self.assertEqual(reclaimed.id, job.id)
+        self.assertEqual((reclaimed.lease_owner, reclaimed.attempts), ('worker-2', 2))
+
+    def test_heartbeat_renews_lease_and_stops_on_cancel_or_lost_lease(self):
+        self.queue.enqueue(self.repo, 'full')
+        job = self.queue.claim('worker-1')
+        clock = FakeClock()
+        with mock.patch('apps_lineage.job_queue.time.monotonic', clock):
+            beat = self.queue.heartbeat(job, 'worker-1')
+            expires_at = job.lease_expires_at
+            clock.now += 20
+            beat(job)
+            self.assertGreaterEqual(job.lease_expires_at, expires_at)
+
+            # 续约间隔内不检查取消标记
+            LineageParseJob.objects.filter(id=job.id).update(cancel_requested=True)
+            beat(job)
+            clock.now += 20
+            with self.assertRaises(ParseJobInterrupted) as raised:
+                beat(job)
+            self.assertEqual(raised.exception.status, 'cancelled')
+
+            LineageParseJob.objects.filter(id=job.id).update(lease_owner='worker-2')
+            clock.now += 20
+            with self.assertRaises(ParseJobInterrupted) as raised:
+                beat(job)
+            self.assertIsNone(raised.exception.status)
+
+    def test_heartbeat_returns_job_to_pending_on_shutdown(self):
+        self.queue.enqueue(self.repo, 'full')
+        job = self.queue.claim('worker-1')
+        beat = self.queue.heartbeat(job, 'worker-1', should_stop=lambda: True)
+        with self.assertRaises(ParseJobInterrupted) as raised:
+            beat(job)
+        self.assertEqual(raised.exception.status, 'pending')
+
+    def test_cancel_pending_and_running_jobs(self):
+        pending, _ = self.queue.enqueue(self.repo, 'full')
+        self.assertEqual(self.queue.cancel(pending), 'cancelled')
+
+        self.queue.enqueue(self.repo, 'full')
+        running = self.queue.claim('worker-1')
+        self.assertEqual(self.queue.cancel(running), 'running')
+        self.assertTrue(LineageParseJob.objects.get(id=running.id).cancel_requested)
+
+    def test_worker_finishes_reclaimed_cancelled_job(self):
+        self.queue.enqueue(self.repo, 'full')
+        job = self.queue.claim('worker-1')
+        self.queue.cancel(job)
+        LineageParseJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        # 原worker已崩溃，接管租约的worker直接结束已请求取消的任务
+        reclaimed = self.queue.claim('worker-2')
+        self.assertEqual(self.queue.cancel(reclaimed, 'worker-2'), 'cancelled')
+        self.assertIsNone(self.queue.claim('worker-3'))
+
+    def test_release_after_shutdown_returns_attempt(self):
+        self.queue.enqueue(self.repo, 'full')
+        job = self.queue.claim('worker-1')
+        # 任务被worker关闭中断，回到待执行状态
+        LineageParseJob.objects.filter(id=job.id).update(status='pending')
+        self.queue.release(job, 'worker-1')
+        job.refresh_from_db()
+        self.assertEqual((job.attempts, job.lease_owner), (0, ''))
+        self.assertEqual(self.queue.claim('worker-2').attempts, 1)
+
+    def test_release_after_finish_keeps_attempt(self):
+        self.queue.enqueue(self.repo, 'full')
+        job = self.queue.claim('worker-1')
+        LineageParseJob.objects.filter(id=job.id).update(status='completed')
+        self.queue.release(job, 'worker-1')
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+
+
+class LineageWorkerCommandTests(SimpleTestCase):
+
+    def test_claim_error_is_logged_and_retried(self):
+        command = run_lineage_worker.Command()
+        worker = 'apps_lineage.management.commands.run_lineage_worker'
+
+        def sleep(seconds):
+            command._stopping = True
+
+        with mock.patch(f'{worker}.signal.signal'), \
+                mock.patch(f'{worker}.time.sleep', side_effect=sleep) as patched_sleep, \
+                mock.patch.object(LineageJobQueue, 'claim', side_effect=Exception('database is locked')) as claim:
+            with self.assertLogs(worker, 'ERROR') as logs:
+                call_command(command, worker_id='worker-1', poll_interval=2, stdout=io.StringIO())
+        claim.assert_called_once_with('worker-1')
+        patched_sleep.assert_called_once_with(2)
+        self.assertIn('database is locked', logs.output[0])
+
+
+class JobProgressReporterTests(TestCase):
+
+    def setUp(self):
+        self.job = LineageParseJob.objects.create(git_repo=create_repo('repo'), parse_type='full', status='running')
+
+    def test_results_are_written_in_batches(self):
+        reporter = JobProgressReporter(self.job, flush_interval=3600, flush_files=2)
+        reporter.record_success('a.sql')
+        self.assertFalse(LineageParseFileResult.objects.exists())
+        self.assertEqual(LineageParseJob.objects.get(id=self.job.id).processed_files, 0)
+
+        reporter.record_failure('b.sql', ValueError('bad sql'))
+        self.assertEqual(LineageParseFileResult.objects.count(), 2)
+        job = LineageParseJob.objects.get(id=self.job.id)
+        self.assertEqual((job.processed_files, job.failed_files), (1, 1))
+
+        reporter.record_success('c.sql')
+        reporter.flush()
+        self.assertEqual(LineageParseJob.objects.get(id=self.job.id).processed_files, 2)
+
+    def test_checkpoint_restores_counts(self):
+        reporter = JobProgressReporter(self.job, flush_interval=3600, flush_files=10)
+        reporter.record_success('a.sql')
+        reporter.record_failure('b.sql', 'bad sql')
+        reporter.flush()
+
+        job = LineageParseJob.objects.get(id=self.job.id)
+        job.processed_files = job.failed_files = 0
+        self.assertEqual(JobProgressReporter(job).completed_files(), {'a.sql', 'b.sql'})
+        self.assertEqual((job.processed_files, job.failed_files), (1, 1))
+
+    def test_flush_requires_lease(self):
+        LineageParseJob.objects.filter(id=self.job.id).update(lease_owner='worker-1')
+        reporter = JobProgressReporter(self.job, flush_interval=3600, flush_files=10, lease_owner='worker-1')
+        reporter.record_success('a.sql')
+        reporter.flush()
+        self.assertEqual(LineageParseJob.objects.get(id=self.job.id).processed_files, 1)
+
+        # 租约被其他worker接管后不再写入计数和文件结果
+        LineageParseJob.objects.filter(id=self.job.id).update(lease_owner='worker-2')
+        reporter.record_success('b.sql')
+        with self.assertRaises(ParseJobInterrupted) as raised:
+            reporter.flush()
+        self.assertIsNone(raised.exception.status)
+        self.assertEqual(LineageParseJob.objects.get(id=self.job.id).processed_files, 1)
+        self.assertEqual(set(LineageParseFileResult.objects.values_list('file_path', flat=True)), {'a.sql'})
+
+
+class LineageDifferTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='differ')
+        self.repo = GitRepo.objects.create(user=user, name='repo', repo_url='https://git.example.com/dw/repo.git')
+        self.other_repo = GitRepo.objects.create(
+            user=user, name='other', repo_url='https://git.example.com/dw/other.git'
+        )
+        self.a, self.b, self.c = (
+            HiveTable.objects.create(database='dw', name=name, columns_json='[]') for name in ('a', 'b', 'c')
+        )
+
+    def edge(self, columns, relation_type='insert', transforms=None):
+        return {
+            'relation_type': relation_type,
+            'process_id': '',
+            'columns': set(columns),
+            'transforms': transforms or {},
+        }
+
+    def apply(self, edges, repo=None, path='dw/load.sql'):
+        return LineageDiffer(repo or self.repo, path).apply(edges, blob_sha='0' * 40)
+
+    def test_insert_update_delete_counts(self):
+        a, b, c = self.a.id, self.b.id, self.c.id
+        stats = self.apply({
+            (a, b): self.edge([('id', 'id'), ('name', 'name')]),
+            (a, c): self.edge([('id', 'a_id')]),
+        })
+        self.assertEqual(stats['relations_created'], 2)
+        self.assertEqual(stats['columns_created'], 3)
+        self.assertEqual(LineageRelation.objects.count(), 2)
+
+        # 内容不变时不写入
+        stats = self.apply({
+            (a, b): self.edge([('id', 'id'), ('name', 'name')]),
+            (a, c): self.edge([('id', 'a_id')]),
+        })
+        self.assertFalse(any(stats.values()))
+
+        stats = self.apply({
+            (a, b): self.edge(
+                [('id', 'id'), ('city', 'city')], relation_type='insert_overwrite',
+                transforms={('id', 'id'): ('function', 'cast(id as bigint)')}
+            ),
+            (b, c): self.edge([('id', 'b_id')]),
+        })
+        self.assertEqual(stats, {
+            'relations_created': 1,
+            'relations_deleted': 1,
+            'relations_updated': 1,
+            'columns_created': 2,
+            'columns_deleted': 1,
+            'columns_updated': 1,
+        })
+        self.assertEqual(
+            set(LineageRelation.objects.values_list('source_table_id', 'target_table_id', 'relation_type')),
+            {(a, b, 'insert_overwrite'), (b, c, 'insert')}
+        )
+        self.assertEqual(
+            set(ColumnLineage.objects.values_list('source_column', 'target_column', 'transform_type')),
+            {('id', 'id', 'function'), ('city', 'city', ''), ('id', 'b_id', '')}
+        )
+
+    def test_files_are_tracked_separately(self):
+        a, b = self.a.id, self.b.id
+        self.apply({(a, b): self.edge([('id', 'id')])}, path='dw/one.sql')
+        self.apply({(a, b): self.edge([('id', 'id')])}, path='dw/two.sql')
+        stats = self.apply({}, path='dw/one.sql')
+        self.assertEqual(stats['relations_deleted'], 1)
+        self.assertEqual(LineageRelation.objects.get().source_file.file_path, 'dw/two.sql')
+
+    def legacy_relation(self, path='dw/load.sql'):
+        return LineageRelation.objects.create(source_table=self.a, target_table=self.b, sql_script_path=path)
+
+    def test_legacy_rows_adopted_when_unambiguous(self):
+        self.apply({}, repo=self.other_repo, path='dw/other.sql')
+        self.legacy_relation()
+        stats = self.apply({})
+        self.assertEqual(stats['relations_deleted'], 1)
+        self.assertFalse(LineageRelation.objects.exists())
+
+    def test_legacy_rows_kept_when_other_repo_may_own_path(self):
+        legacy = self.legacy_relation()
+        # 另一个仓库还没有按文件登记过血缘，无法确定旧数据的来源
+        self.assertFalse(any(self.apply({}).values()))
+        legacy.refresh_from_db()
+        self.assertIsNone(legacy.source_file)
+
+        # 另一个仓库有同路径的文件
+        LineageSourceFile.objects.create(git_repo=self.other_repo, file_path='dw/load.sql')
+        LineageSourceFile.objects.filter(git_repo=self.repo).delete()
+        self.assertFalse(any(self.apply({}).values()))
+        legacy.refresh_from_db()
+        self.assertIsNone(legacy.source_file)
+
+    def test_purge_keeps_unowned_rows(self):
+        legacy = self.legacy_relation()
+        self.apply({(self.a.id, self.c.id): self.edge([('id', 'id')])})
+        purged = LineageService()._purge_file_lineage(self.repo, ['dw/load.sql'])
+        self.assertEqual(purged, 1)
+        self.assertEqual(list(LineageRelation.objects.values_list('id', flat=True)), [legacy.id])
+        self.assertFalse(LineageSourceFile.objects.filter(git_repo=self.repo).exists())
+
+
+class FakeSnapshotGitService:
+
+    def __init__(self, files):
+        self.files = files
+
+    def list_sql_files_at(self, commit):
+        return [{'path': path, 'blob_id': blob_sha} for path, blob_sha in self.files[commit].items()]
+
+
+def named_edge(source, target, columns):
+    return {'source': source, 'target': target, 'relation_type': 'insert', 'columns': [list(pair) for pair in columns]}
+
+
+class LineageSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.repo = create_repo('repo')
+        self.git_service = FakeSnapshotGitService({
+            'c1': {'a.sql': 'blob-a', 'copy_of_a.sql': 'blob-a', 'b.sql': 'blob-b'},
+            'c2': {'a.sql': 'blob-a2', 'b.sql': 'blob-b', 'c.sql': 'blob-c'},
+        })
+
+    def build(self, commit):
+        job = LineageParseJob.objects.create(
+            git_repo=self.repo, parse_type='snapshot', ref=commit, commit_sha=commit, status='running'
+        )
+        return LineageSnapshotBuilder(job, self.git_service).prepare()
+
+    def test_only_uncached_blobs_are_parsed(self):
+        LineageBlobResult.objects.create(blob_sha='blob-b')
+        snapshot, to_parse, blob_by_path = self.build('c1')
+        # 内容相同的文件只解析一次
+        self.assertEqual(len(to_parse), 1)
+        self.assertIn(to_parse[0], ('a.sql', 'copy_of_a.sql'))
+        self.assertEqual((snapshot.total_files, snapshot.reused_files), (3, 1))
+        self.assertEqual(snapshot.files.count(), 3)
+
+        # 同一提交再次构建时复用快照和文件清单
+        LineageBlobResult.objects.create(blob_sha='blob-a')
+        again, to_parse, _ = self.build('c1')
+        self.assertEqual(again.id, snapshot.id)
+        self.assertEqual(to_parse, [])
+        self.assertEqual(again.files.count(), 3)
+
+    def test_compare_snapshots(self):
+        for blob_sha, edges in (
+            ('blob-a', [named_edge('dw.s', 'dw.t', [('id', 'id')])]),
+            ('blob-a2', [named_edge('dw.s', 'dw.t', [('id', 'id'), ('name', 'name')])]),
+            ('blob-b', [named_edge('dw.t', 'dw.u', [('id', 'id')])]),
+            ('blob-c', [named_edge('dw.u', 'dw.v', [('id', 'id')])]),
+        ):
+            result, _ = LineageBlobResult.objects.get_or_create(blob_sha=blob_sha)
+            result.edges = edges
+            result.save()
+
+        base, _, _ = self.build('c1')
+        head, _, _ = self.build('c2')
+        diff = compare_snapshots(base, head)
+        self.assertEqual([(e['source'], e['target']) for e in diff['added']], [('dw.u', 'dw.v')])
+        self.assertEqual(diff['removed'], [])
+        self.assertEqual(diff['changed'], [{
+            'source': 'dw.s', 'target': 'dw.t', 'added_columns': [['name', 'name']], 'removed_columns': []
+        }])
+        self.assertEqual(compare_snapshots(head, head), {'added': [], 'removed': [], 'changed': []})
+
+
+class RepoSyncSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.parsed = create_repo('parsed')
+        self.never_parsed = create_repo('never_parsed')
+        LineageParseJob.objects.create(
+            git_repo=self.parsed, parse_type='full', status='completed',
+            commit_sha='a' * 40, completed_at=timezone.now()
+        )
+        patcher = mock.patch('apps_lineage.repo_scheduler.GitService')
+        self.git_service = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_tick_queues_moved_repositories_once_per_interval(self):
+        self.git_service.get_remote_heads.return_value = {'main': 'b' * 40}
+        scheduler = RepoSyncScheduler()
+        self.assertEqual(scheduler.tick(), 1)
+        self.assertEqual(LineageParseJob.objects.filter(parse_type='incremental').count(), 1)
+        # 从未解析过的仓库不自动解析
+        self.assertFalse(LineageParseJob.objects.filter(git_repo=self.never_parsed).exists())
+
+        # 间隔内不再检查
+        self.assertEqual(list(scheduler.due_repositories()), [])
+        self.assertEqual(scheduler.tick(), 0)
+
+    def test_unchanged_head_queues_nothing(self):
+        self.git_service.get_remote_heads.return_value = {'main': 'a' * 40}
+        self.assertEqual(RepoSyncScheduler().tick(), 0)
+        self.assertFalse(LineageParseJob.objects.filter(parse_type='incremental').exists())
+
+
+def brute_force_closure(edges):
+    """逐个节点做深度优先搜索得到的传递闭包，节点只有位于环上时才可达自身"""
+    adjacency = {}
+    for source, target in edges:
+        adjacency.setdefault(source, set()).add(target)
+    closure = set()
+    for start in adjacency:
+        stack = list(adjacency[start])
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(adjacency.get(node, ()))
+        closure.update((start, node) for node in seen)
+    return closure
+
+
+class ReachabilityIndexTests(TestCase):
+
+    def setUp(self):
+        self.tables = [
+            HiveTable.objects.create(database='dw', name=f't{i}', columns_json='[]')
+            for i in range(8)
+        ]
+        self.ids = [table.id for table in self.tables]
+
+    def add_edge(self, source, target):
+        LineageRelation.objects.create(
+            source_table=self.tables[source], target_table=self.tables[target], sql_script_path=f'{source}_{target}.sql'
+        )
+
+    def remove_edge(self, source, target):
+        LineageRelation.objects.filter(
+            source_table=self.tables[source], target_table=self.tables[target]
+        ).delete()
+
+    def closure_rows(self):
+        return set(LineageReachability.objects.values_list('source_table_id', 'target_table_id'))
+
+    def expected_closure(self):
+        return brute_force_closure(LineageRelation.objects.values_list('source_table_id', 'target_table_id'))
+
+    def assert_index_matches_graph(self):
+        self.assertEqual(self.closure_rows(), self.expected_closure())
+        direct = set(LineageReachability.objects.filter(is_direct=True).values_list(
+            'source_table_id', 'target_table_id'
+        ))
+        self.assertEqual(direct, set(LineageRelation.objects.values_list('source_table_id', 'target_table_id')))
+
+    def test_compute_reach_collapses_cycles(self):
+        adjacency = {1: {2}, 2: {3}, 3: {2, 4}, 5: {5}}
+        reach = compute_reach(adjacency, [1, 2, 3, 4, 5])
+        self.assertEqual(reach[1], {2, 3, 4})
+        self.assertEqual(reach[2], {2, 3, 4})
+        self.assertIs(reach[2], reach[3])
+        self.assertEqual(reach[4], set())
+        self.assertEqual(reach[5], {5})
+
+    def test_refresh_after_insert_and_delete(self):
+        ids = self.ids
+        self.add_edge(0, 1)
+        self.add_edge(1, 2)
+        ReachabilityIndex().refresh()
+        self.assert_index_matches_graph()
+        self.assertIn((ids[0], ids[2]), self.closure_rows())
+
+        # 插入边形成环 0 -> 1 -> 2 -> 0，环上的表互相可达且可达自身
+        self.add_edge(2, 0)
+        self.add_edge(2, 3)
+        ReachabilityIndex().refresh()
+        self.assert_index_matches_graph()
+        self.assertIn((ids[1], ids[1]), self.closure_rows())
+        self.assertIn((ids[1], ids[3]), self.closure_rows())
+
+        # 删除环上的边后，上游表不再经由该边可达
+        self.remove_edge(1, 2)
+        ReachabilityIndex().refresh()
+        self.assert_index_matches_graph()
+        self.assertNotIn((ids[0], ids[3]), self.closure_rows())
+        self.assertNotIn((ids[0], ids[0]), self.closure_rows())
+
+    def test_incremental_refresh_equals_rebuild(self):
+        rng = random.Random(41)
+        edges = set()
+        for _ in range(30):
+            source, target = rng.randrange(8), rng.randrange(8)
+            if (source, target) in edges and rng.random() < 0.7:
+                self.remove_edge(source, target)
+                edges.discard((source, target))
+            elif (source, target) not in edges:
+                self.add_edge(source, target)
+                edges.add((source, target))
+            ReachabilityIndex().refresh()
+            self.assert_index_matches_graph()
+
+        incremental = self.closure_rows()
+        ReachabilityIndex().rebuild()
+        self.assertEqual(incremental, self.closure_rows())
+
+    def test_refresh_without_changes_writes_nothing(self):
+        self.add_edge(0, 1)
+        ReachabilityIndex().refresh()
+        self.assertEqual(ReachabilityIndex().refresh()['changed_edges'], 0)
+
+
+def lineage_graph(edges):
+    return LineageGraph(
+        (i, source, target, 'insert', f'{source}_{target}.sql') for i, (source, target) in enumerate(edges)
+    )
+
+
+class LineageGraphPathTests(SimpleTestCase):
+    # 1 -> 2 -> 3 -> 6
+    # 1 -> 4 -> 6
+    # 1 -> 5 -> 4
+    # 6 -> 1（环）
+    EDGES = [(1, 2), (2, 3), (3, 6), (1, 4), (4, 6), (1, 5), (5, 4), (6, 1)]
+
+    def setUp(self):
+        self.graph = lineage_graph(self.EDGES)
+
+    def test_shortest_path(self):
+        self.assertEqual(self.graph.shortest_path(1, 6), [1, 4, 6])
+        self.assertEqual(self.graph.shortest_path(3, 4), [3, 6, 1, 4])
+        self.assertEqual(self.graph.shortest_path(2, 2), [2])
+        self.assertIsNone(self.graph.shortest_path(1, 7))
+
+    def test_shortest_path_prefers_fewest_hops_when_sides_meet_at_different_depths(self):
+        # 正向第一层即与反向相遇的 0 -> 9 长度为1，不应返回更长的 0 -> 1 -> 2 -> 9
+        graph = lineage_graph([(0, 1), (1, 2), (2, 9), (0, 9), (3, 9), (4, 9)])
+        self.assertEqual(graph.shortest_path(0, 9), [0, 9])
+
+    def test_shortest_path_respects_banned_nodes_and_edges(self):
+        self.assertEqual(self.graph.shortest_path(1, 6, banned_nodes=frozenset({4})), [1, 2, 3, 6])
+        self.assertEqual(self.graph.shortest_path(1, 6, banned_edges=frozenset({(4, 6), (2, 3)})), None)
+
+    def test_k_shortest_paths(self):
+        paths = self.graph.k_shortest_paths(1, 6, 5)
+        self.assertEqual(paths, [[1, 4, 6], [1, 2, 3, 6], [1, 5, 4, 6]])
+        self.assertEqual(self.graph.k_shortest_paths(1, 6, 2), [[1, 4, 6], [1, 2, 3, 6]])
+        self.assertEqual(self.graph.k_shortest_paths(6, 2, 3), [[6, 1, 2]])
+        self.assertEqual(self.graph.k_shortest_paths(2, 7, 3), [])
+
+    def test_k_shortest_paths_are_simple_and_sorted(self):
+        rng = random.Random(42)
+        edges = {(rng.randrange(12), rng.randrange(12)) for _ in range(40)}
+        graph = lineage_graph(edges)
+        expected = sorted(graph.all_simple_paths(0, 11, max_paths=10000, max_depth=12)[0], key=len)
+        paths = graph.k_shortest_paths(0, 11, 6)
+        self.assertEqual([len(path) for path in paths], [len(path) for path in expected[:len(paths)]])
+        self.assertEqual(len(paths), min(6, len(expected)))
+        self.assertEqual(len({tuple(path) for path in paths}), len(paths))
+        for path in paths:
+            self.assertEqual(len(set(path)), len(path))
+            self.assertTrue(all((a, b) in edges for a, b in zip(path, path[1:])))
+
+    def test_all_simple_paths_with_limits(self):
+        paths, truncated = self.graph.all_simple_paths(1, 6, max_paths=10, max_depth=10)
+        self.assertFalse(truncated)
+        self.assertEqual(sorted(paths), [[1, 2, 3, 6], [1, 4, 6], [1, 5, 4, 6]])
+
+        paths, _ = self.graph.all_simple_paths(1, 6, max_paths=10, max_depth=2)
+        self.assertEqual(paths, [[1, 4, 6]])
+
+        paths, truncated = self.graph.all_simple_paths(1, 6, max_paths=2, max_depth=10)
+        self.assertTrue(truncated)
+        self.assertEqual(len(paths), 2)
+
+
+def reset_graph_cache():
+    """测试之间数据库回滚后版本号可能重复，丢弃进程内缓存的血缘图"""
+    lineage_paths._graph_cache['key'] = None
+
+
+@override_settings(LINEAGE_GRAPH_CONFIG={'aggregate_threshold': 3})
+class LineageNeighborhoodTests(TestCase):
+
+    def setUp(self):
+        reset_graph_cache()
+        self.addCleanup(reset_graph_cache)
+        self.tables = {}
+        # center -> d0..d4（下游超过阈值），u0 -> center，d0 -> dd0
+        for name in ['center', 'u0', 'dd0'] + [f'd{i}' for i in range(5)]:
+            self.tables[name] = HiveTable.objects.create(
+                database='ods' if name == 'd4' else 'dw', name=name, columns_json='[]'
+            )
+        self.add_edge('u0', 'center')
+        for i in range(5):
+            self.add_edge('center', f'd{i}')
+        self.add_edge('d0', 'dd0')
+
+    def add_edge(self, source, target):
+        LineageRelation.objects.create(
+            source_table=self.tables[source], target_table=self.tables[target], sql_script_path=f'{target}.sql'
+        )
+
+    def neighborhood(self, depth=2):
+        return LineageNeighborhood(self.tables['center'], depth=depth)
+
+    def test_neighbours_beyond_threshold_are_aggregated(self):
+        page = self.neighborhood().build_page()
+        nodes = {node['id']: node for node in page['nodes']}
+        self.assertEqual(set(nodes), {
+            'dw.center', 'dw.u0', 'dw.d0', 'dw.d1', 'dw.d2', 'dw.dd0',
+            'aggregate:dw.center:downstream:dw', 'aggregate:dw.center:downstream:ods',
+        })
+        self.assertEqual(nodes['dw.center']['depth'], 0)
+        self.assertEqual(nodes['dw.dd0']['depth'], 2)
+        self.assertEqual(nodes['aggregate:dw.center:downstream:dw']['count'], 1)
+        self.assertEqual(nodes['aggregate:dw.center:downstream:ods']['count'], 1)
+        self.assertIn({'source': 'dw.u0', 'target': 'dw.center', 'type': 'insert'}, page['edges'])
+        self.assertFalse(page['truncated'])
+
+    def test_pages_cover_graph_once(self):
+        full = self.neighborhood().build_page()
+        nodes, edges, cursor, pages = [], [], None, 0
+        while True:
+            page = self.neighborhood().build_page(cursor=cursor, limit=2)
+            nodes += [node['id'] for node in page['nodes']]
+            edges += page['edges']
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertGreater(pages, 2)
+        self.assertEqual(sorted(nodes), sorted(node['id'] for node in full['nodes']))
+        self.assertEqual(len(nodes), len(set(nodes)))
+        self.assertCountEqual(edges, full['edges'])
+
+    def test_ndjson_stream_ends_with_cursor(self):
+        lines = [json.loads(line) for line in self.neighborhood(depth=1).iter_ndjson(limit=3)]
+        self.assertEqual([item['type'] for item in lines if item['type'] == 'node'], ['node'] * 3)
+        self.assertEqual(lines[-1]['type'], 'end')
+        self.assertTrue(lines[-1]['truncated'])
+
+        rest = [json.loads(line) for line in self.neighborhood(depth=1).iter_ndjson(cursor=lines[-1]['next_cursor'])]
+        self.assertIsNone(rest[-1]['next_cursor'])
+
+    def test_cursor_expires_when_graph_changes(self):
+        cursor = self.neighborhood().build_page(limit=2)['next_cursor']
+        self.add_edge('dd0', 'u0')
+        bump_graph_version()
+        with self.assertRaises(GraphCursorExpired):
+            self.neighborhood().build_page(cursor=cursor, limit=2)
+
+
+class LineageQueryCacheTests(TestCase):
+
+    def setUp(self):
+        self.cache = LineageQueryCache()
+        self.cache.cache.clear()
+        self.calls = 0
+
+    def compute(self, status_code=200):
+        self.calls += 1
+        return {'calls': self.calls}, status_code
+
+    def lookup(self):
+        return self.cache.get_or_compute('impact', {'table': 'dw.a'}, self.compute)
+
+    def test_version_bump_causes_cache_miss(self):
+        self.assertEqual(self.lookup(), ({'calls': 1}, 200, False))
+        self.assertEqual(self.lookup(), ({'calls': 1}, 200, True))
+        # 参数不同不共用结果
+        self.assertFalse(self.cache.get_or_compute('impact', {'table': 'dw.b'}, self.compute)[2])
+
+        version = get_graph_version()
+        self.assertEqual(bump_graph_version(), version + 1)
+        self.assertEqual(self.lookup(), ({'calls': 3}, 200, False))
+
+    def test_errors_are_not_cached(self):
+        self.cache.get_or_compute('impact', {}, lambda: self.compute(404))
+        self.assertEqual(self.cache.get_or_compute('impact', {}, self.compute), ({'calls': 2}, 200, False))
+
+    def test_lineage_graph_reloaded_after_version_bump(self):
+        reset_graph_cache()
+        self.addCleanup(reset_graph_cache)
+        a, b = (HiveTable.objects.create(database='dw', name=name, columns_json='[]') for name in ('a', 'b'))
+        self.assertEqual(get_lineage_graph().relations, {})
+
+        # 未递增版本号时继续使用已加载的血缘图
+        LineageRelation.objects.create(source_table=a, target_table=b, sql_script_path='b.sql')
+        self.assertEqual(get_lineage_graph().relations, {})
+        bump_graph_version()
+        self.assertEqual(set(get_lineage_graph().relations), {(a.id, b.id)})
+
+
+@override_settings(LINEAGE_IMPACT_CONFIG={'max_tables': 5})
+class BatchImpactAnalyzerTests(TestCase):
+
+    def setUp(self):
+        reset_graph_cache()
+        self.addCleanup(reset_graph_cache)
+        self.tables = [HiveTable.objects.create(database='dw', name=f't{i}', columns_json='[]') for i in range(7)]
+        # 0 -> 1 -> 2 <-> 3 -> 4，5 -> 3，6孤立
+        self.edges = [(0, 1), (1, 2), (2, 3), (3, 2), (3, 4), (5, 3)]
+        for source, target in self.edges:
+            LineageRelation.objects.create(
+                source_table=self.tables[source], target_table=self.tables[target], sql_script_path=f't{target}.sql'
+            )
+        bump_graph_version()
+
+    def test_impact_matches_per_table_traversal(self):
+        result = BatchImpactAnalyzer().analyze(['dw.t0', 'dw.t5', 'dw.t6', 'dw.missing'])
+        ids = [table.id for table in self.tables]
+        closure = brute_force_closure((ids[s], ids[t]) for s, t in self.edges)
+        for source in (0, 5, 6):
+            expected = sorted(target for start, target in closure if start == ids[source])
+            self.assertEqual(result['impact'][ids[source]], expected)
+        self.assertEqual(result['union'], sorted(ids[1:5]))
+        self.assertEqual(result['total_count'], 4)
+        self.assertEqual(result['not_found'], ['dw.missing'])
+        self.assertEqual(result['tables'][ids[4]], 'dw.t4')
+        self.assertEqual(set(result['tables']), set(ids[:7]))
+
+    def test_table_limit(self):
+        with self.assertRaises(Exception):
+            BatchImpactAnalyzer().analyze([f'dw.t{i}' for i in range(6)])
+
+
+class ColumnImpactTests(SimpleTestCase):
+
+    def test_classify_transform(self):
+        for code, transform_type, expected in (
+            ('', '', 'direct'),
+            ('u.id', '', 'direct'),
+            ('`dw`.`users`.`id`', '', 'direct'),
+            ('u.amount * 100', '', 'expression'),
+            ('cast(u.id as bigint)', '', 'function'),
+            ('sum(o.amount)', '', 'aggregate'),
+            ('round(avg(o.amount), 2)', '', 'aggregate'),
+            ('CASE WHEN u.age > 18 THEN 1 ELSE 0 END', '', 'case'),
+            ('if(u.age > 18, 1, 0)', '', 'case'),
+            ('u.a || u.b', 'function', 'function'),
+            ('u.a || u.b', 'unknown', 'expression'),
+        ):
+            with self.subTest(code=code):
+                self.assertEqual(classify_transform(code, transform_type), expected)
+
+    def test_downstream_prunes_excluded_transforms(self):
+        # 1.id -> 2.id -> 3.total（聚合）-> 4.total；2.id -> 4.user_id
+        graph = ColumnLineageGraph([
+            (1, 'id', 2, 'ID', '', 'direct'),
+            (2, 'id', 3, 'total', 'sum(id)', 'aggregate'),
+            (3, 'total', 4, 'total', '', 'direct'),
+            (2, 'id', 4, 'user_id', '', 'direct'),
+        ])
+        start = graph.find(1, 'ID')
+
+        found, pruned, truncated = graph.downstream(start)
+        self.assertEqual(
+            [graph.nodes[node] for node, *_ in found],
+            [(2, 'ID'), (3, 'total'), (4, 'user_id'), (4, 'total')]
+        )
+        self.assertEqual((pruned, truncated), (0, False))
+
+        found, pruned, _ = graph.downstream(start, exclude_transforms=frozenset({'aggregate'}))
+        self.assertEqual([graph.nodes[node] for node, *_ in found], [(2, 'ID'), (4, 'user_id')])
+        self.assertEqual(pruned, 1)
+
+        self.assertEqual(len(graph.downstream(start, max_depth=1)[0]), 1)
+        self.assertEqual(graph.downstream(start, max_results=2)[2], True)
+
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class LineageExportTests(TestCase):
+
+    def setUp(self):
+        reset_graph_cache()
+        column_impact._graph_cache['key'] = None
+        self.addCleanup(reset_graph_cache)
+        self.a, self.b, self.c = (
+            HiveTable.objects.create(database='dw', name=name, columns_json='[]') for name in ('a', 'b', 'c')
+        )
+        ab = LineageRelation.objects.create(source_table=self.a, target_table=self.b, sql_script_path='b.sql')
+        bc = LineageRelation.objects.create(source_table=self.b, target_table=self.c, sql_script_path='c.sql')
+        ColumnLineage.objects.create(relation=ab, source_column='id', target_column='id', transform_type='direct')
+        ColumnLineage.objects.create(
+            relation=bc, source_column='amount', target_column='total',
+            transformation='sum(amount)', transform_type='aggregate'
+        )
+        bump_graph_version()
+
+    def read(self, chunks):
+        return b''.join(chunks)
+
+    def test_csv_edge_lists(self):
+        exporter = LineageExporter()
+        rows = list(csv.reader(io.StringIO(gzip.decompress(self.read(
+            exporter.export_tabular('table_edges', 'csv')
+        )).decode('utf-8'))))
+        self.assertEqual(rows[0], ['relation_id', 'source', 'target', 'relation_type', 'sql_script_path'])
+        self.assertEqual(
+            sorted((int(source), int(target)) for _, source, target, _, _ in rows[1:]),
+            [(self.a.id, self.b.id), (self.b.id, self.c.id)]
+        )
+
+        rows = list(csv.reader(io.StringIO(gzip.decompress(self.read(
+            exporter.export_tabular('columns', 'csv')
+        )).decode('utf-8'))))
+        self.assertEqual(sorted(row[2] for row in rows[1:]), ['amount', 'id', 'id', 'total'])
+
+    def test_graphml(self):
+        root = ElementTree.fromstring(self.read(LineageExporter().export_graph('table', 'graphml')))
+        namespace = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+        nodes = root.findall('g:graph/g:node', namespace)
+        edges = root.findall('g:graph/g:edge', namespace)
+        self.assertEqual(sorted(int(node.get('id')) for node in nodes), [self.a.id, self.b.id, self.c.id])
+        self.assertEqual(
+            sorted((int(edge.get('source')), int(edge.get('target'))) for edge in edges),
+            [(self.a.id, self.b.id), (self.b.id, self.c.id)]
+        )
+
+    def test_json_graph(self):
+        graph = json.loads(self.read(LineageExporter().export_graph('column', 'json')))['graph']
+        self.assertEqual(len(graph['nodes']), 4)
+        labels = {key: node['label'] for key, node in graph['nodes'].items()}
+        edges = {(labels[e['source']], labels[e['target']]): e for e in graph['edges']}
+        self.assertEqual(set(edges), {('id', 'id'), ('amount', 'total')})
+        self.assertEqual(edges[('amount', 'total')]['metadata']['transform_type'], 'aggregate')
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_and_arrow(self):
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        exporter = LineageExporter()
+        table = pyarrow.parquet.read_table(io.BytesIO(self.read(exporter.export_tabular('column_edges', 'parquet'))))
+        self.assertEqual(table.column('transformation').to_pylist(), ['', 'sum(amount)'])
+        table = pyarrow.ipc.open_stream(self.read(exporter.export_tabular('tables', 'arrow'))).read_all()
+        self.assertEqual(table.column('qualified_name').to_pylist(), ['dw.a', 'dw.b', 'dw.c'])
+
+    def test_unsupported_export(self):
+        exporter = LineageExporter()
+        for export in (
+            lambda: exporter.export_tabular('unknown', 'csv'),
+            lambda: exporter.export_tabular('tables', 'xlsx'),
+            lambda: exporter.export_graph('file', 'json'),
+        ):
+            with self.assertRaises(Exception):
+                export()
+
+    def test_tables_come_from_snapshot(self):
+        exporter = LineageExporter()
+        HiveTable.objects.create(database='dw', name='d', columns_json='[]')
+        rows = list(csv.reader(io.StringIO(gzip.decompress(self.read(
+            exporter.export_tabular('tables', 'csv')
+        )).decode('utf-8'))))
+        self.assertEqual([row[3] for row in rows[1:]], ['dw.a', 'dw.b', 'dw.c'])
+
+    def test_snapshot_reloaded_when_version_changes_during_load(self):
+        calls = []
+
+        def load_column_graph():
+            # 第一次加载字段血缘图前有解析任务写入了新的血缘
+            if not calls:
+                LineageRelation.objects.create(source_table=self.a, target_table=self.c, sql_script_path='c2.sql')
+                bump_graph_version()
+            calls.append(1)
+            return get_column_graph()
+
+        with mock.patch('apps_lineage.lineage_export.get_column_graph', side_effect=load_column_graph):
+            exporter = LineageExporter()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(exporter.version, get_graph_version())
+        self.assertEqual((exporter.table_graph.version, exporter.column_graph.version), (exporter.version,) * 2)
+        self.assertIn((self.a.id, self.c.id), exporter.table_graph.relations)
+
+
+@override_settings(LIST_PAGINATION_CONFIG={'page_size': 2, 'max_page_size': 3})
+class LineageRelationListTests(TestCase):
+
+    URL = '/api/lineage/relations/'
+
+    def setUp(self):
+        tables = [
+            HiveTable.objects.create(database='dw', name=f't{i}', columns_json='[{"name": "id", "type": "int"}]')
+            for i in range(5)
+        ]
+        for i in range(4):
+            relation = LineageRelation.objects.create(
+                source_table=tables[i], target_table=tables[i + 1], sql_script_path=f't{i + 1}.sql'
+            )
+            ColumnLineage.objects.create(relation=relation, source_column='id', target_column='id')
+
+    def test_list_is_paginated_with_summary_tables(self):
+        data = self.client.get(self.URL).json()
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        relation = data['results'][0]
+        self.assertNotIn('column_lineages', relation)
+        self.assertEqual(set(relation['source_table']), {'id', 'qualified_name'})
+
+        self.assertEqual(len(self.client.get(self.URL, {'page_size': 10}).json()['results']), 3)
+
+    def test_fields_and_expand(self):
+        relation = self.client.get(self.URL, {'fields': 'id,sql_script_path,unknown'}).json()['results'][0]
+        self.assertEqual(set(relation), {'id', 'sql_script_path'})
+
+        params = {'fields': 'id', 'expand': 'source_table,column_lineages'}
+        relation = self.client.get(self.URL, params).json()['results'][0]
+        self.assertEqual(set(relation), {'id', 'source_table', 'column_lineages'})
+        self.assertEqual(relation['source_table']['columns'], [{'name': 'id', 'type': 'int'}])
+        self.assertEqual(relation['column_lineages'][0]['source_column'], 'id')
+
+    def test_detail_returns_all_fields(self):
+        relation_id = LineageRelation.objects.order_by('id').first().id
+        relation = self.client.get(f'{self.URL}{relation_id}/').json()
+        self.assertIn('column_lineages', relation)
+        self.assertEqual(set(relation['target_table']), {'id', 'qualified_name'})
+
+
+def without_scipy():
+    """模拟未安装SciPy"""
+    return mock.patch.dict(sys.modules, {'scipy': None, 'scipy.sparse': None, 'scipy.sparse.csgraph': None})
+
+
+class LineageGraphAnalyticsTests(TestCase):
+
+    def setUp(self):
+        reset_graph_cache()
+        self.addCleanup(reset_graph_cache)
+        self.tables = [HiveTable.objects.create(database='dw', name=f't{i}', columns_json='[]') for i in range(7)]
+        self.ids = [table.id for table in self.tables]
+        # 0 -> 1 -> 2 <-> 3 -> 4，0 -> 4，5孤立，6 -> 6（自环）
+        for source, target in [(0, 1), (1, 2), (2, 3), (3, 2), (3, 4), (0, 4), (6, 6)]:
+            LineageRelation.objects.create(
+                source_table=self.tables[source], target_table=self.tables[target], sql_script_path=f't{target}.sql'
+            )
+        ReachabilityIndex().rebuild()
+        bump_graph_version()
+
+    def metrics(self):
+        return {self.ids.index(table_id): values for table_id, values in LineageGraphAnalytics().compute().items()}
+
+    def test_metrics(self):
+        expected = {
+            # (downstream_count, upstream_count, fan_in, fan_out, upstream_depth, is_orphan, is_dead_end)
+            0: (4, 0, 0, 2, 0, False, False),
+            1: (3, 1, 1, 1, 1, False, False),
+            2: (2, 3, 2, 1, 2, False, False),
+            3: (2, 3, 1, 2, 2, False, False),
+            4: (0, 4, 2, 0, 3, False, True),
+            5: (0, 0, 0, 0, 0, True, False),
+            6: (0, 0, 0, 0, 0, True, False),
+        }
+        self.assertEqual(self.metrics(), expected)
+        with without_scipy():
+            self.assertEqual(self.metrics(), expected)
+
+    def test_strongly_connected_labels_match_without_scipy(self):
+        rng = random.Random(50)
+        edges = np.array([(rng.randrange(30), rng.randrange(30)) for _ in range(60)], dtype=np.int64)
+
+        def components(labels):
+            groups = {}
+            for node, label in enumerate(np.asarray(labels).tolist()):
+                groups.setdefault(label, set()).add(node)
+            return sorted(map(sorted, groups.values()))
+
+        count, labels = strongly_connected_labels(30, edges[:, 0], edges[:, 1])
+        with without_scipy():
+            fallback_count, fallback_labels = strongly_connected_labels(30, edges[:, 0], edges[:, 1])
+        self.assertEqual(count, fallback_count)
+        self.assertEqual(components(labels), components(fallback_labels))
+
+    def test_refresh_writes_only_changes(self):
+        self.assertEqual(LineageGraphAnalytics().refresh(), {'tables': 7, 'created': 7, 'updated': 0, 'deleted': 0})
+        self.assertEqual(LineageGraphAnalytics().refresh(), {'tables': 7, 'created': 0, 'updated': 0, 'deleted': 0})
+
+        self.tables[5].delete()
+        LineageRelation.objects.create(
+            source_table=self.tables[4], target_table=self.tables[6], sql_script_path='t6.sql'
+        )
+        ReachabilityIndex().rebuild()
+        bump_graph_version()
+        # 删除表时其指标随之删除；新增的边改变了上游各表的下游数
+        self.assertEqual(LineageGraphAnalytics().refresh(), {'tables': 6, 'created': 0, 'updated': 6, 'deleted': 0})
+        metrics = LineageTableMetrics.objects.get(table=self.tables[4])
+        self.assertEqual((metrics.fan_out, metrics.is_dead_end), (1, False))
+
+
+class FakeJobGitService:
+    """解析任务使用的GitService替身，文件列表和提交比较结果由测试指定"""
+
+    def __init__(self, files=None, error=None, changes_error=None):
+        self.files = files or []
+        self.error = error
+        self.changes_error = changes_error
+
+    def get_head_sha(self):
+        return 'b' * 40
+
+    def get_sql_files(self):
+        if self.error:
+            raise self.error
+        return [dict(f) for f in self.files]
+
+    def get_changes_between(self, old_sha, new_sha):
+        raise self.changes_error
+
+    def iter_file_contents(self, file_paths, commit=None, batch_size=100):
+        for path in file_paths:
+            yield path, None
+
+
+class ParseJobFileListingTests(TestCase):
+
+    def setUp(self):
+        self.repo = create_repo('repo')
+        a, b = (HiveTable.objects.create(database='dw', name=name, columns_json='[]') for name in ('a', 'b'))
+        edge = {'relation_type': 'insert', 'process_id': '', 'columns': {('id', 'id')}, 'transforms': {}}
+        LineageDiffer(self.repo, 'dw/load.sql').apply({(a.id, b.id): edge}, blob_sha='0' * 40)
+
+    def run_job(self, git_service, parse_type='full'):
+        job = LineageParseJob.objects.create(git_repo=self.repo, parse_type=parse_type)
+        with mock.patch('apps_git.git_service.GitService', return_value=git_service):
+            return LineageService().run_parse_job(job)
+
+    def assertLineageKept(self):
+        self.assertEqual(LineageRelation.objects.filter(source_file__git_repo=self.repo).count(), 1)
+        self.assertTrue(LineageSourceFile.objects.filter(git_repo=self.repo, file_path='dw/load.sql').exists())
+
+    def test_listing_error_fails_job_without_purging(self):
+        job = self.run_job(FakeJobGitService(error=Exception('获取SQL文件列表失败: 502 error')))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('502', job.error_message)
+        self.assertLineageKept()
+
+    def test_empty_listing_with_parsed_files_fails_job(self):
+        job = self.run_job(FakeJobGitService(files=[]))
+        self.assertEqual(job.status, 'failed')
+        self.assertLineageKept()
+
+    def test_removed_files_are_purged(self):
+        job = self.run_job(FakeJobGitService(files=[{'path': 'dw/other.sql', 'blob_id': '1' * 40}]))
+        self.assertEqual(job.status, 'completed')
+        self.assertFalse(LineageSourceFile.objects.filter(file_path='dw/load.sql').exists())
+
+    def test_full_overwrite_keeps_lineage_when_listing_fails(self):
+        job = self.run_job(FakeJobGitService(error=Exception('获取SQL文件列表失败')), parse_type='full_overwrite')
+        self.assertEqual(job.status, 'failed')
+        self.assertLineageKept()
+
+    def test_full_overwrite_clears_lineage_after_listing(self):
+        job = self.run_job(
+            FakeJobGitService(files=[{'path': 'dw/load.sql', 'blob_id': '1' * 40}]), parse_type='full_overwrite'
+        )
+        self.assertEqual((job.status, job.total_files), ('completed', 1))
+        self.assertFalse(LineageRelation.objects.exists())
+
+    def test_incremental_compare_failure_fails_job(self):
+        LineageParseJob.objects.create(
+            git_repo=self.repo, parse_type='full', status='completed',
+            commit_sha='a' * 40, completed_at=timezone.now()
+        )
+        git_service = FakeJobGitService(
+            files=[{'path': 'dw/other.sql', 'blob_id': '1' * 40}],
+            changes_error=Exception('比较结果不完整')
+        )
+        job = self.run_job(git_service, parse_type='incremental')
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('比较结果不完整', job.error_message)
+        self.assertLineageKept()
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LineageRelationViewSet, LineageParseJobViewSet
+from .views import LineageRelationViewSet, LineageParseJobViewSet, LineageSnapshotViewSet, LineageTableMetricsViewSet
 
 router = DefaultRouter()
 router.register(r'relations', LineageRelationViewSet)
 router.register(r'jobs', LineageParseJobViewSet)
+router.register(r'snapshots', LineageSnapshotViewSet)
+router.register(r'metrics', LineageTableMetricsViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,33 +1,53 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Max, Q
 from django.shortcuts import get_object_or_404
+from apps_metadata.models import HiveTable
 from apps_git.models import GitRepo
-from .models import LineageRelation, LineageParseJob
+from .models import LineageRelation, LineageParseJob, LineageSnapshot, LineageTableMetrics
 from .serializers import (
-    LineageRelationSerializer, LineageParseJobSerializer,
-    ParseSQLSerializer, ImpactAnalysisSerializer, LineageGraphSerializer
+    LineageRelationSerializer, LineageParseJobSerializer, LineageSnapshotSerializer,
+    ParseSQLSerializer, ImpactAnalysisSerializer, BatchImpactSerializer, LineageGraphSerializer,
+    LineageTableMetricsSerializer
 )
 from .lineage_service import LineageService
+from .job_queue import LineageJobQueue
+from .lineage_snapshot import get_snapshot_edges, serialize_edge, compare_snapshots
+from .lineage_neighborhood import LineageNeighborhood, GraphCursorExpired
+from .query_cache import LineageQueryCache
+from .lineage_export import LineageExporter, TABULAR_FORMATS
+from apps_core.executors import run_blocking, ExecutorBusy
+from apps_core.pagination import StandardPagination
 
 
 class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = LineageRelation.objects.all()
     serializer_class = LineageRelationSerializer
+    pagination_class = StandardPagination
 
     def get_queryset(self):
-        queryset = LineageRelation.objects.select_related(
-            'source_table', 'target_table'
-        ).prefetch_related('column_lineages')
+        names, expand = LineageRelationSerializer.requested_fields(
+            self.request.query_params, listing=self.action == 'list'
+        )
+        queryset = LineageRelation.objects.select_related('source_table', 'target_table')
+        # 只输出ID和完整表名时不读取表的字段JSON
+        for name in ('source_table', 'target_table'):
+            if name not in expand:
+                queryset = queryset.defer(f'{name}__columns_json')
+        if 'column_lineages' in names:
+            queryset = queryset.prefetch_related('column_lineages')
         
         source_table = self.request.query_params.get('source_table', None)
         target_table = self.request.query_params.get('target_table', None)
         
         if source_table:
-            queryset = queryset.filter(source_table__full_name=source_table)
+            queryset = queryset.filter(source_table__qualified_name=source_table)
         
         if target_table:
-            queryset = queryset.filter(target_table__full_name=target_table)
+            queryset = queryset.filter(target_table__qualified_name=target_table)
         
         return queryset.order_by('-created_at')
 
@@ -48,7 +68,7 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
             lineage_service = LineageService()
             
             # 首先解析SQL获取原始数据
-            parsed_data = lineage_service.parse_sql(sql_text)
+            parsed_data = run_blocking('sqlflow', lineage_service.parse_sql, sql_text)
             if not parsed_data:
                 return Response({
                     'status': 'error',
@@ -75,6 +95,8 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
                     'message': 'Failed to parse SQL or no relations found'
                 })
                 
+        except ExecutorBusy:
+            raise
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
@@ -102,7 +124,7 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
             lineage_service = LineageService()
             
             # 解析SQL获取原始数据，但不保存到数据库
-            parsed_data = lineage_service.parse_sql(sql_text)
+            parsed_data = run_blocking('sqlflow', lineage_service.parse_sql, sql_text)
             if not parsed_data:
                 return Response({
                     'status': 'error',
@@ -124,6 +146,8 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
                 'note': '预览模式：解析结果未保存到数据库'
             })
                 
+        except ExecutorBusy:
+            raise
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
@@ -148,13 +172,13 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
             git_repo = get_object_or_404(GitRepo, id=repo_id)
             
             lineage_service = LineageService()
-            job = lineage_service.batch_parse_repository(git_repo)
+            job = lineage_service.enqueue_parse_job(git_repo, parse_type='full')
             
             serializer = LineageParseJobSerializer(job)
             return Response({
                 'status': 'success',
                 'job': serializer.data
-            })
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
             return Response(
@@ -178,14 +202,14 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
             git_repo = get_object_or_404(GitRepo, id=repo_id)
             
             lineage_service = LineageService()
-            job = lineage_service.incremental_parse_repository(git_repo)
+            job = lineage_service.enqueue_parse_job(git_repo, parse_type='incremental')
             
             serializer = LineageParseJobSerializer(job)
             return Response({
                 'status': 'success',
                 'job': serializer.data,
                 'parse_type': 'incremental'
-            })
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
             return Response(
@@ -209,14 +233,14 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
             git_repo = get_object_or_404(GitRepo, id=repo_id)
             
             lineage_service = LineageService()
-            job = lineage_service.full_parse_repository(git_repo)
+            job = lineage_service.enqueue_parse_job(git_repo, parse_type='full_overwrite')
             
             serializer = LineageParseJobSerializer(job)
             return Response({
                 'status': 'success',
                 'job': serializer.data,
                 'parse_type': 'full_overwrite'
-            })
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
             return Response(
@@ -224,6 +248,12 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['get'])
+    def engine_status(self, request):
+        """SQLFlow调用保护状态：熔断状态、并发与排队情况"""
+        lineage_service = LineageService()
+        return Response(lineage_service.guard.snapshot())
+
     @action(detail=False, methods=['get'])
     def impact(self, request):
         table_name = request.query_params.get('table_name')
@@ -233,80 +263,212 @@ class LineageRelationViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        lineage_service = LineageService()
-        impact_data = lineage_service.get_downstream_impact(table_name)
+        def compute():
+            lineage_service = LineageService()
+            impact_data = lineage_service.get_downstream_impact(table_name)
+            if 'error' in impact_data:
+                return impact_data, status.HTTP_404_NOT_FOUND
+            return impact_data, status.HTTP_200_OK
         
-        if 'error' in impact_data:
-            return Response(impact_data, status=status.HTTP_404_NOT_FOUND)
+        return self._cached_response(request, 'impact', compute)
+
+    @action(detail=False, methods=['get'])
+    def column_impact(self, request):
+        """
+        字段级影响分析：只沿字段级血缘展开
+        exclude_transforms: 逗号分隔的转换类型（direct/expression/function/aggregate/case），经过这些转换后不再向下传播
+        """
+        table_name = request.query_params.get('table_name')
+        column = request.query_params.get('column')
+        if not table_name or not column:
+            return Response(
+                {'error': 'table_name and column parameters are required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        return Response(impact_data)
+        def compute():
+            exclude_transforms = request.query_params.get('exclude_transforms')
+            max_depth = request.query_params.get('max_depth')
+            lineage_service = LineageService()
+            result = lineage_service.get_column_impact(
+                table_name, column,
+                exclude_transforms=[t for t in exclude_transforms.split(',') if t] if exclude_transforms is not None else None,
+                max_depth=int(max_depth) if max_depth else None
+            )
+            if 'error' in result:
+                return result, status.HTTP_404_NOT_FOUND
+            return result, status.HTTP_200_OK
+        
+        try:
+            return self._cached_response(request, 'column_impact', compute)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def batch_impact(self, request):
+        """
+        多表批量影响分析，请求体: {"tables": ["db.table", ...]}
+        响应中的表以ID表示，名称见tables字典
+        """
+        serializer = BatchImpactSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        table_names = serializer.validated_data['tables']
+        
+        def compute():
+            lineage_service = LineageService()
+            return lineage_service.get_batch_downstream_impact(table_names), status.HTTP_200_OK
+        
+        try:
+            params = {'tables': sorted(set(table_names))}
+            return self._cached_response(request, 'batch_impact', compute, params)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def reachable(self, request):
+        """判断source表是否（直接或间接）流向target表"""
+        source = request.query_params.get('source')
+        target = request.query_params.get('target')
+        if not source or not target:
+            return Response(
+                {'error': 'source and target parameters are required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def compute():
+            lineage_service = LineageService()
+            result = lineage_service.check_reachability(source, target)
+            if 'error' in result:
+                return result, status.HTTP_404_NOT_FOUND
+            return result, status.HTTP_200_OK
+        
+        return self._cached_response(request, 'reachable', compute)
+
+    @action(detail=False, methods=['get'])
+    def paths(self, request):
+        """
+        查询source表流向target表的路径
+        mode: shortest（默认）、k_shortest（配合k）、all（配合max_paths、max_depth）
+        """
+        source = request.query_params.get('source')
+        target = request.query_params.get('target')
+        if not source or not target:
+            return Response(
+                {'error': 'source and target parameters are required'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def compute():
+            limits = {
+                name: int(request.query_params[name])
+                for name in ('k', 'max_paths', 'max_depth')
+                if request.query_params.get(name)
+            }
+            lineage_service = LineageService()
+            result = lineage_service.find_lineage_paths(
+                source, target, mode=request.query_params.get('mode', 'shortest'), **limits
+            )
+            if 'error' in result:
+                return result, status.HTTP_404_NOT_FOUND
+            return result, status.HTTP_200_OK
+        
+        try:
+            return self._cached_response(request, 'paths', compute)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
     def graph(self, request):
+        """
+        表的血缘邻域图
+        limit: 每页节点数；cursor: 上一页返回的next_cursor；stream=ndjson: 逐行流式输出
+        """
         table_name = request.query_params.get('table_name')
-        depth = int(request.query_params.get('depth', 2))
-        
         if not table_name:
             return Response(
                 {'error': 'table_name parameter is required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        config = settings.LINEAGE_GRAPH_CONFIG
+        stream = request.query_params.get('stream') == 'ndjson'
         try:
-            nodes = set()
-            edges = []
-            visited = set()
+            depth = min(int(request.query_params.get('depth', 2)), config['max_depth'])
+            default_limit = config['stream_max_nodes'] if stream else config['page_size']
+            max_limit = config['stream_max_nodes'] if stream else config['max_page_size']
+            limit = min(int(request.query_params.get('limit', default_limit)), max_limit)
             
-            def build_graph(current_table, current_depth):
-                if current_depth > depth or current_table in visited:
-                    return
-                
-                visited.add(current_table)
-                nodes.add(current_table)
-                
-                # Get outgoing relations
-                outgoing = LineageRelation.objects.filter(
-                    source_table__full_name=current_table
-                ).select_related('target_table')
-                
-                for relation in outgoing:
-                    target_name = relation.target_table.full_name
-                    edges.append({
-                        'source': current_table,
-                        'target': target_name,
-                        'type': relation.relation_type
-                    })
-                    build_graph(target_name, current_depth + 1)
-                
-                # Get incoming relations
-                incoming = LineageRelation.objects.filter(
-                    target_table__full_name=current_table
-                ).select_related('source_table')
-                
-                for relation in incoming:
-                    source_name = relation.source_table.full_name
-                    edges.append({
-                        'source': source_name,
-                        'target': current_table,
-                        'type': relation.relation_type
-                    })
-                    build_graph(source_name, current_depth + 1)
+            cursor = request.query_params.get('cursor')
             
-            build_graph(table_name, 0)
+            if stream:
+                center_table = LineageService().get_table(table_name)
+                neighborhood = LineageNeighborhood(center_table, depth)
+                # 先校验游标，生成器开始输出后无法再返回错误状态码
+                neighborhood.cursor_offset(cursor)
+                return StreamingHttpResponse(
+                    neighborhood.iter_ndjson(cursor, limit),
+                    content_type='application/x-ndjson'
+                )
             
-            graph_data = {
-                'nodes': [{'id': node, 'label': node} for node in nodes],
-                'edges': edges
-            }
+            def compute():
+                center_table = LineageService().get_table(table_name)
+                neighborhood = LineageNeighborhood(center_table, depth)
+                return neighborhood.build_page(cursor, limit), status.HTTP_200_OK
             
-            return Response(graph_data)
+            return self._cached_response(request, 'graph', compute)
             
+        except HiveTable.DoesNotExist:
+            return Response(
+                {'error': f'Table {table_name} not found'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except GraphCursorExpired as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response(
                 {'error': str(e)}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        血缘图批量导出（流式下载）
+        file_format: csv（gzip压缩）、parquet、arrow时按dataset导出边列表或节点字典
+            （tables、table_edges、columns、column_edges）；graphml、json时按level导出整图（table、column）
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        try:
+            exporter = LineageExporter()
+            if file_format in TABULAR_FORMATS:
+                name = request.query_params.get('dataset', 'table_edges')
+                content = exporter.export_tabular(name, file_format)
+            else:
+                level = request.query_params.get('level', 'table')
+                name = f"{level}_graph"
+                content = exporter.export_graph(level, file_format)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(content, content_type=exporter.content_type(file_format))
+        response['Content-Disposition'] = f'attachment; filename="{exporter.filename(name, file_format)}"'
+        # 字段节点ID只在同一版本内稳定，分多次下载时可据此确认版本一致
+        response['X-Lineage-Version'] = str(exporter.version)
+        return response
+
+    def _cached_response(self, request, endpoint, compute, params=None):
+        """
+        按 (接口, 查询参数, 血缘图版本号) 缓存的响应，X-Cache头标明是否命中
+        params: 影响结果的参数，默认为URL查询参数（POST接口传入请求体中的参数）
+        """
+        if params is None:
+            params = request.query_params.dict()
+        data, status_code, hit = LineageQueryCache().get_or_compute(endpoint, params, compute)
+        response = Response(data, status=status_code)
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
 
 class LineageParseJobViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = LineageParseJob.objects.all()
@@ -314,3 +476,148 @@ class LineageParseJobViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         return LineageParseJob.objects.select_related('git_repo').order_by('-created_at')
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """取消解析任务：待执行任务立即取消，运行中的任务由worker在处理下一个文件前停止"""
+        job = self.get_object()
+        if job.status not in ('pending', 'running'):
+            return Response(
+                {'error': f'任务当前状态为 {job.status}，无法取消'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        LineageJobQueue().cancel(job)
+        serializer = self.get_serializer(job)
+        return Response({
+            'status': 'success',
+            'job': serializer.data
+        })
+
+
+class LineageSnapshotViewSet(viewsets.ReadOnlyModelViewSet):
+    """提交级血缘快照：解析任意分支或提交而不切换工作区，并比较两个快照的血缘差异"""
+    queryset = LineageSnapshot.objects.all()
+    serializer_class = LineageSnapshotSerializer
+
+    def get_queryset(self):
+        queryset = LineageSnapshot.objects.select_related('git_repo', 'job')
+        repo_id = self.request.query_params.get('repo_id')
+        if repo_id:
+            queryset = queryset.filter(git_repo_id=repo_id)
+        return queryset.order_by('-created_at')
+
+    @action(detail=False, methods=['post'])
+    def build(self, request):
+        """提交快照任务：repo_id + ref（分支、标签或提交SHA）"""
+        repo_id = request.data.get('repo_id')
+        ref = (request.data.get('ref') or '').strip()
+        if not repo_id or not ref:
+            return Response(
+                {'error': 'repo_id and ref are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            git_repo = get_object_or_404(GitRepo, id=repo_id)
+            
+            lineage_service = LineageService()
+            job = lineage_service.enqueue_parse_job(git_repo, parse_type='snapshot', ref=ref)
+            
+            serializer = LineageParseJobSerializer(job)
+            return Response({
+                'status': 'success',
+                'job': serializer.data
+            }, status=status.HTTP_202_ACCEPTED)
+            
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    @action(detail=True, methods=['get'])
+    def edges(self, request, pk=None):
+        """快照中的全部表级血缘（含字段级血缘和来源脚本）"""
+        snapshot = self.get_object()
+        edges = get_snapshot_edges(snapshot)
+        return Response({
+            'snapshot': self.get_serializer(snapshot).data,
+            'edges': [serialize_edge(edges[key]) for key in sorted(edges)]
+        })
+
+    @action(detail=False, methods=['get'])
+    def compare(self, request):
+        """比较两个快照：?base=<快照ID>&head=<快照ID>"""
+        base_id = request.query_params.get('base')
+        head_id = request.query_params.get('head')
+        if not base_id or not head_id:
+            return Response(
+                {'error': 'base and head parameters are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        base = get_object_or_404(LineageSnapshot, id=base_id)
+        head = get_object_or_404(LineageSnapshot, id=head_id)
+        if base.git_repo_id != head.git_repo_id:
+            return Response(
+                {'error': '只能比较同一仓库的快照'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = compare_snapshots(base, head)
+        result['base'] = self.get_serializer(base).data
+        result['head'] = self.get_serializer(head).data
+        return Response(result)
+
+
+class LineageTableMetricsViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    每张表的血缘统计指标，解析任务结束后批量刷新
+    ordering: 排序字段（前缀-为降序），默认按下游表数降序；database、is_orphan、is_dead_end 用于筛选
+    """
+    queryset = LineageTableMetrics.objects.all()
+    serializer_class = LineageTableMetricsSerializer
+    pagination_class = StandardPagination
+    lookup_field = 'table_id'
+
+    ORDERING_FIELDS = ('downstream_count', 'upstream_count', 'fan_in', 'fan_out', 'upstream_depth')
+
+    def get_queryset(self):
+        queryset = LineageTableMetrics.objects.select_related('table').defer('table__columns_json')
+        
+        database = self.request.query_params.get('database')
+        if database:
+            queryset = queryset.filter(table__database=database)
+        for flag in ('is_orphan', 'is_dead_end'):
+            value = self.request.query_params.get(flag)
+            if value is not None:
+                queryset = queryset.filter(**{flag: value.lower() in ('1', 'true')})
+        
+        ordering = self.request.query_params.get('ordering', '-downstream_count')
+        if ordering.lstrip('-') not in self.ORDERING_FIELDS:
+            ordering = '-downstream_count'
+        return queryset.order_by(ordering, 'table_id')
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """整体概况：表数、孤立表与末端表数、最长上游链，以及下游最多的表"""
+        metrics = LineageTableMetrics.objects.all()
+        aggregates = metrics.aggregate(
+            tables=Count('table_id'),
+            orphan_count=Count('table_id', filter=Q(is_orphan=True)),
+            dead_end_count=Count('table_id', filter=Q(is_dead_end=True)),
+            max_upstream_depth=Max('upstream_depth'),
+            updated_at=Max('updated_at')
+        )
+        top = metrics.select_related('table').defer('table__columns_json').order_by('-downstream_count', 'table_id')
+        aggregates['most_critical'] = LineageTableMetricsSerializer(top[:10], many=True).data
+        return Response(aggregates)
+
+    @action(detail=False, methods=['post'])
+    def refresh(self, request):
+        """立即重新计算全部指标"""
+        stats = LineageService().refresh_table_metrics()
+        if stats is None:
+            return Response({'error': '血缘统计指标计算失败，详见日志'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(stats)
@@ -4,7 +4,7 @@ WebSocket消费者，实现LSP协议通信
 import json
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from apps_core.executors import run_in_executor
 from .sql_language_server import sql_language_server
 
 logger = logging.getLogger(__name__)
@@ -94,7 +94,7 @@ class SQLLanguageServerConsumer(AsyncWebsocketConsumer):
     
     async def handle_completion_async(self, params):
         """异步处理自动补全请求"""
-        return await database_sync_to_async(self.handle_completion)(params)
+        return await run_in_executor('lsp', self.handle_completion, params)
     
     def handle_completion(self, params):
         """处理自动补全请求"""
@@ -121,7 +121,7 @@ class SQLLanguageServerConsumer(AsyncWebsocketConsumer):
     
     async def handle_hover_async(self, params):
         """异步处理悬停请求"""
-        return await database_sync_to_async(self.handle_hover)(params)
+        return await run_in_executor('lsp', self.handle_hover, params)
     
     def handle_hover(self, params):
         """处理悬停信息请求"""
@@ -142,7 +142,7 @@ class SQLLanguageServerConsumer(AsyncWebsocketConsumer):
     
     async def handle_diagnostics_async(self, params):
         """异步处理诊断请求"""
-        return await database_sync_to_async(self.handle_diagnostics)(params)
+        return await run_in_executor('lsp', self.handle_diagnostics, params)
     
     def handle_diagnostics(self, params):
         """处理诊断请求"""
@@ -163,7 +163,7 @@ class SQLLanguageServerConsumer(AsyncWebsocketConsumer):
     
     async def handle_refresh_metadata_async(self, params):
         """异步处理元数据刷新请求"""
-        return await database_sync_to_async(self.handle_refresh_metadata)(params)
+        return await run_in_executor('lsp', self.handle_refresh_metadata, params)
     
     def handle_refresh_metadata(self, params):
         """处理元数据刷新请求"""
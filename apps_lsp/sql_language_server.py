@@ -52,7 +52,7 @@ class SQLLanguageServer:
             self._cached_schemas = set()
             
             for table in tables:
-                full_name = f"{table.database}.{table.name}"
+                full_name = table.full_name
                 self._cached_tables[full_name] = {
                     'database': table.database,
                     'name': table.name,
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def fill_qualified_name(apps, schema_editor):
+    HiveTable = apps.get_model('apps_metadata', 'HiveTable')
+    tables = list(HiveTable.objects.only('id', 'database', 'name'))
+    for table in tables:
+        table.qualified_name = f"{table.database}.{table.name}"
+    HiveTable.objects.bulk_update(tables, ['qualified_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_metadata', '0002_hiveauthconfig_hivejarfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hivetable',
+            name='qualified_name',
+            field=models.CharField(default='', editable=False, max_length=511),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_qualified_name, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='hivetable',
+            name='qualified_name',
+            field=models.CharField(editable=False, help_text='database.name，保存时自动生成，用于按完整表名查询', max_length=511, unique=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps_metadata', '0003_hivetable_qualified_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableCatalogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -7,6 +7,10 @@ import os
 class HiveTable(models.Model):
     name = models.CharField(max_length=255)
     database = models.CharField(max_length=255)
+    qualified_name = models.CharField(
+        max_length=511, unique=True, editable=False,
+        help_text='database.name，保存时自动生成，用于按完整表名查询'
+    )
     columns_json = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -17,6 +21,21 @@ class HiveTable(models.Model):
     def __str__(self):
         return f"{self.database}.{self.name}"
 
+    def save(self, *args, **kwargs):
+        self.qualified_name = f"{self.database}.{self.name}"
+        if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'qualified_name'}
+        super().save(*args, **kwargs)
+        # 延迟导入，避免模型加载时的循环依赖
+        from .table_resolver import get_table_resolver
+        get_table_resolver().invalidate()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .table_resolver import get_table_resolver
+        get_table_resolver().invalidate()
+        return result
+
     @property
     def columns(self):
         try:
@@ -30,7 +49,16 @@ class HiveTable(models.Model):
 
     @property
     def full_name(self):
-        return f"{self.database}.{self.name}"
+        return self.qualified_name or f"{self.database}.{self.name}"
+
+
+class TableCatalogState(models.Model):
+    """表元数据版本号（单行），表的增删改时递增，各进程据此清空表名解析缓存"""
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"v{self.version}"
 
 
 class BusinessMapping(models.Model):
@@ -1,14 +1,25 @@
 from rest_framework import serializers
+from apps_core.serializers import SparseFieldsMixin
 from .models import HiveTable, BusinessMapping, HiveAuthConfig, HiveJarFile
 
 
-class HiveTableSerializer(serializers.ModelSerializer):
+class HiveTableSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     columns = serializers.JSONField(read_only=True)
     full_name = serializers.CharField(read_only=True)
 
     class Meta:
         model = HiveTable
-        fields = ['id', 'name', 'database', 'columns', 'full_name', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'database', 'qualified_name', 'columns', 'full_name', 'created_at', 'updated_at']
+        # 列表默认不输出字段信息（每行都要解析columns JSON），需要时通过fields=指定
+        default_fields = ['id', 'name', 'database', 'qualified_name']
+
+
+class HiveTableSummarySerializer(serializers.ModelSerializer):
+    """嵌套在其他对象中的表：只有ID和完整表名"""
+
+    class Meta:
+        model = HiveTable
+        fields = ['id', 'qualified_name']
 
 
 class BusinessMappingSerializer(serializers.ModelSerializer):
@@ -0,0 +1,130 @@
+"""
+完整表名到表ID的解析
+按 qualified_name 唯一索引查询，结果在进程内缓存；表的增删改递增数据库中的表元数据版本号，
+各进程（Web、解析worker）每次解析前比较版本号，版本变化时清空本进程的缓存
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+# SQLite单条语句的参数个数有限，IN查询分批执行
+QUERY_CHUNK_SIZE = 500
+
+STATE_ID = 1
+
+
+def qualify_table_name(table_name, default_database='default'):
+    """省略库名时补全为 default.table"""
+    return table_name if '.' in table_name else f"{default_database}.{table_name}"
+
+
+def get_catalog_version():
+    """当前表元数据版本号"""
+    from .models import TableCatalogState
+    version = TableCatalogState.objects.filter(pk=STATE_ID).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_catalog_version():
+    """表的增删改后递增版本号，返回新版本号"""
+    from .models import TableCatalogState
+    updated = TableCatalogState.objects.filter(pk=STATE_ID).update(version=F('version') + 1)
+    if not updated:
+        TableCatalogState.objects.get_or_create(pk=STATE_ID)
+        TableCatalogState.objects.filter(pk=STATE_ID).update(version=F('version') + 1)
+    return get_catalog_version()
+
+
+class TableNameResolver:
+    """完整表名 -> 表ID 的进程内缓存"""
+
+    def __init__(self):
+        config = getattr(settings, 'TABLE_NAME_CACHE_CONFIG', {})
+        self.ttl = config.get('ttl', 300)
+        self.negative_ttl = config.get('negative_ttl', 30)
+        self.max_entries = config.get('max_entries', 100000)
+        self._entries = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _cached(self, name, now):
+        entry = self._entries.get(name)
+        if entry is None:
+            return False, None
+        table_id, expires_at = entry
+        if expires_at < now:
+            return False, None
+        return True, table_id
+
+    def resolve_ids(self, table_names):
+        """
+        批量解析完整表名
+
+        Returns:
+            {完整表名: 表ID或None}
+        """
+        from .models import HiveTable
+
+        now = time.monotonic()
+        version = get_catalog_version()
+        result = {}
+        missing = []
+        with self._lock:
+            if version != self._version:
+                # 其他进程修改过表，缓存的表ID可能已失效
+                self._entries.clear()
+                self._version = version
+            for name in set(table_names):
+                hit, table_id = self._cached(name, now)
+                if hit:
+                    result[name] = table_id
+                else:
+                    missing.append(name)
+
+        if not missing:
+            return result
+
+        found = {}
+        for start in range(0, len(missing), QUERY_CHUNK_SIZE):
+            found.update(HiveTable.objects.filter(
+                qualified_name__in=missing[start:start + QUERY_CHUNK_SIZE]
+            ).values_list('qualified_name', 'id'))
+
+        with self._lock:
+            # 查询期间版本号已被其他线程更新时，本次结果不写入缓存
+            cacheable = version == self._version
+            if cacheable and len(self._entries) + len(missing) > self.max_entries:
+                self._entries.clear()
+            for name in missing:
+                table_id = found.get(name)
+                if cacheable:
+                    ttl = self.ttl if table_id is not None else self.negative_ttl
+                    self._entries[name] = (table_id, now + ttl)
+                result[name] = table_id
+        return result
+
+    def resolve_id(self, table_name):
+        """解析单个完整表名，不存在时返回None"""
+        return self.resolve_ids([table_name])[table_name]
+
+    def invalidate(self):
+        """表发生增删改后调用：递增共享版本号，使所有进程的缓存失效"""
+        bump_catalog_version()
+        with self._lock:
+            self._entries.clear()
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_table_resolver():
+    """获取进程级共享的TableNameResolver实例"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = TableNameResolver()
+    return _resolver
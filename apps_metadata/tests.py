@@ -1,3 +1,84 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from .models import HiveTable
+from .table_resolver import TableNameResolver, qualify_table_name
+
+
+@override_settings(TABLE_NAME_CACHE_CONFIG={'ttl': 300, 'negative_ttl': 30})
+class TableNameResolverTests(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('apps_metadata.table_resolver.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.orders = HiveTable.objects.create(database='dw', name='orders', columns_json='[]')
+
+    def test_qualified_name_kept_in_sync(self):
+        self.assertEqual(self.orders.qualified_name, 'dw.orders')
+        self.orders.name = 'orders_v2'
+        self.orders.save(update_fields=['name'])
+        self.assertEqual(HiveTable.objects.get(id=self.orders.id).qualified_name, 'dw.orders_v2')
+        self.assertEqual(qualify_table_name('orders'), 'default.orders')
+        self.assertEqual(qualify_table_name('ods.orders', 'dw'), 'ods.orders')
+
+    def test_lookups_are_cached(self):
+        resolver = TableNameResolver()
+        self.assertEqual(resolver.resolve_ids(['dw.orders', 'dw.missing']), {
+            'dw.orders': self.orders.id, 'dw.missing': None
+        })
+        # 命中缓存时只查询版本号
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver.resolve_id('dw.orders'), self.orders.id)
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolver.resolve_id('dw.missing'))
+
+        # 不存在的表只缓存较短时间
+        self.now += 31
+        with self.assertNumQueries(2):
+            resolver.resolve_ids(['dw.orders', 'dw.missing'])
+        self.now += 300
+        with self.assertNumQueries(2):
+            resolver.resolve_id('dw.orders')
+
+    def test_table_changes_invalidate_cache(self):
+        resolver = TableNameResolver()
+        self.assertIsNone(resolver.resolve_id('dw.users'))
+        with mock.patch('apps_metadata.table_resolver.get_table_resolver', return_value=resolver):
+            users = HiveTable.objects.create(database='dw', name='users', columns_json='[]')
+            self.assertEqual(resolver.resolve_id('dw.users'), users.id)
+            users.delete()
+        self.assertIsNone(resolver.resolve_id('dw.users'))
+
+    def test_changes_in_other_process_invalidate_cache(self):
+        # 两个解析器分别代表Web进程和解析worker
+        web, worker = TableNameResolver(), TableNameResolver()
+        self.assertEqual(worker.resolve_id('dw.orders'), self.orders.id)
+        self.assertIsNone(worker.resolve_id('dw.users'))
+        with mock.patch('apps_metadata.table_resolver.get_table_resolver', return_value=web):
+            self.orders.delete()
+            users = HiveTable.objects.create(database='dw', name='users', columns_json='[]')
+        self.assertIsNone(worker.resolve_id('dw.orders'))
+        self.assertEqual(worker.resolve_id('dw.users'), users.id)
+
+
+class HiveTableListTests(TestCase):
+
+    URL = '/api/metadata/tables/'
+
+    def setUp(self):
+        HiveTable.objects.create(database='dw', name='orders', columns_json='[{"name": "id", "type": "int"}]')
+
+    def test_list_omits_columns_by_default(self):
+        data = self.client.get(self.URL).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(set(data['results'][0]), {'id', 'name', 'database', 'qualified_name'})
+
+        table = self.client.get(self.URL, {'fields': 'qualified_name,columns'}).json()['results'][0]
+        self.assertEqual(table, {'qualified_name': 'dw.orders', 'columns': [{'name': 'id', 'type': 'int'}]})
+
+    def test_detail_returns_all_fields(self):
+        table_id = HiveTable.objects.get().id
+        self.assertIn('columns', self.client.get(f'{self.URL}{table_id}/').json())
@@ -11,14 +11,21 @@ from .serializers import (
 )
 from .import_service import MetadataImportService
 from .hive_connection import get_hive_connection_manager
+from .table_resolver import get_table_resolver
+from apps_core.executors import run_blocking
+from apps_core.pagination import StandardPagination
 
 
 class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = HiveTable.objects.all()
     serializer_class = HiveTableSerializer
+    pagination_class = StandardPagination
     
     def get_queryset(self):
         queryset = HiveTable.objects.all()
+        names, _ = HiveTableSerializer.requested_fields(self.request.query_params, listing=self.action == 'list')
+        if 'columns' not in names:
+            queryset = queryset.defer('columns_json')
         database = self.request.query_params.get('database', None)
         search = self.request.query_params.get('search', None)
         
@@ -95,8 +102,7 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
                 for table_name in table_list:
                     try:
                         if '.' in table_name:
-                            db, tb = table_name.split('.', 1)
-                            table = HiveTable.objects.get(database=db, name=tb)
+                            table = HiveTable.objects.get(qualified_name=table_name)
                         else:
                             table = HiveTable.objects.filter(name=table_name).first()
                         
@@ -164,13 +170,17 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
     def clear_all(self, request):
         """清空所有元数据和血缘关系"""
         try:
-            from apps_lineage.models import LineageRelation, ColumnLineage
+            from apps_lineage.models import LineageRelation, ColumnLineage, LineageSourceFile, LineageReachability
+            from apps_lineage.graph_version import bump_graph_version
             
             # 删除所有血缘关系
             column_lineage_count = ColumnLineage.objects.count()
             lineage_count = LineageRelation.objects.count()
             ColumnLineage.objects.all().delete()
             LineageRelation.objects.all().delete()
+            LineageSourceFile.objects.all().delete()
+            LineageReachability.objects.all().delete()
+            bump_graph_version()
             
             # 删除所有业务映射
             business_mapping_count = BusinessMapping.objects.count()
@@ -179,6 +189,7 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
             # 删除所有表元数据
             table_count = HiveTable.objects.count()
             HiveTable.objects.all().delete()
+            get_table_resolver().invalidate()
             
             return Response({
                 'success': True,
@@ -213,9 +224,8 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
             
             # 获取该数据库的所有表
             tables = HiveTable.objects.filter(database=database)
-            table_names = [f"{table.database}.{table.name}" for table in tables]
             
-            if not table_names:
+            if not tables.exists():
                 return Response({
                     'success': False,
                     'error': f'数据库 {database} 不存在或没有表'
@@ -223,18 +233,18 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
             
             # 删除相关的字段级血缘
             column_lineage_count = ColumnLineage.objects.filter(
-                Q(source_table__in=table_names) | Q(target_table__in=table_names)
+                Q(relation__source_table__in=tables) | Q(relation__target_table__in=tables)
             ).count()
             ColumnLineage.objects.filter(
-                Q(source_table__in=table_names) | Q(target_table__in=table_names)
+                Q(relation__source_table__in=tables) | Q(relation__target_table__in=tables)
             ).delete()
             
             # 删除相关的表级血缘关系
             lineage_count = LineageRelation.objects.filter(
-                Q(source_table__in=table_names) | Q(target_table__in=table_names)
+                Q(source_table__in=tables) | Q(target_table__in=tables)
             ).count()
             LineageRelation.objects.filter(
-                Q(source_table__in=table_names) | Q(target_table__in=table_names)
+                Q(source_table__in=tables) | Q(target_table__in=tables)
             ).delete()
             
             # 删除相关的业务映射
@@ -246,6 +256,11 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
             # 删除表元数据
             table_count = tables.count()
             tables.delete()
+            get_table_resolver().invalidate()
+            
+            # 经过这些表的间接可达关系需要重新计算
+            from apps_lineage.lineage_service import LineageService
+            LineageService().on_lineage_changed()
             
             return Response({
                 'success': True,
@@ -282,7 +297,7 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
             
             # 查找表
             try:
-                table = HiveTable.objects.get(database=database, name=table_name)
+                table = HiveTable.objects.get(qualified_name=f"{database}.{table_name}")
             except HiveTable.DoesNotExist:
                 return Response({
                     'success': False,
@@ -293,18 +308,18 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
             
             # 删除相关的字段级血缘
             column_lineage_count = ColumnLineage.objects.filter(
-                Q(source_table=full_table_name) | Q(target_table=full_table_name)
+                Q(relation__source_table=table) | Q(relation__target_table=table)
             ).count()
             ColumnLineage.objects.filter(
-                Q(source_table=full_table_name) | Q(target_table=full_table_name)
+                Q(relation__source_table=table) | Q(relation__target_table=table)
             ).delete()
             
             # 删除相关的表级血缘关系
             lineage_count = LineageRelation.objects.filter(
-                Q(source_table=full_table_name) | Q(target_table=full_table_name)
+                Q(source_table=table) | Q(target_table=table)
             ).count()
             LineageRelation.objects.filter(
-                Q(source_table=full_table_name) | Q(target_table=full_table_name)
+                Q(source_table=table) | Q(target_table=table)
             ).delete()
             
             # 删除相关的业务映射
@@ -314,6 +329,10 @@ class HiveTableViewSet(viewsets.ReadOnlyModelViewSet):
             # 删除表元数据
             table.delete()
             
+            # 经过该表的间接可达关系需要重新计算
+            from apps_lineage.lineage_service import LineageService
+            LineageService().on_lineage_changed()
+            
             return Response({
                 'success': True,
                 'message': f'已删除表 {full_table_name} 的所有元数据',
@@ -433,7 +452,7 @@ class HiveConnectionViewSet(viewsets.ViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         hive_manager = get_hive_connection_manager()
-        result = hive_manager.test_connection(serializer.validated_data)
+        result = run_blocking('hive', hive_manager.test_connection, serializer.validated_data)
         
         if result['success']:
             return Response(result)
@@ -448,7 +467,7 @@ class HiveConnectionViewSet(viewsets.ViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         hive_manager = get_hive_connection_manager()
-        databases = hive_manager.get_databases(serializer.validated_data)
+        databases = run_blocking('hive', hive_manager.get_databases, serializer.validated_data)
         
         return Response({
             'databases': databases
@@ -466,7 +485,7 @@ class HiveConnectionViewSet(viewsets.ViewSet):
             return Response({'error': '缺少database参数'}, status=status.HTTP_400_BAD_REQUEST)
         
         hive_manager = get_hive_connection_manager()
-        tables = hive_manager.get_tables(serializer.validated_data, database)
+        tables = run_blocking('hive', hive_manager.get_tables, serializer.validated_data, database)
         
         return Response({
             'database': database,
@@ -481,7 +500,7 @@ class HiveConnectionViewSet(viewsets.ViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         hive_manager = get_hive_connection_manager()
-        tree_data = hive_manager.get_database_tree(serializer.validated_data)
+        tree_data = run_blocking('hive', hive_manager.get_database_tree, serializer.validated_data)
         
         return Response({
             'tree_data': tree_data
@@ -499,6 +518,6 @@ class HiveConnectionViewSet(viewsets.ViewSet):
         sync_mode = serializer.validated_data['sync_mode']
         
         hive_manager = get_hive_connection_manager()
-        result = hive_manager.selective_sync(connection_config, selected_tables, sync_mode)
+        result = run_blocking('hive', hive_manager.selective_sync, connection_config, selected_tables, sync_mode)
         
         return Response(result)
@@ -39,6 +39,7 @@ export interface HiveTable {
   id: number
   name: string
   database: string
+  qualified_name: string
   columns: Array<{
     name: string
     type: string
@@ -57,6 +58,8 @@ export interface GitRepo {
   auth_type: string
   access_mode: string
   branch: string
+  clone_strategy?: 'full' | 'shallow' | 'partial' | 'sparse'
+  clone_depth?: number
   ssl_verify: boolean
   is_active: boolean
   created_at: string
@@ -64,10 +67,26 @@ export interface GitRepo {
   last_sync: string | null
 }
 
+export interface PaginatedResponse<T> {
+  count: number
+  next: string | null
+  previous: string | null
+  results: T[]
+}
+
+// 列表接口的分页与字段选择参数，fields/expand为逗号分隔的字段名
+export interface ListParams {
+  page?: number
+  page_size?: number
+  fields?: string
+  expand?: string
+}
+
 export interface LineageRelation {
   id: number
-  source_table: HiveTable
-  target_table: HiveTable
+  // 默认只有id和qualified_name，expand=source_table,target_table 时为完整的表信息
+  source_table: Pick<HiveTable, 'id' | 'qualified_name'> & Partial<HiveTable>
+  target_table: Pick<HiveTable, 'id' | 'qualified_name'> & Partial<HiveTable>
   sql_script_path: string
   relation_type: string
   process_id: string
@@ -78,22 +97,40 @@ export interface LineageParseJob {
   id: number
   git_repo: number
   git_repo_name: string
-  status: 'pending' | 'running' | 'completed' | 'failed'
+  status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled'
+  parse_type: 'full' | 'incremental' | 'full_overwrite' | 'snapshot'
   total_files: number
   processed_files: number
   failed_files: number
   progress_percentage: number
   error_message: string
+  commit_sha: string
+  ref: string
+  attempts: number
+  cancel_requested: boolean
   started_at: string | null
   completed_at: string | null
   created_at: string
 }
 
+export interface LineageSnapshot {
+  id: number
+  git_repo: number
+  git_repo_name: string
+  commit_sha: string
+  ref: string
+  job: number | null
+  status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled'
+  total_files: number
+  reused_files: number
+  created_at: string
+}
+
 
 // Metadata API
 export const metadataAPI = {
-  getTables: (params?: { database?: string; search?: string }) =>
-    api.get<HiveTable[]>('/metadata/tables/', { params }),
+  getTables: (params?: { database?: string; search?: string } & ListParams) =>
+    api.get<PaginatedResponse<HiveTable>>('/metadata/tables/', { params }),
   
   getTable: (id: number) =>
     api.get<HiveTable>(`/metadata/tables/${id}/`),
@@ -213,8 +250,8 @@ export const gitAPI = {
 
 // Lineage API
 export const lineageAPI = {
-  getRelations: (params?: { source_table?: string; target_table?: string }) =>
-    api.get<LineageRelation[]>('/lineage/relations/', { params }),
+  getRelations: (params?: { source_table?: string; target_table?: string } & ListParams) =>
+    api.get<PaginatedResponse<LineageRelation>>('/lineage/relations/', { params }),
   
   parseSQL: (sqlText: string, filePath = '') =>
     api.post('/lineage/relations/parse_sql/', { sql_text: sqlText, file_path: filePath }),
@@ -234,14 +271,45 @@ export const lineageAPI = {
   getImpact: (tableName: string) =>
     api.get('/lineage/relations/impact/', { params: { table_name: tableName } }),
   
-  getGraph: (tableName: string, depth = 2) =>
-    api.get('/lineage/relations/graph/', { params: { table_name: tableName, depth } }),
+  getColumnImpact: (tableName: string, column: string, excludeTransforms?: string[]) =>
+    api.get('/lineage/relations/column_impact/', {
+      params: { table_name: tableName, column, exclude_transforms: excludeTransforms?.join(',') }
+    }),
+  
+  getTableMetrics: (params?: {
+    ordering?: string; database?: string; is_orphan?: boolean; is_dead_end?: boolean
+  } & ListParams) =>
+    api.get('/lineage/metrics/', { params }),
+  
+  getMetricsSummary: () =>
+    api.get('/lineage/metrics/summary/'),
+  
+  getBatchImpact: (tableNames: string[]) =>
+    api.post('/lineage/relations/batch_impact/', { tables: tableNames }),
+  
+  getGraph: (tableName: string, depth = 2, options: { limit?: number; cursor?: string } = {}) =>
+    api.get('/lineage/relations/graph/', { params: { table_name: tableName, depth, ...options } }),
   
   getJobs: () =>
     api.get<LineageParseJob[]>('/lineage/jobs/'),
   
   getJob: (id: number) =>
     api.get<LineageParseJob>(`/lineage/jobs/${id}/`),
+  
+  cancelJob: (id: number) =>
+    api.post(`/lineage/jobs/${id}/cancel/`),
+  
+  getSnapshots: (repoId?: number) =>
+    api.get<LineageSnapshot[]>('/lineage/snapshots/', { params: { repo_id: repoId } }),
+  
+  buildSnapshot: (repoId: number, ref: string) =>
+    api.post('/lineage/snapshots/build/', { repo_id: repoId, ref }),
+  
+  getSnapshotEdges: (id: number) =>
+    api.get(`/lineage/snapshots/${id}/edges/`),
+  
+  compareSnapshots: (baseId: number, headId: number) =>
+    api.get('/lineage/snapshots/compare/', { params: { base: baseId, head: headId } }),
 }
 
 // Auth API
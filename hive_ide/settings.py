@@ -180,6 +180,129 @@ SQLFLOW_CONFIG = {
     'url': 'http://localhost:19600/sqlflow/datalineage',
     'timeout': 30,
     'mock_mode': False,  # 使用真实的SQLFlow服务
+    'local_fast_path': True,  # 简单INSERT…SELECT语句使用本地解析器，无法确定时回退SQLFlow
+    'connect_timeout': 3,  # 建立连接超时（秒），JVM无响应时尽快失败
+    'resilience': {
+        'failure_threshold': 5,  # 连续失败多少次后熔断
+        'recovery_timeout': 30,  # 熔断后多少秒进入半开探测
+        'half_open_max_calls': 1,  # 半开状态下允许的探测请求数
+        'max_retries': 2,  # 单次调用最多重试次数（指数退避+抖动）
+        'retry_budget_ratio': 0.2,  # 60秒窗口内重试次数占请求数的上限比例
+        'max_concurrency': 4,  # 同时访问SQLFlow的最大请求数
+        'max_queue': 16,  # 排队等待的最大请求数，超过直接拒绝
+        'queue_timeout': 10,  # 排队等待超时（秒）
+    },
+}
+
+# 血缘解析任务配置
+LINEAGE_JOB_CONFIG = {
+    'progress_flush_interval': 2,  # 进度最多每隔多少秒写入一次
+    'progress_flush_files': 50,  # 或每处理多少个文件写入一次
+    'prefetch_batch': 100,  # API模式下每批并发预取的文件数
+}
+
+# GitLab API访问配置（access_mode='api'）
+GITLAB_API_CONFIG = {
+    'timeout': 30,  # 单个API请求超时（秒）
+    'max_concurrency': 8,  # 并发下载文件的最大线程数
+    'requests_per_second': 20,  # 每个仓库每秒最多请求数
+    'content_cache_dir': None,  # 文件内容缓存目录（按blob SHA存储），为空时使用系统临时目录
+    'archive_threshold': 200,  # 待下载文件数超过该值时改为下载整个仓库归档
+    'archive_timeout': 300,  # 下载仓库归档的读取超时（秒）
+    'compare_max_files': 1000,  # GitLab比较接口返回的最大文件数（实例的diff文件数上限），达到时视为结果被截断
+}
+
+# 仓库定时检查（manage.py run_repo_scheduler），远程HEAD变化时提交增量解析任务
+REPO_SCHEDULER_CONFIG = {
+    'interval': 300,  # 每个仓库的检查间隔（秒）
+    'tick': 30,  # 调度循环间隔（秒）
+}
+
+# 仓库分支列表、提交历史缓存（过期后先返回旧结果并在后台刷新）
+GIT_INFO_CACHE_CONFIG = {
+    'branches_ttl': 300,  # 分支列表缓存秒数
+    'commits_ttl': 60,  # 提交历史缓存秒数，过期后按HEAD SHA校验，未变化时只续期
+    'max_stale': 3600,  # 超过该秒数的旧结果不再返回，同步重新加载
+}
+
+# 表级血缘路径查询上限
+LINEAGE_PATH_CONFIG = {
+    'max_k': 10,  # k_shortest模式最多返回的路径数
+    'max_paths': 100,  # all模式最多返回的路径数
+    'max_depth': 10,  # all模式路径的最大跳数
+}
+
+# 血缘邻域图（graph接口）的分页、汇总与流式输出
+LINEAGE_GRAPH_CONFIG = {
+    'page_size': 500,  # 每页默认节点数
+    'max_page_size': 5000,  # 每页最大节点数
+    'max_depth': 5,  # 最大展开层数
+    'aggregate_threshold': 50,  # 单个表在一个方向上的新邻居超过该数时，其余按数据库汇总
+    'stream_max_nodes': 50000,  # NDJSON流式输出的节点数上限
+}
+
+# 多表批量影响分析（batch_impact接口）
+LINEAGE_IMPACT_CONFIG = {
+    'max_tables': 200,  # 一次请求最多分析的表数
+}
+
+# 字段级影响分析（column_impact接口）
+LINEAGE_COLUMN_IMPACT_CONFIG = {
+    'max_depth': 20,  # 最大跳数
+    'max_results': 10000,  # 最多返回的下游字段数
+    'exclude_transforms': [],  # 默认不再向下传播的转换类型，如 ['aggregate']
+}
+
+# 血缘图批量导出（export接口与export_lineage命令）
+LINEAGE_EXPORT_CONFIG = {
+    'batch_size': 50000,  # 每批写出的行数（Parquet的行组大小）
+    'parquet_compression': 'zstd',
+}
+
+# 表级血缘统计指标（可达表数、fan-in/fan-out、最长上游链、孤立表与末端表）
+LINEAGE_ANALYTICS_CONFIG = {
+    'refresh_after_job': True,  # 解析任务结束后重新计算
+}
+
+# 列表接口（血缘关系、元数据表）分页
+LIST_PAGINATION_CONFIG = {
+    'page_size': 100,  # 默认每页条数
+    'max_page_size': 1000,  # page_size参数的上限
+}
+
+# 完整表名到表ID的进程内缓存（表的增删改递增数据库中的版本号，所有进程在下次解析时失效）
+TABLE_NAME_CACHE_CONFIG = {
+    'ttl': 300,  # 已存在的表缓存秒数
+    'negative_ttl': 30,  # 不存在的表缓存秒数
+    'max_entries': 100000,  # 超过后清空重建
+}
+
+# 缓存（本地内存，无需外部服务）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'lineage_queries': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lineage-queries',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
+# 血缘查询结果缓存，键中包含血缘图版本号，解析任务完成后自动失效
+LINEAGE_QUERY_CACHE_CONFIG = {
+    'enabled': True,
+    'cache_alias': 'lineage_queries',
+    'timeout': 3600,  # 缓存秒数
+}
+
+# 阻塞调用专用线程池（与LSP消息处理隔离），排队数超过max_queue时返回503
+BLOCKING_EXECUTOR_CONFIG = {
+    'lsp': {'max_workers': 4, 'max_queue': 64},  # LSP补全、悬停、诊断
+    'git': {'max_workers': 2, 'max_queue': 8},  # 克隆、拉取、推送、远程分支查询、缓存后台刷新
+    'hive': {'max_workers': 2, 'max_queue': 8},  # Hive连接测试、元数据浏览与同步
+    'sqlflow': {'max_workers': 4, 'max_queue': 16},  # 接口中的SQLFlow在线解析
 }
 
 # Git Encryption Key (Generated for demo purposes)
@@ -89,6 +89,12 @@ REM 启动Django服务（后台）
 echo 开发模式启动后端...
 start "Django Backend" python manage.py runserver 0.0.0.0:8000
 
+REM 启动血缘解析后台worker（执行仓库解析任务队列）
+start "Lineage Worker" python manage.py run_lineage_worker
+
+REM 启动仓库定时检查（远程HEAD变化时提交增量解析任务）
+start "Repo Scheduler" python manage.py run_repo_scheduler
+
 REM 等待后端启动
 timeout /t 3 >nul
 
@@ -59,6 +59,8 @@ stop_services() {
     echo "停止后端服务..."
     pkill -f "python.*manage.py.*runserver" || true
     pkill -f "daphne.*hive_ide.asgi" || true
+    pkill -f "python.*manage.py.*run_lineage_worker" || true
+    pkill -f "python.*manage.py.*run_repo_scheduler" || true
     
     # 停止前端服务（Vite）
     echo "停止前端服务..."
@@ -160,6 +162,18 @@ start_backend() {
     BACKEND_PID=$!
     echo "后端服务 PID: $BACKEND_PID"
     
+    # 启动血缘解析后台worker（执行仓库解析任务队列）
+    echo "启动血缘解析worker..."
+    nohup python manage.py run_lineage_worker > logs/lineage_worker.log 2>&1 &
+    WORKER_PID=$!
+    echo "血缘解析worker PID: $WORKER_PID"
+    
+    # 启动仓库定时检查（远程HEAD变化时提交增量解析任务）
+    echo "启动仓库定时检查..."
+    nohup python manage.py run_repo_scheduler > logs/repo_scheduler.log 2>&1 &
+    SCHEDULER_PID=$!
+    echo "仓库定时检查 PID: $SCHEDULER_PID"
+    
     # 等待服务启动
     sleep 3
     if check_service "Django后端" 8000; then